@@ -0,0 +1,202 @@
+"""
+Minimal in-process MQTT 3.1.1 broker for offline benchmarks.
+
+Supports what ValveControl 2000 uses: CONNECT, QoS 0/1 PUBLISH with PUBACK,
+retained messages, SUBSCRIBE/UNSUBSCRIBE with + and # wildcards, PINGREQ and
+DISCONNECT. It runs its own asyncio loop in a background thread, so blocking
+clients can be benchmarked against it from the main thread.
+"""
+import asyncio
+import struct
+from threading import Event, Thread
+from typing import Dict, List, Optional, Tuple
+from paho.mqtt.client import topic_matches_sub
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+def encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+def encode_string(value: str) -> bytes:
+    data = value.encode()
+    return struct.pack('!H', len(data)) + data
+
+def packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body
+
+class Session:
+    def __init__(self, broker: 'FakeBroker', writer: asyncio.StreamWriter):
+        self.broker = broker
+        self.writer = writer
+        self.client_id = ''
+        self.subscriptions: Dict[str, int] = {}
+        self.next_packet_id = 0
+
+    def send_publish(self, topic: str, payload: bytes, qos: int, retain: bool = False):
+        body = encode_string(topic)
+        if qos:
+            self.next_packet_id = self.next_packet_id % 65535 + 1
+            body += struct.pack('!H', self.next_packet_id)
+        self.writer.write(packet(PUBLISH, qos << 1 | int(retain), body + payload))
+        self.broker.sent += 1
+
+class FakeBroker:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.sessions: List[Session] = []
+        self.retained: Dict[str, Tuple[bytes, int]] = {}
+        self.received = 0
+        self.sent = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> int:
+        """Start serving in a background thread, returns the port"""
+        started = Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self._server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+            self.loop.run_forever()
+
+        self._thread = Thread(target=run, name='fake-broker', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.port
+
+    def stop(self) -> None:
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for session in list(self.sessions):
+                session.writer.close()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop = None
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False) -> None:
+        """Publish from inside the broker (thread-safe)"""
+        self.loop.call_soon_threadsafe(self._route, topic, payload, qos, retain)
+
+    def _route(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+
+        for session in self.sessions:
+            for topic_filter, granted_qos in session.subscriptions.items():
+                if topic_matches_sub(topic_filter, topic):
+                    session.send_publish(topic, payload, min(qos, granted_qos))
+                    break
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = Session(self, writer)
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b''
+
+                if not self._handle_packet(session, header[0] >> 4, header[0] & 0x0F, body):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            writer.close()
+
+    def _handle_packet(self, session: Session, packet_type: int, flags: int, body: bytes) -> bool:
+        if packet_type == CONNECT:
+            protocol_length = struct.unpack('!H', body[:2])[0]
+            offset = 2 + protocol_length + 4  # protocol name, level, flags, keepalive
+            client_id_length = struct.unpack('!H', body[offset:offset + 2])[0]
+            session.client_id = body[offset + 2:offset + 2 + client_id_length].decode()
+            self.sessions.append(session)
+            session.writer.write(packet(CONNACK, 0, b'\x00\x00'))
+
+        elif packet_type == PUBLISH:
+            qos = flags >> 1 & 0x03
+            topic_length = struct.unpack('!H', body[:2])[0]
+            topic = body[2:2 + topic_length].decode()
+            offset = 2 + topic_length
+            if qos:
+                packet_id = body[offset:offset + 2]
+                offset += 2
+                session.writer.write(packet(PUBACK, 0, packet_id))
+            self.received += 1
+            self._route(topic, body[offset:], qos, bool(flags & 0x01))
+
+        elif packet_type == SUBSCRIBE:
+            packet_id = body[:2]
+            offset = 2
+            granted = bytearray()
+            new_filters = []
+            while offset < len(body):
+                filter_length = struct.unpack('!H', body[offset:offset + 2])[0]
+                topic_filter = body[offset + 2:offset + 2 + filter_length].decode()
+                qos = min(body[offset + 2 + filter_length], 1)
+                offset += 3 + filter_length
+                session.subscriptions[topic_filter] = qos
+                granted.append(qos)
+                new_filters.append((topic_filter, qos))
+            session.writer.write(packet(SUBACK, 0, packet_id + bytes(granted)))
+
+            # Deliver the retained messages of the new subscriptions
+            for topic, (payload, retained_qos) in self.retained.items():
+                for topic_filter, qos in new_filters:
+                    if topic_matches_sub(topic_filter, topic):
+                        session.send_publish(topic, payload, min(qos, retained_qos), retain=True)
+                        break
+
+        elif packet_type == UNSUBSCRIBE:
+            packet_id = body[:2]
+            offset = 2
+            while offset < len(body):
+                filter_length = struct.unpack('!H', body[offset:offset + 2])[0]
+                session.subscriptions.pop(body[offset + 2:offset + 2 + filter_length].decode(), None)
+                offset += 2 + filter_length
+            session.writer.write(packet(UNSUBACK, 0, packet_id))
+
+        elif packet_type == PINGREQ:
+            session.writer.write(packet(PINGRESP, 0, b''))
+
+        elif packet_type == DISCONNECT:
+            return False
+
+        # PUBACKs of our QoS 1 deliveries are not tracked
+        return True
@@ -0,0 +1,198 @@
+"""
+Compare the threaded and the asyncio MQTT transports.
+
+Measures the state message ingest throughput (messages published by a device
+simulator until they reach on_zone_state_change) and the command round-trip
+latency (publish_zone_command until the echoed state arrives), against the
+in-process fake broker or a real one:
+
+    python -m benchmarks.mqtt_transport [--broker host:port] [--clients 10] [--json]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import warnings
+from typing import Dict, List
+import paho.mqtt.client as mqtt
+from benchmarks.fake_broker import FakeBroker
+from mqtt_client import MQTTClient
+from mqtt_async import AsyncMQTTClient
+
+TRANSPORTS = {
+    'threaded': MQTTClient,
+    'asyncio': AsyncMQTTClient,
+}
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def mqtt_config(host: str, port: int, client_id: str) -> Dict:
+    return {
+        'enabled': True,
+        'broker': host,
+        'port': port,
+        'username': '',
+        'password': '',
+        'client_id': client_id,
+        'topic_prefix': 'bench',
+        'use_tls': False,
+        'ca_cert_path': '',
+        'status_update_interval': 30
+    }
+
+def make_device(host: str, port: int, echo: bool) -> mqtt.Client:
+    """Simulated valves: publish states, optionally confirm every command"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        device = mqtt.Client(client_id=f'bench-device-{time.monotonic_ns()}')
+
+    if echo:
+        def on_message(client, userdata, message):
+            state_topic = message.topic.rsplit('/', 1)[0] + '/state'
+            client.publish(state_topic, message.payload, qos=1)
+
+        device.on_connect = lambda client, userdata, flags, rc: client.subscribe('bench/zone/+/command', qos=1)
+        device.on_message = on_message
+
+    device.connect(host, port)
+    device.loop_start()
+    return device
+
+class Receiver:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.expected = 0
+        self.done = threading.Event()
+        self.connected = threading.Event()
+        self.last_state = threading.Event()
+
+    def on_zone_state_change(self, zone_id: int, is_on: bool):
+        with self.lock:
+            self.count += 1
+            if self.count >= self.expected:
+                self.done.set()
+        self.last_state.set()
+
+    def on_connection_change(self, connected: bool):
+        if connected:
+            self.connected.set()
+
+def run_transport(name: str, host: str, port: int, clients: int, zones: int, messages: int, round_trips: int) -> Dict:
+    client_class = TRANSPORTS[name]
+    threads_before = threading.active_count()
+
+    receivers = [Receiver() for _ in range(clients)]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        mqtt_clients = [
+            client_class(
+                mqtt_config(host, port, f'bench-{name}-{i}'),
+                _=str,
+                ngettext=None,
+                zone_count=zones,
+                on_zone_state_change=receiver.on_zone_state_change,
+                on_connection_change=receiver.on_connection_change
+            )
+            for i, receiver in enumerate(receivers)
+        ]
+    for client in mqtt_clients:
+        client.connect()
+    for receiver in receivers:
+        if not receiver.connected.wait(10):
+            raise RuntimeError(f"{name} client could not connect")
+    # Let the wildcard subscriptions settle
+    time.sleep(0.2)
+    threads = threading.active_count() - threads_before
+
+    # Ingest throughput: every client receives every state message
+    device = make_device(host, port, echo=False)
+    for receiver in receivers:
+        receiver.count = 0
+        receiver.expected = messages
+        receiver.done.clear()
+    start = time.perf_counter()
+    for i in range(messages):
+        device.publish(f'bench/zone/{i % zones}/state', b'on' if i % 2 else b'off', qos=1)
+    for receiver in receivers:
+        receiver.done.wait(60)
+    ingest_seconds = time.perf_counter() - start
+    received = sum(receiver.count for receiver in receivers)
+    device.loop_stop()
+    device.disconnect()
+
+    # Command round trip through the echoing device, one command at a time
+    echo = make_device(host, port, echo=True)
+    time.sleep(0.2)
+    latencies = []
+    client, receiver = mqtt_clients[0], receivers[0]
+    for i in range(round_trips):
+        receiver.last_state.clear()
+        start = time.perf_counter()
+        client.publish_zone_command(i % zones, bool(i % 2))
+        if receiver.last_state.wait(5):
+            latencies.append((time.perf_counter() - start) * 1000)
+    echo.loop_stop()
+    echo.disconnect()
+
+    for client in mqtt_clients:
+        client.disconnect()
+        if name == 'threaded':
+            client.client.loop_stop()
+
+    return {
+        'transport': name,
+        'clients': clients,
+        'extra_threads': threads,
+        'messages_received': received,
+        'ingest_msgs_per_s': received / ingest_seconds if ingest_seconds else 0.0,
+        'latency_ms_p50': percentile(latencies, 0.50) if latencies else None,
+        'latency_ms_p95': percentile(latencies, 0.95) if latencies else None,
+        'latency_ms_p99': percentile(latencies, 0.99) if latencies else None,
+        'latency_ms_mean': statistics.mean(latencies) if latencies else None,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--broker', help="host:port of a real broker, the in-process fake broker is used by default")
+    parser.add_argument('--clients', type=int, default=1, help="number of controllers connected at the same time")
+    parser.add_argument('--zones', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--round-trips', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    broker = None
+    if args.broker:
+        host, port = args.broker.rsplit(':', 1)
+        port = int(port)
+    else:
+        broker = FakeBroker()
+        host, port = broker.host, broker.start()
+
+    try:
+        results = [
+            run_transport(name, host, port, args.clients, args.zones, args.messages, args.round_trips)
+            for name in TRANSPORTS
+        ]
+    finally:
+        if broker:
+            broker.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    for result in results:
+        print(
+            f"{result['transport']:>8}: {result['ingest_msgs_per_s']:10.0f} msg/s, "
+            f"latency p50 {result['latency_ms_p50']:.2f} ms p95 {result['latency_ms_p95']:.2f} ms "
+            f"p99 {result['latency_ms_p99']:.2f} ms, {result['extra_threads']} extra threads "
+            f"for {result['clients']} clients"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+"""
+Benchmarks of the hot paths, runs offline and compares with a stored baseline.
+
+    python -m benchmarks.suite [--quick] [--json results.json]
+                               [--baseline benchmarks/baseline.json] [--save-baseline]
+
+Covers the state message ingest (MQTTClient._on_message into the zone logic,
+directly and through the in-process fake broker), toggling and cascading
+zones at 8, 100 and 1000 zones, refresh_ui (skipped without a display), zone
+config load, validate and hash, and the cold start. Every result is the best
+of several repeats, each of them long enough for the timer.
+
+With a baseline, a result of a full run (not --quick) which is worse by more
+than the tolerance is a regression and the exit code is 1. When a fixed calibration loop ran slower
+around a result than around its baseline value, the baseline is scaled by
+that first, so a busier or throttled machine doesn't count as a regression.
+A regressed benchmark is measured again before it is reported.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+import paho.mqtt.client as mqtt
+from benchmarks.fake_broker import FakeBroker
+from configuration import Configuration, ZoneConfig
+from constants import DEFAULT_APP_SETTINGS, DEFAULT_ZONE_CONFIG
+from mqtt_client import MQTTClient
+from utils import USER_DATA_DIR_VARIABLE, ensure_directory_exists
+from zone_controller import ZoneController
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+ZONE_COUNTS = (8, 100, 1000)
+# Every tenth zone is a master of the nine zones after it
+ZONES_PER_MASTER = 10
+# Shortest timed sample, a quicker function is called several times per sample
+MIN_SAMPLE_SECONDS = 0.005
+# Allowed slowdown of the results going through sockets or new processes, which vary more
+NOISY_TOLERANCE = 0.5
+# Samples of the calibration loop before and after every benchmark
+CALIBRATION_REPEAT = 5
+# Times a benchmark which regressed is measured before it counts, and runs for a new baseline
+MEASUREMENTS = 3
+
+def best_time(function: Callable[[], None], repeat: int) -> float:
+    """Shortest wall-clock time of one call of function in seconds, out of repeat samples"""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        seconds = time.perf_counter() - start
+        if seconds >= MIN_SAMPLE_SECONDS:
+            break
+        calls *= 2
+    best = seconds / calls
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+def calibration_loop() -> None:
+    """Fixed interpreter work (calls, dict and attribute access), the yardstick of the machine's speed"""
+    counts: Dict[int, int] = {}
+    for i in range(20000):
+        key = i & 255
+        counts[key] = counts.get(key, 0) + len(str(i))
+
+def calibration_ms(repeat: int) -> float:
+    return best_time(calibration_loop, repeat) * 1000
+
+def zone_config_dict(zone_count: int) -> Dict:
+    config = json.loads(json.dumps(DEFAULT_ZONE_CONFIG))
+    config['zones'] = [
+        {
+            'name': f"Zone {zone_id}",
+            'enabled': True,
+            'master_zone': -1 if zone_id % ZONES_PER_MASTER == 0 else zone_id - zone_id % ZONES_PER_MASTER,
+            'is_master': zone_id % ZONES_PER_MASTER == 0
+        }
+        for zone_id in range(zone_count)
+    ]
+    config['mqtt']['topic_prefix'] = 'bench'
+    return config
+
+def make_configuration(zone_count: int, directory: str) -> Configuration:
+    config = Configuration(os.path.join(directory, 'settings.json'))
+    config.zone_config = ZoneConfig(**zone_config_dict(zone_count))
+    return config
+
+def result(value: float, unit: str, better: str = 'lower', tolerance: Optional[float] = None) -> Dict:
+    """A measured value, tolerance is its own allowed slowdown if it is noisier than the others"""
+    measured = {'value': value, 'unit': unit, 'better': better}
+    if tolerance is not None:
+        measured['tolerance'] = tolerance
+    return measured
+
+def bench_on_message_ingest(directory: str, messages: int, repeat: int) -> Dict:
+    """State messages through MQTTClient._on_message, the event queue and the zone engine"""
+    config = make_configuration(100, directory)
+    controller = ZoneController(config, str, None)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        client = MQTTClient(
+            config.zone_config.mqtt, _=str, ngettext=None, zone_count=100,
+            on_zone_state_change=controller.enqueue_mqtt_state_change,
+            latency_tracker=controller.latency_tracker, metrics=controller.metrics
+        )
+
+    batch = []
+    for i in range(messages):
+        message = mqtt.MQTTMessage(topic=f'bench/zone/{i % 100}/state'.encode())
+        message.payload = b'on' if (i // 100) % 2 else b'off'
+        batch.append(message)
+
+    def run():
+        for message in batch:
+            client._on_message(None, None, message)
+            # The Tk pump drains every 50 ms, here every 100 messages
+            if message.topic.endswith('/99/state'):
+                controller.process_events()
+        controller.process_events()
+
+    seconds = best_time(run, repeat)
+    return {'ingest_on_message_msgs_per_s': result(messages / seconds, 'msg/s', 'higher')}
+
+def bench_broker_ingest(directory: str, messages: int, repeat: int) -> Dict:
+    """State messages from a simulated device through the fake broker into the zone engine"""
+    broker = FakeBroker()
+    port = broker.start()
+    config = make_configuration(100, directory)
+    config.zone_config.mqtt.update(enabled=True, broker=broker.host, port=port, client_id='bench-suite')
+    controller = ZoneController(config, str, None)
+
+    received = threading.Event()
+    count = [0]
+    expected = [0]
+
+    def on_state(zone_id, is_on):
+        controller.enqueue_mqtt_state_change(zone_id, is_on)
+        if zone_id == 99:
+            count[0] += 100
+            if count[0] >= expected[0]:
+                received.set()
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            controller.init_mqtt()
+            controller.mqtt_client.on_zone_state_change = on_state
+            device = mqtt.Client(client_id='bench-suite-device')
+        device.connect(broker.host, port)
+        device.loop_start()
+        deadline = time.monotonic() + 10
+        while not controller.mqtt_connected and time.monotonic() < deadline:
+            controller.wait_for_events(0.1)
+            controller.process_events()
+        if not controller.mqtt_connected:
+            raise RuntimeError("Could not connect to the fake broker")
+        # Measure the incremental updates, not the bootstrap after connecting
+        while controller.bootstrapping:
+            controller.wait_for_events(0.1)
+            controller.process_events()
+
+        def run():
+            count[0] = 0
+            expected[0] = messages
+            received.clear()
+            for i in range(messages):
+                device.publish(f'bench/zone/{i % 100}/state', b'on' if (i // 100) % 2 else b'off', qos=1)
+            while not received.is_set():
+                controller.wait_for_events(0.05)
+                controller.process_events()
+            controller.process_events()
+
+        seconds = best_time(run, repeat)
+        device.loop_stop()
+        device.disconnect()
+    finally:
+        controller.stop_mqtt()
+        broker.stop()
+    return {'ingest_broker_msgs_per_s': result(messages / seconds, 'msg/s', 'higher', NOISY_TOLERANCE)}
+
+def bench_zone_logic(directory: str, zone_count: int, repeat: int) -> Dict:
+    """toggle_zone of every zone on and off, and deactivate_zone of every master with all its dependents on"""
+    config = make_configuration(zone_count, directory)
+    controller = ZoneController(config, str, None)
+    zone_ids = range(zone_count)
+    masters = [zone_id for zone_id in zone_ids if zone_id % ZONES_PER_MASTER == 0]
+
+    def toggle():
+        for zone_id in zone_ids:
+            controller.toggle_zone(zone_id)
+        for zone_id in zone_ids:
+            controller.toggle_zone(zone_id)
+
+    def cascade():
+        for zone_id in zone_ids:
+            controller.activate_zone(zone_id, skip_mqtt=True)
+        for master_id in masters:
+            controller.deactivate_zone(master_id)
+
+    toggle_seconds = best_time(toggle, repeat)
+    cascade_seconds = best_time(cascade, repeat)
+    return {
+        f'toggle_zone_{zone_count}_us': result(toggle_seconds / (2 * zone_count) * 1e6, 'us'),
+        f'cascade_{zone_count}_us': result(cascade_seconds / len(masters) * 1e6, 'us'),
+    }
+
+def bench_refresh_ui(directory: str, zone_count: int, repeat: int) -> Dict:
+    """refresh_ui with both tabs built, needs a display"""
+    try:
+        import tkinter
+        root = tkinter.Tk()
+    except Exception:
+        return {}
+    from zone_control import ZoneControlFrame
+
+    try:
+        root.geometry('700x700')
+        config = make_configuration(zone_count, directory)
+        frame = ZoneControlFrame(root, config, str, lambda singular, plural, n: singular if n == 1 else plural)
+        frame.pack(fill='both', expand=True)
+        frame.build_config_panel()
+        root.update()
+
+        zones = config.zone_config.zones
+
+        def run():
+            # A changed name in every zone, so every row is rendered again
+            for zone_id in range(len(zones)):
+                config.zone_config.set_zone_field(zone_id, 'name', zones[zone_id].name + '.')
+            frame.refresh_ui()
+            root.update_idletasks()
+
+        seconds = best_time(run, repeat)
+        frame.destroy()
+    finally:
+        root.destroy()
+    return {f'refresh_ui_{zone_count}_ms': result(seconds * 1000, 'ms')}
+
+def bench_config(directory: str, zone_count: int, repeat: int) -> Dict:
+    """Zone config load (parse and validate), validate and the save hash"""
+    path = os.path.join(directory, f'zones_{zone_count}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(zone_config_dict(zone_count), f, indent=4)
+    config = Configuration(os.path.join(directory, 'settings.json'))
+
+    load_seconds = best_time(lambda: config.load_zone_config(path), repeat)
+    # Every load saves the app settings, not written while the others are measured
+    config.flush()
+    validate_seconds = best_time(config.zone_config.validate, repeat)
+
+    def config_hash():
+        config_json = json.dumps(config.zone_config.to_json(), indent=4, ensure_ascii=False)
+        hashlib.sha256(config_json.encode()).hexdigest()
+
+    hash_seconds = best_time(config_hash, repeat)
+    config.flush()
+    return {
+        f'config_load_{zone_count}_ms': result(load_seconds * 1000, 'ms'),
+        f'config_validate_{zone_count}_ms': result(validate_seconds * 1000, 'ms'),
+        f'config_hash_{zone_count}_ms': result(hash_seconds * 1000, 'ms'),
+    }
+
+def bench_cold_start(directory: str, repeat: int) -> Dict:
+    """Fresh interpreters: importing the headless service, and the GUI up to its first paint"""
+    # Scratch user data, the user's own settings, zone config and journal are never touched,
+    # and the zone config has MQTT off, so no broker is contacted
+    data_directory = os.path.join(directory, 'cold_start')
+    zone_config = zone_config_dict(8)
+    zone_config['mqtt']['enabled'] = False
+    zone_config_file = os.path.join(data_directory, 'zones.json')
+    ensure_directory_exists(zone_config_file)
+    with open(zone_config_file, 'w', encoding='utf-8') as f:
+        json.dump(zone_config, f, indent=4)
+    with open(os.path.join(data_directory, 'settings.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(DEFAULT_APP_SETTINGS, last_config_file=zone_config_file), f, indent=4)
+    environment = dict(os.environ, **{USER_DATA_DIR_VARIABLE: data_directory})
+
+    def headless():
+        subprocess.run([sys.executable, '-c', 'import headless'], cwd=ROOT, env=environment, check=True)
+
+    results = {'cold_start_headless_ms': result(best_time(headless, repeat) * 1000, 'ms', tolerance=NOISY_TOLERANCE)}
+
+    # The GUI reports its own startup time, which only works with a display
+    totals = []
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, 'main.py', '--profile-startup'],
+            cwd=ROOT, env=environment, capture_output=True, text=True
+        )
+        for line in process.stdout.splitlines():
+            if line.startswith('total'):
+                totals.append(float(line.split()[1]))
+    if totals:
+        results['cold_start_gui_ms'] = result(min(totals), 'ms', tolerance=NOISY_TOLERANCE)
+    return results
+
+def benchmarks(directory: str, quick: bool) -> List[Callable[[], Dict]]:
+    repeat = 5 if quick else 15
+    messages = 2000 if quick else 20000
+    suite: List[Callable[[], Dict]] = [
+        partial(bench_on_message_ingest, directory, messages, repeat),
+        partial(bench_broker_ingest, directory, messages // 4, max(repeat // 3, 1)),
+    ]
+    suite += [partial(bench_zone_logic, directory, zone_count, repeat) for zone_count in ZONE_COUNTS]
+    suite += [partial(bench_config, directory, zone_count, repeat) for zone_count in ZONE_COUNTS]
+    suite.append(partial(bench_refresh_ui, directory, 100, repeat))
+    suite.append(partial(bench_cold_start, directory, 3 if quick else 5))
+    return suite
+
+def calibrated(benchmark: Callable[[], Dict]) -> Dict[str, Dict]:
+    """Results of benchmark, each with the calibration time (ms) measured around it"""
+    calibration = calibration_ms(CALIBRATION_REPEAT)
+    results = benchmark()
+    calibration = min(calibration, calibration_ms(CALIBRATION_REPEAT))
+    for measured in results.values():
+        measured['calibration_ms'] = calibration
+    return results
+
+def run_suite(quick: bool = False, baseline: Optional[Dict[str, Dict]] = None,
+              tolerance: float = 0.25) -> Dict[str, Dict]:
+    """Results of every benchmark, the ones which regressed against baseline are measured again (up to MEASUREMENTS times)"""
+    with tempfile.TemporaryDirectory() as directory:
+        results: Dict[str, Dict] = {}
+        measured: List[Tuple[Callable[[], Dict], List[str]]] = []
+        for benchmark in benchmarks(directory, quick):
+            benchmark_results = calibrated(benchmark)
+            results.update(benchmark_results)
+            measured.append((benchmark, list(benchmark_results)))
+
+        # A slow run is noise, a regression has to show every time
+        for _ in range(MEASUREMENTS - 1):
+            regressed = set(compare(results, baseline, tolerance)) if baseline else set()
+            if not regressed:
+                break
+            for benchmark, names in measured:
+                if regressed.intersection(names):
+                    for name, again in calibrated(benchmark).items():
+                        if name in baseline and slowdown(again, baseline[name]) < slowdown(results[name], baseline[name]):
+                            results[name] = again
+    return results
+
+def typical(runs: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Results of several runs of the suite, each the median of its measurements"""
+    results = {}
+    for name in runs[0]:
+        measurements = sorted((run[name] for run in runs if name in run), key=lambda measured: measured['value'])
+        results[name] = measurements[len(measurements) // 2]
+    return results
+
+def expected_value(previous: Dict, current: Dict) -> float:
+    """
+    The baseline value at the speed the machine had when current was measured.
+
+    Only a slower machine changes it, not every benchmark speeds up with the
+    calibration loop (memory bound ones and new processes don't, or less).
+    """
+    if not previous.get('calibration_ms') or not current.get('calibration_ms'):
+        return previous['value']
+    scale = max(current['calibration_ms'] / previous['calibration_ms'], 1.0)
+    return previous['value'] / scale if previous['better'] == 'higher' else previous['value'] * scale
+
+def slowdown(current: Dict, previous: Dict) -> float:
+    """How many times worse current is than the baseline value previous, below 1 if it is better"""
+    ratio = current['value'] / expected_value(previous, current)
+    if current['better'] == 'higher':
+        return 1 / ratio if ratio else float('inf')
+    return ratio
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """
+    Names of the results which are worse than the baseline by more than tolerance (0.25 = 25%),
+    or by more than their own tolerance if that is larger
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous['value']:
+            continue
+        if slowdown(current, previous) > 1 + max(tolerance, current.get('tolerance', 0)):
+            regressions.append(name)
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help="fewer repeats and messages, for a smoke run (never fails on regressions)")
+    parser.add_argument('--json', metavar='FILE', help="write the results to FILE ('-' for stdout)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline to compare with (default: %(default)s)")
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline (median of several runs)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown, 0.25 is 25%% (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.quick and args.save_baseline:
+        parser.error("the baseline is saved from full runs only")
+
+    baseline: Optional[Dict] = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    if args.save_baseline:
+        # The baseline is what a typical run measures, not its luckiest one
+        results = typical([run_suite(args.quick) for _ in range(MEASUREMENTS)])
+    else:
+        # A quick run is too short for the tolerance, it is only shown against the baseline
+        results = run_suite(args.quick, None if args.quick else baseline, args.tolerance)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    if args.json == '-':
+        print(json.dumps(report, indent=4))
+    else:
+        for name, current in results.items():
+            line = f"{name:<34}{current['value']:14.2f} {current['unit']}"
+            previous = baseline.get(name) if baseline else None
+            if previous and previous['value']:
+                expected = expected_value(previous, current)
+                change = (current['value'] / expected - 1) * 100
+                line += f"  ({change:+.0f}% vs baseline, {current['better']} is better)"
+            print(line)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+            f.write('\n')
+        return 0
+
+    if baseline and not args.quick:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions over {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import time
+from threading import Lock
+from typing import Dict, List, Tuple
+
+class CommandOutbox:
+    """
+    Bounded, per-zone last-write-wins queue for zone commands which could not be sent.
+
+    While the broker is unreachable only the latest command of every zone is
+    kept. Commands are flushed in the order of their latest update once the
+    connection is back, commands older than max_age are dropped instead of
+    being sent late, and the oldest command is evicted when the outbox is full.
+    """
+
+    def __init__(self, max_size: int, max_age: float):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = Lock()
+        # zone_id -> (state, enqueue time), ordered by the latest update
+        self._commands: Dict[int, Tuple[bool, float]] = {}
+
+        # Counters
+        self.queued_total = 0
+        self.flushed_total = 0
+        self.expired_total = 0
+        self.evicted_total = 0
+
+    def put(self, zone_id: int, state: bool) -> None:
+        """Queue a command, replacing any queued command of the same zone"""
+        with self._lock:
+            self._commands.pop(zone_id, None)
+            if len(self._commands) >= self.max_size:
+                oldest = next(iter(self._commands))
+                del self._commands[oldest]
+                self.evicted_total += 1
+            self._commands[zone_id] = (state, time.monotonic())
+            self.queued_total += 1
+
+    def take(self) -> List[Tuple[int, bool]]:
+        """Remove and return the commands to send, without the expired ones"""
+        with self._lock:
+            commands, self._commands = self._commands, {}
+
+        now = time.monotonic()
+        fresh = [
+            (zone_id, state)
+            for zone_id, (state, queued_at) in commands.items()
+            if now - queued_at <= self.max_age
+        ]
+        with self._lock:
+            self.expired_total += len(commands) - len(fresh)
+            self.flushed_total += len(fresh)
+        return fresh
+
+    def discard(self, zone_id: int) -> None:
+        """Drop the queued command of a zone, e.g. when a newer one was sent"""
+        with self._lock:
+            self._commands.pop(zone_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._commands.clear()
+
+    @property
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._commands)
+
+    @property
+    def oldest_age(self) -> float:
+        """Age of the oldest queued command in seconds, 0 when empty"""
+        with self._lock:
+            if not self._commands:
+                return 0.0
+            # Ordered by enqueue time, so the first one is the oldest
+            _, queued_at = next(iter(self._commands.values()))
+        return time.monotonic() - queued_at
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'depth': self.depth,
+            'oldest_age': self.oldest_age,
+            'queued_total': self.queued_total,
+            'flushed_total': self.flushed_total,
+            'expired_total': self.expired_total,
+            'evicted_total': self.evicted_total,
+        }
@@ -0,0 +1,177 @@
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+# Number of recent acknowledgment latencies kept for the statistics
+ACK_LATENCY_HISTORY = 1000
+
+class CommandPipeline:
+    """
+    Orders the zone commands sent to the broker and tracks their acknowledgments.
+
+    A command which depends on another zone (a dependent zone opening after its
+    master) is held back until the command of that zone is acknowledged by the
+    broker (PUBACK), or until release_delay expires, so a valve never gets its
+    command before the pump. A command not acknowledged within release_delay
+    is no longer waited for. Nothing waits: held commands are released by
+    acknowledge() and poll(), which are called on the same thread as submit().
+
+    When the connection is lost, the held commands stay held until resume()
+    is called after reconnecting, and the unacknowledged commands they wait
+    for are sent again first.
+    """
+
+    def __init__(self, publish: Callable[[int, bool], Optional[int]], release_delay: float, _=str):
+        self._ = _
+        # Sends a command, returns its message id, or None if it was not sent (e.g. queued offline)
+        self._publish = publish
+        self.release_delay = release_delay
+        self.logger = logging.getLogger(__name__)
+
+        # mid -> (zone_id, state, sent at) of the commands waiting for their PUBACK
+        self._inflight: Dict[int, Tuple[int, bool, float]] = {}
+        # zone_id -> mid of the zone's latest unacknowledged command
+        self._inflight_zones: Dict[int, int] = {}
+        # zone_id -> (state, zone waited for or None, release deadline or None until resume()), in submit order
+        self._held: Dict[int, Tuple[bool, Optional[int], Optional[float]]] = {}
+        # Between reset() and resume() nothing held is released
+        self._paused = False
+
+        # Acknowledgment latencies in milliseconds
+        self.ack_latencies: Deque[float] = deque(maxlen=ACK_LATENCY_HISTORY)
+        self.acked_total = 0
+        self.timed_out_total = 0
+
+    def submit(self, zone_id: int, state: bool, depends_on: Optional[int] = None) -> None:
+        """Send a command, or hold it while the command of depends_on is not acknowledged"""
+        # A newer command replaces the held one of the same zone
+        self._held.pop(zone_id, None)
+        if depends_on is not None and self._is_pending(depends_on):
+            deadline = None if self._paused else time.monotonic() + self.release_delay
+            self._held[zone_id] = (state, depends_on, deadline)
+            return
+        self._send(zone_id, state)
+
+    def acknowledge(self, mid: int, acked_at: float) -> None:
+        """Record the PUBACK of a command and release the commands waiting for it"""
+        command = self._inflight.pop(mid, None)
+        if command is None:
+            return
+        zone_id, state, sent_at = command
+        if self._inflight_zones.get(zone_id) == mid:
+            del self._inflight_zones[zone_id]
+
+        latency = (acked_at - sent_at) * 1000
+        self.ack_latencies.append(latency)
+        self.acked_total += 1
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                self._("Zone %s command %s acknowledged in %.1f ms"), zone_id, 'on' if state else 'off', latency
+            )
+        self._release(acked_at)
+
+    def poll(self, now: Optional[float] = None) -> None:
+        """Release the held commands whose delay expired, stop waiting for the overdue acknowledgments"""
+        if not self._held and not self._inflight:
+            return
+        if now is None:
+            now = time.monotonic()
+        if self._held:
+            self._release(now)
+        if self._inflight:
+            self._expire(now)
+
+    def next_release(self) -> Optional[float]:
+        """Seconds until the next held command has to be released, None if nothing is held"""
+        deadlines = [deadline for _, _, deadline in self._held.values() if deadline is not None]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def reset(self) -> None:
+        """
+        Forget the commands waiting for a PUBACK, e.g. after the connection was lost.
+        The held commands stay held until resume(), after the lost commands they wait for.
+        """
+        waited_for = {depends_on for _, depends_on, _ in self._held.values()}
+        lost = {
+            zone_id: state for zone_id, state, _ in self._inflight.values()
+            if zone_id in waited_for and zone_id not in self._held
+        }
+        self._inflight.clear()
+        self._inflight_zones.clear()
+        self._paused = True
+        for zone_id, (state, depends_on, _) in self._held.items():
+            self._held[zone_id] = (state, depends_on, None)
+        # Sent again by resume(), the dependents are held until they are acknowledged
+        for zone_id, state in lost.items():
+            self._held[zone_id] = (state, None, None)
+
+    def resume(self) -> None:
+        """Send the commands held since reset(), once connected again"""
+        self._paused = False
+        now = time.monotonic()
+        for zone_id, (state, depends_on, deadline) in self._held.items():
+            if deadline is None:
+                self._held[zone_id] = (state, depends_on, now + self.release_delay)
+        self._release(now)
+
+    def clear(self) -> None:
+        """Drop every held and unacknowledged command"""
+        self._inflight.clear()
+        self._inflight_zones.clear()
+        self._held.clear()
+        self._paused = False
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        latencies = sorted(self.ack_latencies)
+        return {
+            'inflight': len(self._inflight),
+            'held': len(self._held),
+            'acked_total': self.acked_total,
+            'timed_out_total': self.timed_out_total,
+            'ack_ms_p50': latencies[len(latencies) // 2] if latencies else None,
+            'ack_ms_p95': latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] if latencies else None,
+            'ack_ms_max': latencies[-1] if latencies else None,
+        }
+
+    def _is_pending(self, zone_id: int) -> bool:
+        return zone_id in self._inflight_zones or zone_id in self._held
+
+    def _send(self, zone_id: int, state: bool) -> None:
+        sent_at = time.monotonic()
+        mid = self._publish(zone_id, state)
+        if mid is not None:
+            self._inflight[mid] = (zone_id, state, sent_at)
+            self._inflight_zones[zone_id] = mid
+
+    def _release(self, now: float) -> None:
+        for zone_id, (state, depends_on, deadline) in list(self._held.items()):
+            if zone_id not in self._held or deadline is None:
+                continue
+            if depends_on is not None and self._is_pending(depends_on):
+                if now < deadline:
+                    continue
+                self.timed_out_total += 1
+                self.logger.warning(
+                    self._("Zone %s command sent without the acknowledgment of zone %s"), zone_id, depends_on
+                )
+            del self._held[zone_id]
+            self._send(zone_id, state)
+
+    def _expire(self, now: float) -> None:
+        # In send order, so only the expired ones are looked at
+        while self._inflight:
+            mid = next(iter(self._inflight))
+            zone_id, state, sent_at = self._inflight[mid]
+            if now < sent_at + self.release_delay:
+                break
+            del self._inflight[mid]
+            if self._inflight_zones.get(zone_id) == mid:
+                del self._inflight_zones[zone_id]
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(
+                    self._("Zone %s command %s not acknowledged in %.1f s"), zone_id, 'on' if state else 'off',
+                    self.release_delay
+                )
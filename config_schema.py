@@ -0,0 +1,342 @@
+import itertools
+import re
+from typing import Any, Callable, Dict, List, Optional, Pattern, Sequence, Tuple
+
+# Appends "path: problem" messages for value to the list
+Validator = Callable[[Any, str, List[str]], None]
+
+# A field which is not there at all
+MISSING = object()
+
+def join_path(path: str, name: str) -> str:
+    return f"{path}.{name}" if path else name
+
+class CheckBuilder:
+    """
+    Source of a generated check function, which returns False for an invalid value.
+
+    Every node of a schema adds the statements checking its value, constants
+    (types, check functions) are passed in the namespace of the function.
+    """
+
+    def __init__(self):
+        self.lines = ['def check(value):']
+        self.namespace: Dict[str, Any] = {'MISSING': MISSING}
+        self._names = itertools.count()
+
+    def name(self) -> str:
+        return f"_v{next(self._names)}"
+
+    def constant(self, value) -> str:
+        name = f"_c{next(self._names)}"
+        self.namespace[name] = value
+        return name
+
+    def add(self, indent: int, line: str) -> None:
+        self.lines.append('    ' * indent + line)
+
+    def build(self) -> Callable[[Any], bool]:
+        self.add(1, 'return True')
+        exec('\n'.join(self.lines), self.namespace)
+        return self.namespace['check']
+
+class Value:
+    """
+    A value of one of the given types, optionally within bounds, matching a
+    pattern or being one of the choices.
+
+    The type has to be exactly one of the types, so True and False are never
+    numbers here (they are ints to isinstance()).
+    """
+
+    def __init__(self, types, expected: str, minimum=None, maximum=None, exclusive_minimum=None,
+                 pattern: Optional[Pattern] = None, choices: Optional[Sequence] = None, optional: bool = False):
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.expected = expected
+        self.minimum = minimum
+        self.maximum = maximum
+        self.exclusive_minimum = exclusive_minimum
+        self.pattern = pattern
+        self.choices = tuple(choices) if choices is not None else None
+        self.optional = optional
+
+    def passes(self, value) -> bool:
+        return (value.__class__ in self.types and
+                (self.minimum is None or self.minimum <= value) and
+                (self.maximum is None or value <= self.maximum) and
+                (self.exclusive_minimum is None or self.exclusive_minimum < value) and
+                (self.pattern is None or self.pattern.match(value) is not None) and
+                (self.choices is None or value in self.choices))
+
+    def compile(self) -> Validator:
+        passes, expected, optional = self.passes, self.expected, self.optional
+
+        def validate(value, path, errors):
+            if value is MISSING:
+                if not optional:
+                    errors.append(f"{path}: missing")
+                return
+            if not passes(value):
+                errors.append(f"{path}: expected {expected}, got {value!r}")
+        return validate
+
+    def emit(self, builder: CheckBuilder, var: str, indent: int) -> None:
+        # Plain comparisons in the generated source, a call only for a pattern
+        if len(self.types) == 1:
+            failures = [f"{var}.__class__ is not {builder.constant(self.types[0])}"]
+        else:
+            failures = [f"{var}.__class__ not in {builder.constant(self.types)}"]
+        if self.minimum is not None:
+            failures.append(f"{var} < {self.minimum!r}")
+        if self.maximum is not None:
+            failures.append(f"{var} > {self.maximum!r}")
+        if self.exclusive_minimum is not None:
+            failures.append(f"{var} <= {self.exclusive_minimum!r}")
+        if self.pattern is not None:
+            failures.append(f"{builder.constant(self.pattern.match)}({var}) is None")
+        if self.choices is not None:
+            failures.append(f"{var} not in {builder.constant(self.choices)}")
+        condition = ' or '.join(failures)
+        if self.optional:
+            builder.add(indent, f"if {var} is not MISSING and ({condition}): return False")
+        else:
+            builder.add(indent, f"if {condition}: return False")
+
+class ListOf:
+    def __init__(self, item, optional: bool = False):
+        self.item = item
+        self.optional = optional
+
+    def compile(self) -> Validator:
+        validate_item = self.item.compile()
+        optional = self.optional
+
+        def validate(value, path, errors):
+            if value is MISSING:
+                if not optional:
+                    errors.append(f"{path}: missing")
+                return
+            if not isinstance(value, list):
+                errors.append(f"{path}: expected a list, got {value!r}")
+                return
+            for index, item in enumerate(value):
+                validate_item(item, f"{path}[{index}]", errors)
+        return validate
+
+    def emit(self, builder: CheckBuilder, var: str, indent: int) -> None:
+        if self.optional:
+            builder.add(indent, f"if {var} is not MISSING:")
+            indent += 1
+        builder.add(indent, f"if not isinstance({var}, list): return False")
+        item = builder.name()
+        builder.add(indent, f"for {item} in {var}:")
+        self.item.emit(builder, item, indent + 1)
+
+class Record:
+    """
+    A JSON object (dict) or, with cls, an instance whose fields are attributes.
+
+    With enabled_by the other fields are only checked while that field is
+    true, rules are (field, predicate of the whole record, expectation)
+    checks between fields.
+    """
+
+    def __init__(self, fields: Dict[str, Any], cls: Optional[type] = None, enabled_by: Optional[str] = None,
+                 rules: Sequence[Tuple[str, Callable[[Any], bool], str]] = (), optional: bool = False):
+        self.fields = fields
+        self.cls = cls
+        self.enabled_by = enabled_by
+        self.rules = rules
+        self.optional = optional
+
+    def compile(self) -> Validator:
+        fields = [(name, node.compile()) for name, node in self.fields.items()]
+        cls, enabled_by, rules, optional = self.cls, self.enabled_by, tuple(self.rules), self.optional
+
+        def validate(value, path, errors):
+            if value is MISSING:
+                if not optional:
+                    errors.append(f"{path}: missing")
+                return
+            if cls is not None:
+                if not isinstance(value, cls):
+                    errors.append(f"{path}: expected an object, got {value!r}")
+                    return
+                get = lambda name: getattr(value, name, MISSING)
+            else:
+                if not isinstance(value, dict):
+                    errors.append(f"{path}: expected an object, got {value!r}")
+                    return
+                get = lambda name: value.get(name, MISSING)
+
+            for name, validate_field in fields:
+                field_value = get(name)
+                validate_field(field_value, join_path(path, name), errors)
+                if name == enabled_by and field_value is not True:
+                    return
+            for name, predicate, expected in rules:
+                if not predicate(value):
+                    errors.append(f"{join_path(path, name)}: expected {expected}")
+        return validate
+
+    def emit(self, builder: CheckBuilder, var: str, indent: int) -> None:
+        if self.optional:
+            builder.add(indent, f"if {var} is not MISSING:")
+            indent += 1
+        builder.add(indent, f"if not isinstance({var}, {builder.constant(self.cls or dict)}): return False")
+        for name, node in self.fields.items():
+            field_var = builder.name()
+            if self.cls is not None:
+                # Instances of the class always have its fields
+                builder.add(indent, f"{field_var} = {var}.{name}")
+            else:
+                builder.add(indent, f"{field_var} = {var}.get({name!r}, MISSING)")
+            node.emit(builder, field_var, indent)
+            if name == self.enabled_by:
+                # The rest only matters while enabled
+                builder.add(indent, f"if {field_var} is True:")
+                indent += 1
+        for _, predicate, _ in self.rules:
+            builder.add(indent, f"if not {builder.constant(predicate)}({var}): return False")
+        if self.enabled_by is not None:
+            builder.add(indent, "pass")
+
+def compile_schema(node) -> Validator:
+    """
+    Validator of a schema: a check function generated from it tells whether a
+    value is valid with a few plain statements, the paths of the problems are
+    only worked out for an invalid value.
+    """
+    builder = CheckBuilder()
+    node.emit(builder, 'value', 1)
+    check = builder.build()
+    report = node.compile()
+
+    def validate(value, path, errors):
+        if not check(value):
+            report(value, path, errors)
+    # Only whether the value is valid, for callers checking many values
+    validate.check = check
+    return validate
+
+TIME_PATTERN = re.compile(r'^([01]?\d|2[0-3]):[0-5]\d$')
+# Tk gives negative positions (e.g. +-1920+0) on a monitor left of the main one
+GEOMETRY_PATTERN = re.compile(r'^\d+x\d+[+-]-?\d+[+-]-?\d+$')
+
+def program_schema() -> Record:
+    return Record({
+        'name': Value(str, "a string", optional=True),
+        'enabled': Value(bool, "true or false", optional=True),
+        'start_times': ListOf(Value(str, "a time as HH:MM", pattern=TIME_PATTERN)),
+        'weekdays': ListOf(Value(int, "a weekday from 0 (Monday) to 6", minimum=0, maximum=6), optional=True),
+        'zones': ListOf(Record({
+            'zone': Value(int, "a zone index", minimum=0),
+            'minutes': Value((int, float), "a number of minutes above 0", exclusive_minimum=0),
+        })),
+    })
+
+def general_schema() -> Record:
+    return Record({
+        'open_master_automatically': Value(bool, "true or false"),
+        'close_master_automatically': Value(bool, "true or false", optional=True),
+        'close_dependent_automatically': Value(bool, "true or false", optional=True),
+    })
+
+def mqtt_schema(transports: Sequence[str]) -> Record:
+    # Not checked further while MQTT is disabled, so a half-filled section can still be loaded
+    return Record({
+        'enabled': Value(bool, "true or false", optional=True),
+        'broker': Value(str, "a host name", optional=True),
+        'port': Value(int, "a port from 1 to 65535", minimum=1, maximum=65535, optional=True),
+        'username': Value(str, "a string", optional=True),
+        'password': Value(str, "a string", optional=True),
+        'client_id': Value(str, "a string", optional=True),
+        'topic_prefix': Value(str, "a string", optional=True),
+        'use_tls': Value(bool, "true or false", optional=True),
+        'ca_cert_path': Value(str, "a file path", optional=True),
+        'status_update_interval': Value(int, "an integer", optional=True),
+        'transport': Value(str, "one of " + ', '.join(transports), choices=transports, optional=True),
+        'command_release_delay': Value((int, float), "0 or more seconds", minimum=0, optional=True),
+        'persistent_session': Value(bool, "true or false", optional=True),
+    }, enabled_by='enabled', rules=[
+        # The broker finds the session by the client id
+        ('client_id', lambda mqtt: not mqtt.get('persistent_session') or bool(mqtt.get('client_id')),
+         "a client id for the persistent session"),
+    ])
+
+def zone_schema(zone_class: type) -> Record:
+    return Record({
+        'name': Value(str, "a string"),
+        'enabled': Value(bool, "true or false"),
+        'master_zone': Value(int, "a zone index or -1", minimum=-1),
+        'is_master': Value(bool, "true or false"),
+        # 0 means no limit
+        'max_run_minutes': Value((int, float), "0 or more minutes", minimum=0),
+    }, cls=zone_class)
+
+def app_settings_schema(settings_class: type) -> Record:
+    return Record({
+        'language': Value(str, "a language name"),
+        'window_geometry': Value(str, "a geometry like 700x700+0+0", pattern=GEOMETRY_PATTERN),
+        # None until set on the first load, or until a zone config is loaded
+        'last_config_directory': Value((str, type(None)), "a directory path"),
+        'last_config_file': Value((str, type(None)), "a file path"),
+    }, cls=settings_class)
+
+def _masters_valid(zones: Sequence) -> bool:
+    """
+    Whether every master reference is fine, with a single pass over the zones:
+    the usual case of masters which have no master themselves
+    """
+    try:
+        masters = {zone.master_zone for zone in zones}
+        masters.discard(-1)
+        zone_count = len(zones)
+        return all(master_id.__class__ is int and 0 <= master_id < zone_count and
+                   zones[master_id].is_master is True and zones[master_id].master_zone == -1
+                   for master_id in masters)
+    except (AttributeError, TypeError):
+        # Not even zones, which the schema reports
+        return False
+
+def _master_errors(zones: Sequence) -> List[str]:
+    errors = []
+    zone_count = len(zones)
+    masters = [getattr(zone, 'master_zone', -1) for zone in zones]
+    for zone_id, master_id in enumerate(masters):
+        if master_id.__class__ is not int or master_id < 0:
+            continue
+        path = f"zones[{zone_id}].master_zone"
+        if master_id >= zone_count:
+            errors.append(f"{path}: zone {master_id} doesn't exist")
+        elif master_id == zone_id:
+            errors.append(f"{path}: a zone can't be its own master")
+        elif getattr(zones[master_id], 'is_master', None) is not True:
+            errors.append(f"{path}: zone {master_id} is not a master zone")
+        elif masters[master_id].__class__ is int and masters[master_id] >= 0:
+            # Follow the masters of the master, reported by every zone of a loop
+            seen = {zone_id}
+            current = master_id
+            while current.__class__ is int and 0 <= current < zone_count and current not in seen:
+                seen.add(current)
+                current = masters[current]
+            if current == zone_id:
+                errors.append(f"{path}: master zones form a cycle")
+    return errors
+
+def reference_errors(zones: Sequence, programs: Sequence) -> List[str]:
+    """
+    Zone indexes pointing nowhere: masters which don't exist, aren't flagged
+    is_master or form a cycle, and program steps of missing zones. Zones and
+    steps which failed the schema are skipped, they are reported already.
+    """
+    errors = [] if _masters_valid(zones) else _master_errors(zones)
+
+    zone_count = len(zones)
+    for program_index, program in enumerate(programs if isinstance(programs, list) else []):
+        steps = program.get('zones') if isinstance(program, dict) else None
+        for step_index, step in enumerate(steps if isinstance(steps, list) else []):
+            zone_id = step.get('zone') if isinstance(step, dict) else None
+            if zone_id.__class__ is int and zone_id >= zone_count:
+                errors.append(f"programs[{program_index}].zones[{step_index}].zone: zone {zone_id} doesn't exist")
+    return errors
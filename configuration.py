@@ -1,11 +1,19 @@
+import copy
 import json
 import os
-from typing import Tuple, Optional, List, Dict
-from dataclasses import dataclass, asdict
+from typing import Any, Tuple, Optional, List, Dict, Set
+from dataclasses import dataclass, asdict, field
 import hashlib
-import re
-from constants import SUPPORTED_LANGUAGES, DEFAULT_ZONE_CONFIG, DEFAULT_APP_SETTINGS
-from utils import ensure_directory_exists, localization
+from concurrent.futures import Future, CancelledError, InvalidStateError
+from threading import Event, Thread
+from constants import SUPPORTED_LANGUAGES, DEFAULT_ZONE_CONFIG, DEFAULT_APP_SETTINGS, MQTT_TRANSPORTS, ZONE_CONFIG_ERRORS_SHOWN
+from utils import localization
+from persistence import PersistenceService
+from json_stream import load_object_streaming
+from config_schema import (
+    compile_schema, app_settings_schema, zone_schema, general_schema, mqtt_schema, program_schema,
+    reference_errors, ListOf
+)
 
 @dataclass
 class AppSettings:
@@ -14,14 +22,14 @@ class AppSettings:
     last_config_directory: str
     last_config_file: str
 
+    def errors(self) -> List[str]:
+        """Every invalid setting, as "field: problem" """
+        errors = []
+        _validate_app_settings(self, '', errors)
+        return errors
+
     def validate(self) -> bool:
-        return (
-            isinstance(self.language, str) and
-            isinstance(self.window_geometry, str) and
-            re.match(r'^\d+x\d+\+\d+\+\d+$', self.window_geometry) and
-            isinstance(self.last_config_directory, str),
-            isinstance(self.last_config_file, str)
-        )
+        return not self.errors()
 
     def __dict__(self) -> Dict:
         return asdict(self)
@@ -29,61 +37,332 @@ class AppSettings:
     def to_json(self) -> Dict:
         return self.__dict__()
 
+# Validators compiled once from the schemas in config_schema.py
+_validate_app_settings = compile_schema(app_settings_schema(AppSettings))
+
+class Zone:
+    """
+    One zone of the zone config.
+
+    Slots instead of a dict per zone: a few times less memory, and the fields
+    are read as attributes in the hot paths. Stored in the zone config file as
+    a JSON object of the same fields.
+    """
+
+    __slots__ = ('name', 'enabled', 'master_zone', 'is_master', 'max_run_minutes')
+
+    def __init__(self, name: str, enabled: bool = True, master_zone: int = -1, is_master: bool = False,
+                 max_run_minutes: float = 0):
+        self.name = name
+        self.enabled = enabled
+        # Index of the master zone, -1 if none
+        self.master_zone = master_zone
+        self.is_master = is_master
+        # Turned off automatically after this many minutes, 0 means no limit
+        self.max_run_minutes = max_run_minutes
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'Zone':
+        """Zone from its JSON object, missing fields are None (except max_run_minutes) and fail validation"""
+        return cls(data.get('name'), data.get('enabled'), data.get('master_zone'), data.get('is_master'),
+                   data.get('max_run_minutes', 0))
+
+    def to_json(self) -> Dict:
+        data = {
+            'name': self.name,
+            'enabled': self.enabled,
+            'master_zone': self.master_zone,
+            'is_master': self.is_master
+        }
+        if self.max_run_minutes:
+            data['max_run_minutes'] = self.max_run_minutes
+        return data
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Zone):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Zone({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+
+_validate_zone = compile_schema(zone_schema(Zone))
+_validate_zones = compile_schema(ListOf(zone_schema(Zone)))
+_validate_general = compile_schema(general_schema())
+_validate_mqtt = compile_schema(mqtt_schema(MQTT_TRANSPORTS))
+_validate_programs = compile_schema(ListOf(program_schema()))
+
 @dataclass
 class ZoneConfig:
-    zones: List[Dict]
+    zones: List[Zone]
     general: Dict
     mqtt: Dict
+    # Irrigation programs run by the scheduler, see scheduler.py
+    programs: List[Dict] = field(default_factory=list)
+
+    def __post_init__(self):
+        # Zones as read from JSON are converted, always into a list of our own.
+        # Anything else is kept as it is, for validation to report it.
+        if isinstance(self.zones, list):
+            self.zones = [Zone.from_json(zone) if isinstance(zone, dict) else zone for zone in self.zones]
+
+        # Change tracking, kept out of the dataclass fields so it is never saved.
+        # Every edit made through the set_*/add_zone/remove_last_zone methods bumps the
+        # revision, so "unsaved?" doesn't need to look at the data.
+        self.revision = 0
+        self.saved_revision: Optional[int] = None
+
+        # Errors of every part of the config, None until validated; only the zones with
+        # errors have an entry. Edits mark the parts they touched as stale, errors() only
+        # checks those again.
+        self._errors: Optional[Dict[str, List[str]]] = None
+        self._zone_errors: Dict[int, List[str]] = {}
+        self._stale: Set[Any] = set()
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.saved_revision != self.revision
+
+    def _changed(self, field: str) -> None:
+        self.revision += 1
+
+        section, _, rest = field.partition('.')
+        if section == 'zones' and rest:
+            zone_id, _, zone_field = rest.partition('.')
+            self._stale.add(('zone', int(zone_id)))
+            if zone_field in ('master_zone', 'is_master'):
+                self._stale.add('references')
+        elif section == 'zones':
+            # Added or removed, indexes everywhere may be affected
+            self._errors = None
+        else:
+            self._stale.add(section)
+            if section == 'programs':
+                self._stale.add('references')
+
+    def mark_saved(self) -> None:
+        """The current state is the one in the file"""
+        self.saved_revision = self.revision
+
+    def set_zone_field(self, zone_id: int, field: str, value: Any) -> bool:
+        """Set a field of a zone, returns True if the value changed"""
+        zone = self.zones[zone_id]
+        if getattr(zone, field) == value:
+            return False
+        setattr(zone, field, value)
+        self._changed(f"zones.{zone_id}.{field}")
+        return True
+
+    def set_general(self, field: str, value: Any) -> bool:
+        """Set a general setting, returns True if the value changed"""
+        if field in self.general and self.general[field] == value:
+            return False
+        self.general[field] = value
+        self._changed(f"general.{field}")
+        return True
+
+    def set_mqtt(self, field: str, value: Any) -> bool:
+        """Set an MQTT setting, returns True if the value changed"""
+        if field in self.mqtt and self.mqtt[field] == value:
+            return False
+        self.mqtt[field] = value
+        self._changed(f"mqtt.{field}")
+        return True
+
+    def add_zone(self, zone: Zone) -> int:
+        """Append a zone, returns its id"""
+        self.zones.append(zone)
+        self._changed('zones')
+        return len(self.zones) - 1
+
+    def remove_last_zone(self) -> Zone:
+        """Remove the last zone, references of masters to it have to be cleared by the caller"""
+        zone = self.zones.pop()
+        self._changed('zones')
+        # Programs don't run the removed zone anymore
+        zone_id = len(self.zones)
+        for program in self.programs:
+            steps = [step for step in program.get('zones', []) if step.get('zone') != zone_id]
+            if len(steps) != len(program.get('zones', [])):
+                program['zones'] = steps
+                self._changed('programs')
+        return zone
+
+    def _section_errors(self, section: str) -> List[str]:
+        errors: List[str] = []
+        if section == 'general':
+            _validate_general(self.general, 'general', errors)
+        elif section == 'mqtt':
+            _validate_mqtt(self.mqtt, 'mqtt', errors)
+        elif section == 'programs':
+            _validate_programs(self.programs, 'programs', errors)
+        elif section == 'references':
+            errors = reference_errors(self.zones, self.programs)
+        return errors
+
+    @staticmethod
+    def zone_errors(zone: Any, zone_id: int) -> List[str]:
+        """Problems of a single zone, without the references to other zones"""
+        errors: List[str] = []
+        _validate_zone(zone, f"zones[{zone_id}]", errors)
+        return errors
+
+    def zones_checked(self, zone_errors: Dict[int, List[str]]) -> None:
+        """Take the errors of the zones checked one by one while loading, errors() then only checks the rest"""
+        self._zone_errors = zone_errors
+        self._errors = {}
+        self._stale = {'general', 'mqtt', 'programs', 'references'}
+
+    def _check_zone(self, zone_id: int) -> None:
+        errors = self.zone_errors(self.zones[zone_id], zone_id)
+        if errors:
+            self._zone_errors[zone_id] = errors
+        else:
+            self._zone_errors.pop(zone_id, None)
 
-    def validate_zone(self, zone) -> bool:
-        return (
-            isinstance(zone.get('name', None), str) and
-            isinstance(zone.get('enabled', None), bool) and
-            isinstance(zone.get('master_zone', None), int) and
-            isinstance(zone.get('is_master', None), bool) and
-            zone.get('master_zone', 0) > -2 and
-            zone.get('master_zone', 0) < 8
-        )
+    def errors(self) -> List[str]:
+        """
+        Every problem of the zone config, as "path: problem" (e.g. "zones[3].master_zone: ...").
+
+        After the first call only the parts edited since then are checked again,
+        e.g. a single zone when its name is typed in.
+        """
+        if self._errors is None:
+            self._stale.clear()
+            zone_errors: List[str] = []
+            _validate_zones(self.zones, 'zones', zone_errors)
+            if not isinstance(self.zones, list):
+                return zone_errors
+            self._zone_errors = {}
+            if zone_errors:
+                for zone_id in range(len(self.zones)):
+                    self._check_zone(zone_id)
+            self._errors = {section: self._section_errors(section)
+                            for section in ('general', 'mqtt', 'programs', 'references')}
+        elif self._stale:
+            stale, self._stale = self._stale, set()
+            for section in stale:
+                if isinstance(section, tuple):
+                    # Zones are checked in full after being added or removed, see _changed()
+                    if section[1] < len(self.zones):
+                        self._check_zone(section[1])
+                else:
+                    self._errors[section] = self._section_errors(section)
+        errors = [error for zone_id in sorted(self._zone_errors) for error in self._zone_errors[zone_id]]
+        return errors + [error for section_errors in self._errors.values() for error in section_errors]
 
     def validate(self) -> bool:
-        mqtt_valid = (
-            isinstance(self.mqtt, dict) and
-            isinstance(self.mqtt.get('enabled', False), bool) and
-            # Only validate other MQTT fields if enabled is True
-            (not self.mqtt.get('enabled', False) or (
-                isinstance(self.mqtt.get('broker', ''), str) and
-                isinstance(self.mqtt.get('port', 0), int) and
-                isinstance(self.mqtt.get('username', ''), str) and
-                isinstance(self.mqtt.get('password', ''), str) and
-                isinstance(self.mqtt.get('client_id', ''), str) and
-                isinstance(self.mqtt.get('topic_prefix', ''), str) and
-                isinstance(self.mqtt.get('use_tls', False), bool) and
-                isinstance(self.mqtt.get('ca_cert_path', ''), str) and
-                isinstance(self.mqtt.get('status_update_interval', 0), int)
-            ))
-        )
-
-        return (
-            isinstance(self.general.get('open_master_automatically', None), bool) and
-            all(self.validate_zone(zone) for zone in self.zones) and
-            len(self.zones) < 9 and
-            mqtt_valid
-        )
+        """Check the whole zone config again"""
+        self._errors = None
+        return not self.errors()
 
     def __dict__(self) -> Dict:
-        return asdict(self)
+        # Same layout as asdict() gave with dict zones, so files stay compatible
+        return {
+            'zones': [zone.to_json() for zone in self.zones],
+            'general': copy.deepcopy(self.general),
+            'mqtt': copy.deepcopy(self.mqtt),
+            'programs': copy.deepcopy(self.programs)
+        }
 
     def to_json(self) -> Dict:
         return self.__dict__()
 
+class ZoneConfigLoad:
+    """
+    Loading of a zone config file, which can run on a background thread.
+
+    The zones are parsed one at a time and converted and checked as they
+    arrive, so progress (the parsed part of the file) can be shown and the
+    load can be cancelled between two zones. The future gives the checked
+    ZoneConfig, which Configuration.finish_zone_config_load() puts in use.
+
+    Without streaming the file is parsed in one go, which is faster when
+    nobody is waiting for the progress.
+    """
+
+    def __init__(self, filename: str, streaming: bool = True):
+        self.filename = filename
+        self.streaming = streaming
+        self.future: Future = Future()
+        # Parsed part of the file, from 0 to 1
+        self.progress = 0.0
+        self._cancel = Event()
+
+    def start(self) -> 'ZoneConfigLoad':
+        Thread(target=self.run, name='zone-config-load', daemon=True).start()
+        return self
+
+    def cancel(self) -> None:
+        """Stop at the next zone, the config in use stays as it is"""
+        self._cancel.set()
+        self.future.cancel()
+
+    def run(self) -> None:
+        try:
+            try:
+                zone_config = self.load()
+            except CancelledError:
+                return
+            except Exception as e:
+                self.future.set_exception(e)
+            else:
+                self.future.set_result(zone_config)
+        except InvalidStateError:
+            # Cancelled meanwhile
+            pass
+
+    def load(self) -> ZoneConfig:
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            text = f.read()
+        if not self.streaming:
+            zone_config = ZoneConfig(**json.loads(text))
+            zone_config.errors()
+            self.progress = 1.0
+            return zone_config
+
+        length = max(len(text), 1)
+        zone_errors: Dict[int, List[str]] = {}
+        check_zone = _validate_zone.check
+
+        def zone_parsed(zone_id: int, zone: Any, end: int) -> Any:
+            if self._cancel.is_set():
+                raise CancelledError()
+            if zone_id == 0:
+                # A repeated "zones" key replaces the earlier one
+                zone_errors.clear()
+            if isinstance(zone, dict):
+                zone = Zone.from_json(zone)
+            if not check_zone(zone):
+                zone_errors[zone_id] = ZoneConfig.zone_errors(zone, zone_id)
+            self.progress = end / length
+            return zone
+
+        zone_config_json = load_object_streaming(text, 'zones', zone_parsed)
+        if self._cancel.is_set():
+            raise CancelledError()
+        zone_config = ZoneConfig(**zone_config_json)
+        if isinstance(zone_config.zones, list):
+            zone_config.zones_checked(zone_errors)
+        # The rest is checked here too, off the Tk thread
+        zone_config.errors()
+        self.progress = 1.0
+        return zone_config
+
 class Configuration:
     def __init__(self, app_settings_file: str):
         self.app_settings_file = app_settings_file
         self.app_settings = AppSettings(**DEFAULT_APP_SETTINGS.copy())
         self.zone_config = ZoneConfig(**DEFAULT_ZONE_CONFIG.copy())
         self.current_zone_config_file: Optional[str] = None
+        # Hash of the last saved file content, only used to skip rewriting an unchanged file
         self.last_saved_hash: Optional[str] = None
 
+        # Files are written atomically on a background thread, a burst of saves is one write
+        self.persistence = PersistenceService()
+        # Pending or finished write of the zone config, for reporting its result
+        self.zone_config_write: Optional[Future] = None
+
         # Available languages and their short codes
         self.languages = SUPPORTED_LANGUAGES
 
@@ -91,12 +370,8 @@ class Configuration:
         self.current_language = self.app_settings.language
         self._, self.ngettext = localization.setup_locale(self.languages[self.current_language])
 
-    def _calculate_zone_config_hash(self) -> str:
-        config_json = json.dumps(self.zone_config.to_json(), sort_keys=True)
-        return hashlib.sha256(config_json.encode()).hexdigest()
-
     def has_unsaved_changes(self) -> bool:
-        return self.last_saved_hash != self._calculate_zone_config_hash()
+        return self.zone_config.is_dirty
 
     def load_app_settings(self) -> AppSettings:
         """Load and validate app related settings from JSON file"""
@@ -114,27 +389,30 @@ class Configuration:
 
             # Validate app settings, before overwriting
             new_app_settings = AppSettings(**new_app_settings)
-            if new_app_settings.validate():
+            errors = new_app_settings.errors()
+            if not errors:
                 self.app_settings = new_app_settings
                 return True, None
             else:
-                return False, self._("Invalid app settings format")
+                return False, self._("Invalid app settings format") + ":\n" + '\n'.join(errors)
         except json.JSONDecodeError:
             return False, self._("Invalid JSON file for app settings")
         except Exception as e:
             return False, self._("Warning: Could not load app settings: {}").format(e)
 
     def save_app_settings(self) -> Tuple[bool, Optional[str]]:
-        """Save current app settings to JSON file"""
+        """Queue saving the current app settings to JSON file, written in the background"""
         try:
-            ensure_directory_exists(self.app_settings_file)
-
-            with open(self.app_settings_file, 'w', encoding='utf-8') as f:
-                json.dump(self.app_settings.to_json(), f, indent=4, ensure_ascii=False)
+            settings_json = json.dumps(self.app_settings.to_json(), indent=4, ensure_ascii=False)
+            self.persistence.write(self.app_settings_file, settings_json)
             return True, None
         except Exception as e:
             return False, str(e)
 
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued file is written, returns False on timeout"""
+        return self.persistence.flush(timeout)
+
     def change_language(self, new_language):
         """Change application language"""
         if new_language != self.current_language:
@@ -145,38 +423,86 @@ class Configuration:
         return self._, self.ngettext
 
     def save_zone_config(self, filename: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """
+        Queue saving the zone config, the write itself happens in the background.
+
+        The result of the write is reported by zone_config_write, if it fails
+        the zone config counts as unsaved again.
+        """
         try:
             target_file = filename or self.current_zone_config_file
             if not target_file:
                 return False, self._("No file specified")
+            # A file which couldn't be loaded again is not written, only the edited parts are checked
+            errors = self.zone_config.errors()
+            if errors:
+                return False, self._("Invalid zone config format") + ":\n" + '\n'.join(errors[:ZONE_CONFIG_ERRORS_SHOWN])
 
-            with open(target_file, 'w', encoding='utf-8') as f:
-                json.dump(self.zone_config.to_json(), f, indent=4, ensure_ascii=False)
+            config_json = json.dumps(self.zone_config.to_json(), indent=4, ensure_ascii=False)
+            config_hash = hashlib.sha256(config_json.encode()).hexdigest()
+
+            # Edits which were reverted leave the file as it is
+            if (target_file != self.current_zone_config_file or config_hash != self.last_saved_hash
+                    or not os.path.exists(target_file)):
+                write = self.persistence.write(target_file, config_json)
+            else:
+                write = Future()
+                write.set_result(target_file)
 
             self.current_zone_config_file = target_file
             self.app_settings.last_config_file = target_file
-            self.last_saved_hash = self._calculate_zone_config_hash()
+            self.last_saved_hash = config_hash
+            self.zone_config.mark_saved()
+            write.add_done_callback(self._zone_config_written(self.zone_config))
+            self.zone_config_write = write
             self.save_app_settings()
             return True, None
         except Exception as e:
             return False, str(e)
 
+    def _zone_config_written(self, zone_config: ZoneConfig):
+        revision = zone_config.revision
+
+        def done(future: Future):
+            # Unsaved again, unless it was edited (and so marked unsaved) since
+            if future.exception() is not None and zone_config.saved_revision == revision:
+                zone_config.saved_revision = None
+                if zone_config is self.zone_config:
+                    self.last_saved_hash = None
+        return done
+
     def load_zone_config(self, filename: str) -> Tuple[bool, Optional[str]]:
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                zone_config_json = json.load(f)
+        """Load a zone config file, waiting for it"""
+        load = ZoneConfigLoad(filename, streaming=False)
+        load.run()
+        return self.finish_zone_config_load(load)
+
+    def start_zone_config_load(self, filename: str) -> ZoneConfigLoad:
+        """Load a zone config file on a background thread, see finish_zone_config_load()"""
+        return ZoneConfigLoad(filename).start()
 
-            # Validate zone config structure, before overwriting
-            new_zone_config = ZoneConfig(**zone_config_json)
-            if new_zone_config.validate():
+    def finish_zone_config_load(self, load: ZoneConfigLoad) -> Tuple[bool, Optional[str]]:
+        """Put the config of a completed load in use (in a single step, on the calling thread) if it is valid"""
+        try:
+            # Validated before overwriting, while loading
+            new_zone_config = load.future.result()
+            filename = load.filename
+            errors = new_zone_config.errors()
+            if not errors:
+                new_zone_config.mark_saved()
                 self.zone_config = new_zone_config
                 self.current_zone_config_file = filename
                 self.app_settings.last_config_file = filename
-                self.last_saved_hash = self._calculate_zone_config_hash()
+                # Not known until the first save, which then always writes the file
+                self.last_saved_hash = None
                 self.save_app_settings()
                 return True, None
             else:
-                return False, self._("Invalid zone config format")
+                # Every problem, up to a screenful
+                details = '\n'.join(errors[:ZONE_CONFIG_ERRORS_SHOWN])
+                if len(errors) > ZONE_CONFIG_ERRORS_SHOWN:
+                    details += '\n…'
+                return False, self._("Invalid zone config format") + ":\n" + details
         except json.JSONDecodeError:
             return False, self._("Invalid JSON file for zone config")
         except Exception as e:
@@ -30,7 +30,10 @@ DEFAULT_ZONE_CONFIG: Dict[str, Any] = {
         'topic_prefix': 'irrigation',
         'use_tls': False,
         'ca_cert_path': '',
-        'status_update_interval': 30
+        'status_update_interval': 30,
+        'transport': 'threaded',
+        'command_release_delay': 2.0,
+        'persistent_session': False
     }
 }
 
@@ -41,7 +44,61 @@ DEFAULT_APP_SETTINGS: Dict = {
     'last_config_file': 'irrigation_zone_config.json'
 }
 
+# Reconnect backoff of the MQTT clients (in seconds)
+MQTT_RECONNECT_MIN_DELAY: float = 1
+MQTT_RECONNECT_MAX_DELAY: float = 120
+
+# Commands queued while the MQTT broker is unreachable: at most one per zone,
+# at most this many zones, and only sent if not older than the maximum age (in seconds)
+MQTT_OUTBOX_MAX_SIZE: int = 1000
+MQTT_OUTBOX_MAX_AGE: float = 300
+# Longest wait (in seconds) for the broker to acknowledge a master zone's command
+# before the commands of its dependent zones are sent anyway
+MQTT_COMMAND_RELEASE_DELAY: float = 2.0
+
+# After connecting, the retained and first state messages are gathered until none came for
+# this long (in seconds), but at most for MQTT_BOOTSTRAP_MAX_WINDOW, and applied as one snapshot
+MQTT_BOOTSTRAP_SETTLE: float = 0.3
+MQTT_BOOTSTRAP_MAX_WINDOW: float = 2.0
+
+# A valve which doesn't report the commanded state within this time (in seconds) counts as a timeout
+MQTT_STATE_CONFIRM_TIMEOUT: float = 30
+
+# A wall-clock change larger than this (in seconds) reschedules the irrigation programs
+SCHEDULER_CLOCK_JUMP_TOLERANCE: float = 2.0
+
+# At most this many problems of an invalid zone config file are shown
+ZONE_CONFIG_ERRORS_SHOWN: int = 20
+
+# The zone state journal is compacted into a snapshot after this many transitions
+STATE_JOURNAL_COMPACT_LINES: int = 1000
+
+# How often the GUI shows the queued commands (in milliseconds)
+MQTT_OUTBOX_STATUS_INTERVAL_MS: int = 1000
+# How often the GUI shows the running programs and the next program start (in milliseconds)
+PROGRAM_STATUS_INTERVAL_MS: int = 1000
+
+# Log records go through a queue to one writer thread, the log file is rotated
+# at this size (in bytes) and this many gzip-ed backups are kept
+LOG_MAX_BYTES: int = 5 * 1024 * 1024
+LOG_BACKUP_COUNT: int = 5
+LOG_FORMAT = '%(asctime)s %(levelname)s %(filename)s: %(message)s'
+LOG_DATE_FORMAT = '%H:%M:%S'
+# Modules whose log level can be changed from the GUI
+LOG_MODULES = ('mqtt_client', 'mqtt_async', 'zone_controller', 'zone_control', 'configuration')
+
+# MQTT client implementations selectable with the 'transport' key of the mqtt config
+MQTT_TRANSPORTS = ('threaded', 'asyncio')
+
 SUPPORTED_LANGUAGES = {
     'English': 'en',
     'Magyar': 'hu'
-}
\ No newline at end of file
+}
+
+# How often the Tk thread drains inbound MQTT events (in milliseconds)
+MQTT_EVENT_PUMP_INTERVAL_MS: int = 50
+
+# Height of a zone row on the Control tab until the first rendered zone is measured (in pixels)
+CONTROL_ROW_HEIGHT: int = 150
+# Height of a zone row on the Configuration tab until the first rendered row is measured (in pixels)
+CONFIG_ROW_HEIGHT: int = 40
@@ -0,0 +1,47 @@
+from threading import Event, Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+class CoalescingEventQueue:
+    """
+    Thread-safe event queue which keeps only the latest value per key.
+
+    Producers (e.g. the MQTT network thread) call put() and never touch any
+    widgets, the consumer (the Tk thread) periodically calls drain() and
+    receives every key at most once, in the order of their latest update.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._ready = Event()
+        self._pending: Dict[Hashable, Any] = {}
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Queue an event, replacing any not yet drained value of the same key"""
+        with self._lock:
+            # Re-insert to move the key to the end, so ordering follows the latest update
+            self._pending.pop(key, None)
+            self._pending[key] = value
+            self._ready.set()
+
+    def drain(self) -> List[Tuple[Hashable, Any]]:
+        """Return and remove all pending events"""
+        with self._lock:
+            self._ready.clear()
+            if not self._pending:
+                return []
+            pending, self._pending = self._pending, {}
+        return list(pending.items())
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until there are pending events, returns False on timeout"""
+        return self._ready.wait(timeout)
+
+    def clear(self) -> None:
+        """Drop all pending events"""
+        with self._lock:
+            self._ready.clear()
+            self._pending = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
@@ -3,7 +3,7 @@
 if [ ! -d "locales" ]; then
    mkdir locales
 fi
-xgettext -d messages -o locales/messages.pot main.py configuration.py mqtt_client.py zone_control.py --from-code UTF-8
+xgettext -d messages -o locales/messages.pot main.py gui_app.py configuration.py mqtt_client.py zone_control.py zone_controller.py mqtt_async.py headless.py command_pipeline.py zone_latency.py scheduler.py state_journal.py --keyword=N_ --from-code UTF-8
 
 if [ ! -d "locales/hu/LC_MESSAGES" ]; then
     mkdir -p locales/hu/LC_MESSAGES
@@ -0,0 +1,367 @@
+"""
+The Tk window of ValveControl 2000, started by main.py.
+
+Kept apart from main.py, so "main.py --headless" runs without importing Tk.
+"""
+import time
+from tkinter import messagebox, PhotoImage, Menu, BooleanVar, StringVar, Tk, Toplevel, BOTH, filedialog, ttk
+import os
+from typing import Iterable, Optional, Tuple
+import logging
+from utils import get_resource_path, get_user_data_path
+from configuration import Configuration, ZoneConfigLoad
+from constants import DEFAULT_APP_SETTINGS
+from zone_control import ZoneControlFrame
+from text_registry import TextRegistry, N_
+from startup_profiler import StartupProfiler
+from log_pipeline import LoggingPipeline, LOG_LEVELS
+from state_journal import StateJournal
+
+class IrrigationApp:
+    def __init__(self, icon: Optional[str] = "assets/icon", app_name: Optional[str] = "ValveControl 2000", app_author: Optional[str] = "GyB", profiler: Optional[StartupProfiler] = None, log_levels: Iterable[Tuple[Optional[str], str]] = (), metrics_address: Optional[Tuple[str, int]] = None):
+        self.profiler = profiler or StartupProfiler()
+        self.icon = get_resource_path(icon)
+        self.app_name = app_name
+        self.app_author = app_author
+        app_settings_file = get_user_data_path(self.app_name, self.app_author, 'settings.json')
+        log_file = get_user_data_path(self.app_name, self.app_author, 'debug.log')
+        self.log_file = log_file
+
+        # Set up logging to the (rotated) file and the console, written by a background thread
+        self.logging = LoggingPipeline(log_file, level=logging.DEBUG).start()
+        self.logging.apply_levels(log_levels)
+
+        self.logger = logging.getLogger(__name__)
+
+        # Create main window
+        self.root = Tk()
+        self.root.title("ValveControl 2000")
+        self.root.minsize(700, 700)
+        self.setup_window_icon()
+        self.profiler.mark('tk init')
+
+        # Initialize configuration and load app settings
+        self.config = Configuration(app_settings_file)
+        success, error_message = self.config.load_app_settings()
+        self.profiler.mark('settings load')
+
+        # Available languages and their short codes
+        self.languages = self.config.languages
+
+        # Set up localization, the window is created once everything is loaded
+        self.set_language(self.config.app_settings.language)
+        # Texts of the window, translated again in place when the language changes
+        self.texts = TextRegistry(self._)
+        self.profiler.mark('locale setup')
+
+        # Display error message if the app settings can not be loaded
+        if not success:
+            messagebox.showerror(
+                self._("Error"),
+                self._("Could not load app settings: {}").format(error_message)
+            )
+
+        # Load last used config file
+        if self.config.app_settings.last_config_file:
+            success, error_message = self.config.load_zone_config(self.config.app_settings.last_config_file)
+            if not success:
+                messagebox.showerror(
+                    self._("Error"),
+                    self._("Could not load zone config: {}").format(error_message)
+                )
+        self.profiler.mark('zone config load')
+
+        # Set up window geometry and content
+        self.apply_window_geometry()
+        self.create_window()
+        self.profiler.mark('window build')
+
+        # Zones which were on when the app last stopped (or crashed), restored without sending commands
+        journal_file = get_user_data_path(self.app_name, self.app_author, 'zone_state.journal')
+        self.zone_control.controller.attach_journal(StateJournal(journal_file, persistence=self.config.persistence, _=self._))
+        self.profiler.mark('zone state restore')
+
+        # Optional local metrics endpoint, for running without anyone watching the screen
+        if metrics_address:
+            self.zone_control.controller.start_metrics_server(*metrics_address)
+
+    def setup_window_icon(self):
+        """Handle window icon setting for various OSes"""
+        try:
+            if os.path.exists(f"{self.icon}.ico"):
+                self.root.iconbitmap(f"{self.icon}.ico")
+
+            # Fallback for OS like MacOS
+            if os.path.exists(f"{self.icon}.png"):
+                icon_image = PhotoImage(file=f"{self.icon}.png")
+                self.root.iconphoto(True, icon_image)
+        except Exception as e:
+            self.logger.debug(self._("Warning: Could not set application icon: %s"), e)
+
+    def apply_window_geometry(self):
+        """Apply window geometry from app settings"""
+        try:
+            self.root.geometry(self.config.app_settings.window_geometry)
+        except Exception:
+            self.root.geometry(DEFAULT_APP_SETTINGS['window_geometry'])
+
+    def update_language_vars(self):
+        """Update language variables to reflect current selection"""
+        if not hasattr(self, 'language_vars'):
+            self.language_vars = {lang: BooleanVar() for lang in self.languages}
+        for lang, var in self.language_vars.items():
+            var.set(lang == self.current_language)
+
+    def create_menu(self):
+        """Create application menu bar"""
+        self.menubar = Menu(self.root)
+        self.root.config(menu=self.menubar)
+
+        # File menu
+        self.file_menu = Menu(self.menubar, tearoff=0)
+        self.add_menu_entry(self.menubar, 'cascade', N_("File"), menu=self.file_menu)
+        self.add_menu_entry(self.file_menu, 'command', N_("Open zone config"), command=self.open_zone_config)
+        self.add_menu_entry(self.file_menu, 'command', N_("Save zone config"), command=self.save_zone_config)
+        self.add_menu_entry(self.file_menu, 'command', N_("Save zone config as..."), command=self.save_zone_config_as)
+        self.file_menu.add_separator()
+        self.add_menu_entry(self.file_menu, 'command', N_("Exit"), command=self.on_closing)
+
+        # Language menu
+        self.language_menu = Menu(self.menubar, tearoff=0)
+        self.add_menu_entry(self.menubar, 'cascade', N_("Language"), menu=self.language_menu)
+
+        for language in self.languages.keys():
+            self.language_menu.add_checkbutton(
+                label=language,
+                command=lambda l=language: self.change_language(l),
+                variable=self.language_vars[language]
+            )
+
+        # Log level menu, a change applies immediately and is not saved
+        self.log_menu = Menu(self.menubar, tearoff=0)
+        self.add_menu_entry(self.menubar, 'cascade', N_("Log level"), menu=self.log_menu)
+
+        self.log_level_vars = {}
+        for module, level in self.logging.levels().items():
+            var = StringVar(value=level)
+            module_menu = Menu(self.log_menu, tearoff=0)
+            self.log_menu.add_cascade(label=module, menu=module_menu)
+            for name in LOG_LEVELS:
+                module_menu.add_radiobutton(
+                    label=name,
+                    value=name,
+                    variable=var,
+                    command=lambda m=module, v=var: self.logging.set_level(m, v.get())
+                )
+            self.log_level_vars[module] = var
+
+    def add_menu_entry(self, menu, kind: str, message: str, **options):
+        """Add a menu entry whose label follows the language"""
+        menu.add(kind, **options)
+        self.texts.bind_menu_entry(menu, menu.index('end'), message)
+
+    def create_main_content(self):
+        """Create main application content"""
+        self.zone_control = ZoneControlFrame(self.root, self.config, self._, self.ngettext, texts=self.texts)
+        self.zone_control.pack(fill=BOTH, expand=True)
+
+    def create_window(self):
+        """Create main window"""
+        # Remove existing widgets
+        for widget in self.root.winfo_children():
+            widget.destroy()
+
+        # (Re)Create content
+        self.update_language_vars()
+        self.create_menu()
+        self.create_main_content()
+
+    def report_zone_config_write(self, on_success=None):
+        """Show the result of the background zone config write once it is done, without waiting for it"""
+        write = self.config.zone_config_write
+        if not write.done():
+            self.root.after(50, self.report_zone_config_write, on_success)
+            return
+
+        if write.exception() is not None:
+            messagebox.showerror(
+                self._("Error"),
+                self._("Could not save zone config: {}").format(write.exception())
+            )
+            return
+
+        messagebox.showinfo(
+            self._("Success"),
+            self._("Zone config saved successfully")
+        )
+        if on_success:
+            on_success()
+
+    def save_zone_config(self):
+        """Save current zone config"""
+        success, error = self.config.save_zone_config()
+        if success:
+            self.report_zone_config_write()
+        else:
+            if error == "No file specified":
+                self.save_zone_config_as()
+            else:
+                messagebox.showerror(
+                    self._("Error"),
+                    self._("Could not save zone config: {}").format(error)
+                )
+
+    def save_zone_config_as(self):
+        """Save current zone config to a new file"""
+        initial_dir = self.config.app_settings.last_config_directory
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            initialdir=initial_dir,
+            title=self._("Save zone config as")
+        )
+
+        if filename:
+            self.config.update_last_config_directory(filename)
+            success, error = self.config.save_zone_config(filename)
+
+            if success:
+                # Refresh the UI to show the new configuration file path
+                self.report_zone_config_write(on_success=self.zone_control.refresh_ui)
+            else:
+                messagebox.showerror(
+                    self._("Error"),
+                    self._("Could not save zone config: {}").format(error)
+                )
+
+    def open_zone_config(self):
+        """Open and load a zone config file"""
+        initial_dir = self.config.app_settings.last_config_directory
+        filename = filedialog.askopenfilename(
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            initialdir=initial_dir,
+            title=self._("Open zone config")
+        )
+
+        if filename:
+            self.config.update_last_config_directory(filename)
+            # Parsed and checked in the background, a large file doesn't freeze the window
+            self.report_zone_config_load(self.config.start_zone_config_load(filename), time.monotonic())
+
+    def report_zone_config_load(self, load: ZoneConfigLoad, started: float, dialog=None, progress=None):
+        """Show the progress of a background zone config load, and its result once it is done"""
+        if not load.future.done():
+            # Only files taking a while get a progress window, with a way out
+            if dialog is None and time.monotonic() - started >= 0.2:
+                dialog, progress = self.create_zone_config_load_dialog(load)
+            if progress is not None:
+                progress['value'] = load.progress
+            self.root.after(50, self.report_zone_config_load, load, started, dialog, progress)
+            return
+
+        if dialog is not None:
+            dialog.destroy()
+        if not load.future.cancelled():
+            success, error_message = self.config.finish_zone_config_load(load)
+
+            if success:
+                messagebox.showinfo(
+                    self._("Success"),
+                    self._("Zone config loaded successfully")
+                )
+                self.zone_control.refresh_ui()
+            else:
+                messagebox.showerror(
+                    self._("Error"),
+                    self._("Could not load zone config: {}").format(error_message)
+                )
+
+    def create_zone_config_load_dialog(self, load: ZoneConfigLoad):
+        """Progress bar and Cancel button of a zone config load, returns the window and the bar"""
+        dialog = Toplevel(self.root)
+        dialog.title(self._("Open zone config"))
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        ttk.Label(dialog, text=os.path.basename(load.filename)).pack(padx=20, pady=(15, 5))
+        progress = ttk.Progressbar(dialog, length=300, maximum=1.0)
+        progress.pack(padx=20, pady=5)
+        ttk.Button(dialog, text=self._("Cancel"), command=load.cancel).pack(pady=(5, 15))
+        dialog.protocol("WM_DELETE_WINDOW", load.cancel)
+        # The config being replaced is not edited meanwhile
+        dialog.grab_set()
+        return dialog, progress
+
+    def set_language(self, new_language):
+        """Switch the translations, without touching the widgets"""
+        self._, self.ngettext = self.config.change_language(new_language)
+        self.current_language = new_language
+
+    def change_language(self, new_language):
+        """Change application language, the texts are updated in place"""
+        self.set_language(new_language)
+        self.update_language_vars()
+        self.zone_control.retranslate()
+        self.config.save_app_settings()
+
+    def on_closing(self):
+        """Handle window closing event"""
+        if self.config.has_unsaved_changes():
+            answer = messagebox.askyesnocancel(
+                self._("Unsaved Changes"),
+                self._("There are unsaved changes to the zone configuration. Would you like to save them?")
+            )
+
+            if answer is None:  # Cancel
+                return
+            elif answer:  # Yes
+                if self.config.current_zone_config_file:
+                    success, error = self.config.save_zone_config()
+                    if success:
+                        # Closing is the one place to wait for the disk
+                        self.config.flush()
+                        if self.config.zone_config_write.exception() is not None:
+                            success, error = False, self.config.zone_config_write.exception()
+                    if not success:
+                        messagebox.showerror(
+                            self._("Error"),
+                            self._("Could not save zone config: {}").format(error)
+                        )
+                        return
+                else:
+                    self.save_zone_config_as()
+                    self.config.flush()
+                    if self.config.has_unsaved_changes():  # User cancelled save dialog or the write failed
+                        return
+
+        # Update window geometry in settings before saving
+        self.config.app_settings.window_geometry = self.root.geometry()
+        self.config.save_app_settings()
+        self.config.flush()
+        controller = self.zone_control.controller
+        # Nothing would turn off the zones of the running programs
+        controller.scheduler.stop_all()
+        controller.stop_mqtt()
+        controller.stop_metrics_server()
+        controller.close_journal()
+        self.root.quit()
+
+    def loop(self, profile_startup: bool = False, startup_budget: Optional[float] = None) -> int:
+        """Start the application main loop, returns the exit code"""
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.exit_code = 0
+        # Idle callbacks run after the pending redraws, so this is the first paint
+        self.root.after_idle(self.on_first_paint, profile_startup, startup_budget)
+        self.root.mainloop()
+        return self.exit_code
+
+    def on_first_paint(self, profile_startup: bool, startup_budget: Optional[float]):
+        self.profiler.mark('first paint')
+        self.logger.debug("Startup:\n%s", self.profiler.report())
+        if not profile_startup:
+            return
+
+        print(self.profiler.report())
+        if startup_budget is not None and self.profiler.total_ms > startup_budget:
+            print(f"Startup took {self.profiler.total_ms:.1f} ms, over the budget of {startup_budget:.0f} ms")
+            self.exit_code = 1
+        self.root.quit()
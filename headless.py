@@ -0,0 +1,117 @@
+"""
+Headless ValveControl 2000 service.
+
+Runs the zone logic (master rules for the states reported by other systems)
+and the MQTT connection without a display and without importing Tk:
+
+    python ./headless.py [--config irrigation_zone_config.json]
+"""
+import argparse
+import logging
+import signal
+import sys
+from typing import Iterable, Optional, Tuple
+from utils import get_user_data_path
+from configuration import Configuration
+from zone_controller import ZoneController
+from log_pipeline import LoggingPipeline, parse_level_spec
+from state_journal import StateJournal
+
+class HeadlessApp:
+    def __init__(self, zone_config_file: Optional[str] = None, app_name: Optional[str] = "ValveControl 2000", app_author: Optional[str] = "GyB", log_levels: Iterable[Tuple[Optional[str], str]] = (), metrics_address: Optional[Tuple[str, int]] = None):
+        self.app_name = app_name
+        self.app_author = app_author
+        app_settings_file = get_user_data_path(self.app_name, self.app_author, 'settings.json')
+
+        # Log to the console only, the service manager takes care of storing it
+        self.logging = LoggingPipeline(level=logging.INFO).start()
+        self.logging.apply_levels(log_levels)
+        self.logger = logging.getLogger(__name__)
+
+        # Initialize configuration and load app settings
+        self.config = Configuration(app_settings_file)
+        success, error_message = self.config.load_app_settings()
+        self._, self.ngettext = self.config.change_language(self.config.app_settings.language)
+        if not success:
+            self.logger.warning(self._("Could not load app settings: %s"), error_message)
+
+        self.zone_config_file = zone_config_file or self.config.app_settings.last_config_file
+        self.metrics_address = metrics_address
+        self.controller = None
+        self.running = False
+
+    def start(self) -> bool:
+        """Load the zone config and connect to the MQTT broker"""
+        if not self.zone_config_file:
+            self.logger.error(self._("No file specified"))
+            return False
+
+        success, error_message = self.config.load_zone_config(self.zone_config_file)
+        if not success:
+            self.logger.error(self._("Could not load zone config: %s"), error_message)
+            return False
+
+        if not self.config.zone_config.mqtt.get('enabled', False):
+            self.logger.error(self._("MQTT is disabled in the zone config"))
+            return False
+
+        self.controller = ZoneController(self.config, self._, self.ngettext)
+        self.controller.subscribe_connection(self.on_connection_change)
+        # Zones which were on when the service last stopped (or crashed), restored without sending commands
+        journal_file = get_user_data_path(self.app_name, self.app_author, 'zone_state.journal')
+        self.controller.attach_journal(StateJournal(journal_file, persistence=self.config.persistence, _=self._))
+        if self.metrics_address:
+            self.controller.start_metrics_server(*self.metrics_address)
+        self.controller.init_mqtt()
+        return True
+
+    def on_connection_change(self, connected: bool):
+        if connected:
+            self.logger.info(self._("Connected"))
+        else:
+            self.logger.info(self._("Disconnected"))
+
+    def stop(self, *args):
+        """Stop the service loop, can be used as a signal handler"""
+        self.running = False
+
+    def run(self) -> int:
+        """Run until stopped by SIGINT or SIGTERM, returns the exit code"""
+        if not self.start():
+            return 1
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.running = True
+        try:
+            # The MQTT client reconnects by itself and queues commands while offline
+            while self.running:
+                self.controller.wait_for_events(timeout=1)
+                self.controller.process_events()
+        finally:
+            # Nothing would turn off the zones of the running programs
+            self.controller.scheduler.stop_all()
+            self.controller.stop_mqtt()
+            self.controller.stop_metrics_server()
+            self.controller.close_journal()
+            self.config.flush()
+            self.logging.stop()
+        return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ValveControl 2000 headless service")
+    parser.add_argument('--config', dest='zone_config_file', help="zone config file, defaults to the last used one")
+    parser.add_argument('--log-level', type=parse_level_spec, action='append', default=[], metavar='[MODULE=]LEVEL',
+                        help="log level of every module or of one module (e.g. mqtt_client=DEBUG), can be repeated")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT', help="serve Prometheus metrics on http://HOST:PORT/metrics")
+    parser.add_argument('--metrics-host', default='127.0.0.1', metavar='HOST', help="address of the metrics endpoint (default: %(default)s)")
+    return parser.parse_known_args(argv)[0]
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    metrics_address = (args.metrics_host, args.metrics_port) if args.metrics_port is not None else None
+    return HeadlessApp(args.zone_config_file, log_levels=args.log_level, metrics_address=metrics_address).run()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import json
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+# Whitespace allowed between JSON tokens
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# What follows an item of an array, with the whitespace around it
+_ARRAY_DELIMITER = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+def _skip(text: str, pos: int) -> int:
+    return _WHITESPACE.match(text, pos).end()
+
+def _stream_array(text: str, pos: int, on_item: Callable[[int, Any, int], Any]) -> Tuple[List, int]:
+    items = []
+    pos = _skip(text, pos + 1)
+    if text[pos:pos + 1] == ']':
+        return items, pos + 1
+    decode, delimiter = _decoder.raw_decode, _ARRAY_DELIMITER.match
+    while True:
+        item, pos = decode(text, pos)
+        items.append(on_item(len(items), item, pos))
+        match = delimiter(text, pos)
+        if match is None:
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, _skip(text, pos))
+        if match.group(1) == ']':
+            return items, match.start(1) + 1
+        pos = match.end()
+
+def load_object_streaming(text: str, streamed: str, on_item: Callable[[int, Any, int], Any]) -> Any:
+    """
+    json.loads() of an object, parsing the array under the key streamed one item at a time.
+
+    Every item of that array is passed to on_item(index, item, end position in
+    text) as soon as it is parsed, the array in the result holds what on_item
+    returned. An exception raised by on_item stops the parsing. The other
+    values (and anything which is not an object) are parsed as by json.loads(),
+    invalid JSON raises json.JSONDecodeError the same way.
+    """
+    pos = _skip(text, 0)
+    if text[pos:pos + 1] != '{':
+        return json.loads(text)
+
+    result: Dict[str, Any] = {}
+    pos = _skip(text, pos + 1)
+    if text[pos:pos + 1] == '}':
+        pos += 1
+    else:
+        while True:
+            if text[pos:pos + 1] != '"':
+                raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+            key, pos = _decoder.raw_decode(text, pos)
+            pos = _skip(text, pos)
+            if text[pos:pos + 1] != ':':
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+            pos = _skip(text, pos + 1)
+            if key == streamed and text[pos:pos + 1] == '[':
+                result[key], pos = _stream_array(text, pos, on_item)
+            else:
+                result[key], pos = _decoder.raw_decode(text, pos)
+            pos = _skip(text, pos)
+            delimiter = text[pos:pos + 1]
+            if delimiter == '}':
+                pos += 1
+                break
+            if delimiter != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+            pos = _skip(text, pos + 1)
+
+    if _skip(text, pos) != len(text):
+        raise json.JSONDecodeError("Extra data", text, pos)
+    return result
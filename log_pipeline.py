@@ -0,0 +1,113 @@
+import atexit
+import gzip
+import logging
+import os
+import queue
+import shutil
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Iterable, List, Optional, Tuple
+from constants import LOG_FORMAT, LOG_DATE_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_MODULES
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+def parse_level_spec(spec: str) -> Tuple[Optional[str], str]:
+    """
+    Parse a --log-level argument, either a level for every module (DEBUG)
+    or a module=level pair (mqtt_client=DEBUG).
+    """
+    module, _, level = spec.rpartition('=')
+    level = level.upper()
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level: {level}")
+    return module or None, level
+
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    """Size based rotation, the backups are gzip-ed (debug.log.1.gz, debug.log.2.gz, ...)"""
+
+    def __init__(self, filename: str, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+
+    def rotation_filename(self, default_name: str) -> str:
+        return default_name + '.gz'
+
+    def rotate(self, source: str, dest: str) -> None:
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+class PassThroughQueueHandler(QueueHandler):
+    """Queues the record as it is, its message is formatted by the listener's handlers"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare() would format the message and the traceback on the calling thread.
+        # The queue never leaves the process, the record doesn't have to be pickled.
+        return record
+
+class LoggingPipeline:
+    """
+    Logging which never does I/O on the thread making the log call.
+
+    The root logger only has a QueueHandler, the records are formatted and
+    written to the console and the log file by a single listener thread. Levels can be set
+    per module while running, records of disabled levels are dropped before
+    their message is formatted.
+    """
+
+    def __init__(self, log_file: Optional[str] = None, level: int = logging.DEBUG, console: bool = True):
+        self.level = level
+        self.handlers: List[logging.Handler] = []
+        formatter = logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT)
+        if log_file:
+            self.handlers.append(CompressedRotatingFileHandler(log_file))
+        if console:
+            self.handlers.append(logging.StreamHandler())
+        for handler in self.handlers:
+            handler.setFormatter(formatter)
+
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.queue_handler = PassThroughQueueHandler(self.queue)
+        self.started = False
+
+    def start(self) -> 'LoggingPipeline':
+        """Route the records of every logger through the queue"""
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+        root.setLevel(self.level)
+        self.listener.start()
+        self.started = True
+        atexit.register(self.stop)
+        return self
+
+    def stop(self) -> None:
+        """Write the queued records and stop the listener thread"""
+        if not self.started:
+            return
+        self.started = False
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+    @staticmethod
+    def set_level(module: str, level) -> None:
+        """Set the level of a module's logger, e.g. set_level('mqtt_client', 'DEBUG')"""
+        logging.getLogger(module).setLevel(level)
+
+    @staticmethod
+    def levels(modules: Iterable[str] = LOG_MODULES) -> Dict[str, str]:
+        """Effective level name of every module"""
+        return {
+            module: logging.getLevelName(logging.getLogger(module).getEffectiveLevel())
+            for module in modules
+        }
+
+    def apply_levels(self, specs: Iterable[Tuple[Optional[str], str]]) -> None:
+        """Apply parsed --log-level arguments, a level without a module is the default of every module"""
+        for module, level in specs:
+            if module:
+                self.set_level(module, level)
+            else:
+                self.level = logging.getLevelName(level)
+                logging.getLogger().setLevel(level)
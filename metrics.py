@@ -0,0 +1,127 @@
+import logging
+from threading import Lock, Thread
+from typing import Dict, Optional, Tuple
+
+# Label values of a sample, sorted by label name
+Labels = Tuple[Tuple[str, str], ...]
+
+class Metrics:
+    """
+    Counters and gauges updated from any thread, rendered in Prometheus text format.
+
+    Every update and the rendering take the same lock, so a scrape always
+    sees a consistent set of values and never has to ask the GUI for them.
+    """
+
+    def __init__(self, prefix: str = 'valvecontrol'):
+        self.prefix = prefix
+        self._lock = Lock()
+        # name -> (type, help), in the order of description
+        self._families: Dict[str, Tuple[str, str]] = {}
+        self._values: Dict[str, Dict[Labels, float]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """Declare a 'counter' or 'gauge', so it is rendered (as 0) even before its first update"""
+        with self._lock:
+            self._families.setdefault(name, (kind, help_text))
+            self._values.setdefault(name, {})
+
+    # The metric is positional only, so 'name' can be a label
+    def inc(self, metric: str, amount: float = 1, /, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values.setdefault(metric, {})
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, metric: str, value: float, /, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values.setdefault(metric, {})[key] = value
+
+    def remove(self, metric: str, /, **labels) -> None:
+        """Drop one sample, e.g. when its labels changed"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values.get(metric, {}).pop(key, None)
+
+    def replace(self, name: str, samples: Dict[Labels, float]) -> None:
+        """Replace every sample of a gauge at once, e.g. when zones were removed"""
+        with self._lock:
+            self._values[name] = dict(samples)
+
+    def value(self, metric: str, /, **labels) -> float:
+        with self._lock:
+            return self._values.get(metric, {}).get(tuple(sorted(labels.items())), 0)
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format"""
+        with self._lock:
+            values = {name: dict(samples) for name, samples in self._values.items()}
+            families = dict(self._families)
+
+        lines = []
+        for name, samples in values.items():
+            full_name = f"{self.prefix}_{name}"
+            kind, help_text = families.get(name, ('untyped', ''))
+            if help_text:
+                lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if not samples and name in families:
+                samples = {(): 0}
+            for labels, value in samples.items():
+                label_text = ','.join(f'{key}="{self._escape(val)}"' for key, val in labels)
+                if label_text:
+                    label_text = '{' + label_text + '}'
+                lines.append(f"{full_name}{label_text} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+class MetricsServer:
+    """Local HTTP endpoint serving GET /metrics, on its own thread"""
+
+    def __init__(self, metrics: Metrics, host: str = '127.0.0.1', port: int = 9101):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.logger = logging.getLogger(__name__)
+        self._server = None
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        # Imported here, so the HTTP server is only loaded when metrics are enabled
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Every scrape would end up in the debug log otherwise
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        # Port 0 picks a free port
+        self.port = self._server.server_address[1]
+        self._thread = Thread(target=self._server.serve_forever, name='metrics', daemon=True)
+        self._thread.start()
+        self.logger.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
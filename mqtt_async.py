@@ -0,0 +1,160 @@
+import asyncio
+from threading import Event, Lock, Thread
+from typing import Optional, Callable, Dict, Any
+import paho.mqtt.client as mqtt
+from command_outbox import CommandOutbox
+from zone_latency import ZoneLatencyTracker
+from metrics import Metrics
+from mqtt_client import MQTTClient
+
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+_shared_loop_lock = Lock()
+
+def get_shared_loop() -> asyncio.AbstractEventLoop:
+    """Event loop shared by every AsyncMQTTClient, running in a single background thread"""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            # Selector based loop, as add_reader()/add_writer() are needed for the sockets
+            loop = asyncio.SelectorEventLoop()
+            started = Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            Thread(target=run, name='mqtt-asyncio', daemon=True).start()
+            started.wait()
+            _shared_loop = loop
+        return _shared_loop
+
+class AsyncMQTTClient(MQTTClient):
+    """
+    MQTT client driven by an asyncio event loop instead of paho's network thread.
+
+    The paho socket is registered with the event loop, so one loop (and one
+    thread) serves any number of clients. Callbacks are called on the loop's
+    thread, the same way MQTTClient calls them on its network thread.
+    """
+
+    def __init__(self, config: Dict[str, Any],
+                _,
+                ngettext,
+                zone_count: int = 0,
+                on_zone_state_change: Optional[Callable[[int, bool], None]] = None,
+                on_connection_change: Optional[Callable[[bool], None]] = None,
+                outbox: Optional[CommandOutbox] = None,
+                on_command_ack: Optional[Callable[[int, float], None]] = None,
+                flush_outbox: bool = True,
+                latency_tracker: Optional[ZoneLatencyTracker] = None,
+                metrics: Optional[Metrics] = None,
+                loop: Optional[asyncio.AbstractEventLoop] = None):
+        super().__init__(
+            config, _, ngettext, zone_count, on_zone_state_change, on_connection_change,
+            outbox, on_command_ack, flush_outbox, latency_tracker, metrics
+        )
+        self.loop = loop or get_shared_loop()
+        self._misc_task: Optional[asyncio.Task] = None
+        self._reconnect_handle: Optional[asyncio.TimerHandle] = None
+
+        # Let the event loop drive the socket
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def _call_in_loop(self, callback, *args) -> None:
+        """Call callback on the event loop's thread"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call_in_loop(self.loop.add_reader, sock.fileno(), client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        # The socket is closed by the time the loop gets to it, so go by its file descriptor
+        self._call_in_loop(self.loop.remove_reader, sock.fileno())
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.add_writer, sock.fileno(), client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self.loop.remove_writer, sock.fileno())
+
+    async def _misc_loop(self):
+        """Keepalive and retry handling, which paho's network thread would do"""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    async def _connect(self):
+        self._reconnect_handle = None
+        if self.stopping:
+            return
+        try:
+            # The TCP (and TLS) handshake blocks, keep it off the shared loop
+            await self.loop.run_in_executor(None, lambda: self.client.connect(
+                self.config['broker'],
+                self.config['port'],
+                keepalive=60
+            ))
+            if self._misc_task is None or self._misc_task.done():
+                self._misc_task = self.loop.create_task(self._misc_loop())
+        except Exception as e:
+            self.metrics.inc('mqtt_connect_failures_total')
+            self.logger.error(self._("Failed to connect to MQTT broker: %s"), e)
+            if self.on_connection_change:
+                self.on_connection_change(False)
+            if not self.stopping:
+                self._schedule_reconnect()
+
+    def _schedule_reconnect(self) -> None:
+        """Schedule the next connection attempt on the event loop"""
+        delay = self.backoff.next_delay()
+        self.logger.info(self._("Reconnecting to MQTT broker in %.1f seconds"), delay)
+
+        def schedule():
+            if self._reconnect_handle is None and not self.stopping:
+                self._reconnect_handle = self.loop.call_later(
+                    delay, lambda: self.loop.create_task(self._connect())
+                )
+
+        self._call_in_loop(schedule)
+
+    def connect(self) -> bool:
+        """
+        Start connecting to the MQTT broker, the result is reported to on_connection_change
+
+        Returns:
+            bool: True if connecting was started, False if already connected
+        """
+        with self.connection_lock:
+            if self.connected:
+                return False
+            self.stopping = False
+            asyncio.run_coroutine_threadsafe(self._connect(), self.loop)
+            return True
+
+    def _disconnect(self):
+        if self._reconnect_handle is not None:
+            self._reconnect_handle.cancel()
+            self._reconnect_handle = None
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+        self.client.disconnect()
+
+    def disconnect(self) -> None:
+        """Disconnect from MQTT broker and stop reconnecting"""
+        try:
+            with self.connection_lock:
+                self.stopping = True
+                self._call_in_loop(self._disconnect)
+        except Exception as e:
+            self.logger.error(self._("Error disconnecting from MQTT broker: %s"), e)
@@ -1,8 +1,45 @@
 import paho.mqtt.client as mqtt
 import ssl
 import logging
-from typing import Optional, Callable, Dict, Any
+import random
+import time
+from typing import Optional, Callable, Dict, Any, List, Tuple
 from threading import Lock
+from command_outbox import CommandOutbox
+from zone_latency import ZoneLatencyTracker
+from metrics import Metrics
+from constants import (
+    MQTT_RECONNECT_MIN_DELAY, MQTT_RECONNECT_MAX_DELAY,
+    MQTT_OUTBOX_MAX_SIZE, MQTT_OUTBOX_MAX_AGE, MQTT_STATE_CONFIRM_TIMEOUT
+)
+
+# Pre-encoded command payloads
+PAYLOAD_ON = b'on'
+PAYLOAD_OFF = b'off'
+
+# Accepted state payloads, anything else is lower-cased and looked up again
+STATE_PAYLOADS = {
+    b'on': True,
+    b'off': False,
+    b'ON': True,
+    b'OFF': False,
+}
+
+class ReconnectBackoff:
+    """Exponential reconnect delays with full jitter, so many clients don't reconnect in lockstep"""
+
+    def __init__(self, min_delay: float = MQTT_RECONNECT_MIN_DELAY, max_delay: float = MQTT_RECONNECT_MAX_DELAY):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        ceiling = min(self.max_delay, self.min_delay * 2 ** self.attempt)
+        self.attempt = min(self.attempt + 1, 32)
+        return random.uniform(self.min_delay, ceiling)
+
+    def reset(self) -> None:
+        self.attempt = 0
 
 class MQTTClient:
     """MQTT client for handling valve control communication"""
@@ -10,26 +47,65 @@ class MQTTClient:
     def __init__(self, config: Dict[str, Any],
                 _,
                 ngettext,
+                zone_count: int = 0,
                 on_zone_state_change: Optional[Callable[[int, bool], None]] = None,
-                on_connection_change: Optional[Callable[[bool], None]] = None):
+                on_connection_change: Optional[Callable[[bool], None]] = None,
+                outbox: Optional[CommandOutbox] = None,
+                on_command_ack: Optional[Callable[[int, float], None]] = None,
+                flush_outbox: bool = True,
+                latency_tracker: Optional[ZoneLatencyTracker] = None,
+                metrics: Optional[Metrics] = None):
         self.config = config
-        self.client = mqtt.Client(client_id=config['client_id'])
+        # With a persistent session the broker keeps the subscription and queues the QoS 1
+        # state messages while we are away, under the (stable) client id
+        self.persistent_session = bool(config.get('persistent_session', False))
+        self.client = mqtt.Client(client_id=config['client_id'], clean_session=not self.persistent_session)
+        if self.persistent_session:
+            # State messages are acknowledged once applied, see take_received()
+            self.client.manual_ack_set(True)
+        # (connection, mid, qos) of the accepted state messages not acknowledged yet
+        self._received: List[Tuple[int, int, int]] = []
+        self._received_lock = Lock()
+        self._connection_number = 0
         self.connected = False
         self.connection_lock = Lock()
+        # Cleared by connect() and set by disconnect(), a requested disconnect is not followed by reconnecting
+        self.stopping = True
+        self.backoff = ReconnectBackoff()
+        # Commands which could not be sent while disconnected, flushed on (re)connect
+        self.outbox = outbox or CommandOutbox(MQTT_OUTBOX_MAX_SIZE, MQTT_OUTBOX_MAX_AGE)
         self.on_zone_state_change = on_zone_state_change
         self.on_connection_change = on_connection_change
+        # Receives the mid and the monotonic time of every PUBACK
+        self.on_command_ack = on_command_ack
+        # Send the queued commands on connect, unless the owner of the outbox does it
+        self.flush_outbox = flush_outbox
+        # Command to state confirmation times of the valves
+        self.latency_tracker = latency_tracker or ZoneLatencyTracker(MQTT_STATE_CONFIRM_TIMEOUT, _)
+        # Message, publish and connection counters, read by the metrics endpoint
+        self.metrics = metrics or Metrics()
+        self.metrics.describe('mqtt_messages_total', 'counter', "State messages received, by result")
+        self.metrics.describe('mqtt_publish_total', 'counter', "Zone commands, by result")
+        self.metrics.describe('mqtt_connects_total', 'counter', "Successful connections to the broker")
+        self.metrics.describe('mqtt_disconnects_total', 'counter', "Lost or closed connections")
+        self.metrics.describe('mqtt_connect_failures_total', 'counter', "Failed connection attempts")
         self.logger = logging.getLogger(__name__)
         self._ = _
         self.ngettext = ngettext
 
-        # Disable automatic reconnect
-        self.client.reconnect_delay_set(120, 120)  # Set high reconnect delay
-        self.client.loop_stop()  # Ensure loop is stopped
+        # Topic routing tables, rebuilt when the zone count changes
+        self.state_topic_filter = f"{config['topic_prefix']}/zone/+/state"
+        self.set_zone_count(zone_count)
+
+        # Reconnecting is done by paho's network thread, with the delays of our backoff
+        self.client.reconnect_delay_set(self.backoff.min_delay, self.backoff.max_delay)
 
         # Set up callbacks
         self.client.on_connect = self._on_connect
+        self.client.on_connect_fail = self._on_connect_fail
         self.client.on_disconnect = self._on_disconnect
         self.client.on_message = self._on_message
+        self.client.on_publish = self._on_publish
 
         # Configure authentication if provided
         if config['username'] and config['password']:
@@ -46,21 +122,31 @@ class MQTTClient:
             else:
                 self.client.tls_set(cert_reqs=ssl.CERT_NONE)
 
+    def set_zone_count(self, zone_count: int) -> None:
+        """Rebuild the topic routing tables for the given number of zones"""
+        prefix = self.config['topic_prefix']
+        # Replace the tables as a whole, the network thread may be reading them
+        self.state_topics: Dict[str, int] = {
+            f"{prefix}/zone/{zone_id}/state": zone_id for zone_id in range(zone_count)
+        }
+        self.command_topics = [f"{prefix}/zone/{zone_id}/command" for zone_id in range(zone_count)]
+        self.zone_count = zone_count
+
     def connect(self) -> bool:
         """
-        Connect to MQTT broker
+        Connect to MQTT broker, the network thread keeps retrying with backoff until it succeeds
 
         Returns:
-            bool: True if connection successful, False otherwise
+            bool: True if connecting was started, False otherwise
         """
         try:
             with self.connection_lock:
                 if not self.connected:
-                    # Set reconnect flag to False
-                    self.client._clean_session = True
+                    self.stopping = False
+                    self.client._clean_session = not self.persistent_session
                     self.client._connect_handler = None
 
-                    self.client.connect(
+                    self.client.connect_async(
                         self.config['broker'],
                         self.config['port'],
                         keepalive=60
@@ -69,92 +155,202 @@ class MQTTClient:
                     return True
             return False
         except Exception as e:
-            self.logger.error(self._("Failed to connect to MQTT broker: {}").format(e))
+            self.logger.error(self._("Failed to connect to MQTT broker: %s"), e)
             if self.on_connection_change:
                 self.on_connection_change(False)
             return False
 
     def disconnect(self) -> None:
-        """Disconnect from MQTT broker"""
+        """Disconnect from MQTT broker and stop reconnecting"""
         try:
             with self.connection_lock:
-                if self.connected:
-                    self.client.loop_stop()
-                    self.client.disconnect()
+                self.stopping = True
+                self.client.disconnect()
+                self.client.loop_stop()
         except Exception as e:
-            self.logger.error(self._("Error disconnecting from MQTT broker: {}").format(e))
+            self.logger.error(self._("Error disconnecting from MQTT broker: %s"), e)
 
-    def publish_zone_command(self, zone_id: int, state: bool) -> None:
+    def _schedule_reconnect(self) -> None:
+        """Set the delay before the network thread's next connection attempt"""
+        delay = self.backoff.next_delay()
+        self.logger.info(self._("Reconnecting to MQTT broker in %.1f seconds"), delay)
+        self.client.reconnect_delay_set(delay, delay)
+
+    def _flush_outbox(self) -> None:
+        """Send the commands queued while disconnected, in order"""
+        commands = self.outbox.take()
+        if commands:
+            self.logger.info(self._("Sending %s queued zone commands"), len(commands))
+        for zone_id, state in commands:
+            self.publish_zone_command(zone_id, state)
+
+    def publish_zone_command(self, zone_id: int, state: bool) -> Optional[int]:
         """
         Publish zone command
 
         Args:
             zone_id: ID of the zone
             state: True for on, False for off
+
+        Returns:
+            Optional[int]: Message id to match the acknowledgment, None if the command was not sent
         """
         if not self.connected:
-            self.logger.warning(self._("Cannot publish: Not connected to MQTT broker"))
-            return
+            if self.stopping:
+                self.metrics.inc('mqtt_publish_total', result='dropped')
+                self.logger.warning(self._("Cannot publish: Not connected to MQTT broker"))
+            else:
+                # Keep the latest command of the zone until the connection is back
+                self.outbox.put(zone_id, state)
+                self.metrics.inc('mqtt_publish_total', result='queued')
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(self._("Not connected, zone command queued (%s waiting)"), self.outbox.depth)
+            return None
 
-        topic = f"{self.config['topic_prefix']}/zone/{zone_id}/command"
-        payload = "on" if state else "off"
+        command_topics = self.command_topics
+        if 0 <= zone_id < len(command_topics):
+            topic = command_topics[zone_id]
+        else:
+            topic = f"{self.config['topic_prefix']}/zone/{zone_id}/command"
+        payload = PAYLOAD_ON if state else PAYLOAD_OFF
 
         try:
-            self.client.publish(topic, payload, qos=1, retain=False)
+            self.outbox.discard(zone_id)
+            info = self.client.publish(topic, payload, qos=1, retain=False)
         except Exception as e:
-            self.logger.error(self._("Failed to publish zone command: {}").format(e))
+            self.metrics.inc('mqtt_publish_total', result='error')
+            self.logger.error(self._("Failed to publish zone command: %s"), e)
+            return None
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.metrics.inc('mqtt_publish_total', result='error')
+            return None
+        self.metrics.inc('mqtt_publish_total', result='sent')
+        self.latency_tracker.command_sent(zone_id, state)
+        return info.mid
 
     def _on_connect(self, client, userdata, flags, rc):
         """Handle connection established event"""
         if rc == 0:
             self.connected = True
+            # Message ids of the previous connection can't be acknowledged any more
+            self._connection_number += 1
+            self.metrics.inc('mqtt_connects_total')
+            self.backoff.reset()
+            self.client.reconnect_delay_set(self.backoff.min_delay, self.backoff.max_delay)
             self.logger.info(self._("Connected to MQTT broker"))
             if self.on_connection_change:
                 self.on_connection_change(True)
 
-            # Subscribe to state topics for all possible zones
-            for zone_id in range(8):
-                topic = f"{self.config['topic_prefix']}/zone/{zone_id}/state"
-                self.client.subscribe(topic, qos=1)
+            if self.persistent_session and flags.get('session present'):
+                # The broker kept the subscription and sends what was queued for us
+                self.logger.info(self._("Resumed the MQTT session"))
+            else:
+                # Subscribe to the state topics of all zones at once
+                self.client.subscribe(self.state_topic_filter, qos=1)
+            if self.flush_outbox:
+                self._flush_outbox()
         else:
-            self.logger.error(self._("Failed to connect to MQTT broker with code: {}").format(rc))
+            self.metrics.inc('mqtt_connect_failures_total')
+            self.logger.error(self._("Failed to connect to MQTT broker with code: %s"), rc)
             if self.on_connection_change:
                 self.on_connection_change(False)
 
+    def _on_connect_fail(self, client, userdata):
+        """Handle a failed (re)connection attempt of the network thread"""
+        self.metrics.inc('mqtt_connect_failures_total')
+        self.logger.error(self._("Failed to connect to MQTT broker"))
+        if not self.stopping:
+            self._schedule_reconnect()
+
     def _on_disconnect(self, client, userdata, rc):
         """Handle disconnection event"""
         self.connected = False
+        self.metrics.inc('mqtt_disconnects_total')
         self.logger.warning(self._("Disconnected from MQTT broker"))
+        if not self.stopping:
+            self._schedule_reconnect()
         if self.on_connection_change:
             self.on_connection_change(False)
 
+    def _on_publish(self, client, userdata, mid):
+        """Handle the PUBACK of a zone command"""
+        if self.on_command_ack:
+            self.on_command_ack(mid, time.monotonic())
+
     def _on_message(self, client, userdata, message):
         """Handle incoming messages"""
+        # Acknowledged here, unless the state is acknowledged once applied
+        deferred = False
         try:
-            # Parse topic to extract zone ID
             # Expected format: {prefix}/zone/{zone_id}/state
-            parts = message.topic.split('/')
-            if len(parts) != 4 or parts[1] != 'zone' or parts[3] != 'state':
-                return
-
-            try:
-                zone_id = int(parts[2])
-            except ValueError:
-                self.logger.error(self._("Invalid zone ID in topic: {}").format(message.topic))
-                return
+            zone_id = self.state_topics.get(message.topic)
+            if zone_id is None:
+                zone_id = self._parse_state_topic(message.topic)
+                if zone_id is None:
+                    self.metrics.inc('mqtt_messages_total', result='malformed_topic')
+                    return
 
             # Parse payload
-            payload = message.payload.decode().lower()
-            if payload not in ['on', 'off']:
-                self.logger.error(self._("Invalid state payload: {}").format(payload))
-                return
+            is_on = STATE_PAYLOADS.get(message.payload)
+            if is_on is None:
+                payload = message.payload.decode().lower()
+                if payload not in ['on', 'off']:
+                    self.metrics.inc('mqtt_messages_total', result='invalid_payload')
+                    self.logger.error(self._("Invalid state payload: %s"), payload)
+                    return
+                is_on = payload == 'on'
 
+            # Retained messages are old reports, not confirmations
+            if not message.retain:
+                self.latency_tracker.state_received(zone_id, is_on)
+
+            self.metrics.inc('mqtt_messages_total', result='accepted')
             if self.on_zone_state_change:
-                is_on = payload == 'on'
                 self.on_zone_state_change(zone_id, is_on)
+            if self.persistent_session and message.qos:
+                # Recorded after queueing the state, so whoever takes it also gets the state
+                with self._received_lock:
+                    self._received.append((self._connection_number, message.mid, message.qos))
+                deferred = True
 
         except Exception as e:
-            self.logger.error(self._("Error processing MQTT message: {}").format(e))
+            self.metrics.inc('mqtt_messages_total', result='error')
+            self.logger.error(self._("Error processing MQTT message: %s"), e)
+
+        finally:
+            if self.persistent_session and message.qos and not deferred:
+                # Nothing to apply, the broker must not deliver it again
+                self.client.ack(message.mid, message.qos)
+
+    def take_received(self) -> List[Tuple[int, int, int]]:
+        """
+        Remove and return the accepted state messages not acknowledged yet (persistent session only).
+
+        Their states were queued before they were recorded here, so taking
+        them before draining the state events means every one of them is
+        applied by the time they are passed to ack().
+        """
+        with self._received_lock:
+            received, self._received = self._received, []
+        return received
+
+    def ack(self, received: List[Tuple[int, int, int]]) -> None:
+        """Acknowledge applied state messages, the broker delivers the unacknowledged ones again"""
+        for connection_number, mid, qos in received:
+            if connection_number == self._connection_number and self.connected:
+                self.client.ack(mid, qos)
+
+    def _parse_state_topic(self, topic: str) -> Optional[int]:
+        """Extract the zone ID from a state topic which is not in the routing table"""
+        prefix = self.config['topic_prefix'] + '/zone/'
+        if not topic.startswith(prefix) or not topic.endswith('/state'):
+            return None
+
+        try:
+            return int(topic[len(prefix):-len('/state')])
+        except ValueError:
+            self.logger.error(self._("Invalid zone ID in topic: %s"), topic)
+            return None
 
     def __del__(self):
         """Ensure proper cleanup on deletion"""
@@ -0,0 +1,138 @@
+import atexit
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import Dict, Optional, Tuple
+
+def atomic_write(path: str, text: str) -> None:
+    """
+    Replace the content of path with text, all or nothing.
+
+    The text goes to a temporary file next to the target, which is fsync-ed and
+    then renamed over the target, so a crash leaves either the old or the new
+    file, never a truncated one.
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        # Keep the permissions of the file being replaced, mkstemp creates it private
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    # Make the rename itself durable, where directories can be opened
+    if hasattr(os, 'O_DIRECTORY'):
+        try:
+            dir_fd = os.open(directory, os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+class PersistenceService:
+    """
+    Writes files on a background thread, coalescing the writes of a short window.
+
+    write() only queues the text and returns a Future, the latest text of every
+    path is written atomically once the window has passed. flush() waits until
+    everything queued is on disk and is called on shutdown (also via atexit).
+    """
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.logger = logging.getLogger(__name__)
+        self._condition = Condition()
+        # path -> (latest text, future of the pending write)
+        self._pending: Dict[str, Tuple[str, Future]] = {}
+        self._due: Optional[float] = None
+        self._writing = False
+        self._flush_requested = False
+        self._closed = False
+        self._thread: Optional[Thread] = None
+        atexit.register(self.close)
+
+    def write(self, path: str, text: str) -> Future:
+        """Queue writing text to path, replacing a not yet written text of the same path"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Persistence service is closed")
+            pending = self._pending.get(path)
+            future = pending[1] if pending else Future()
+            self._pending[path] = (text, future)
+            if self._due is None:
+                self._due = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='persistence', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+            return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything queued now and wait for it, returns False on timeout"""
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def close(self) -> None:
+        """Flush and stop the worker"""
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    if self._pending:
+                        remaining = self._due - time.monotonic()
+                        if remaining <= 0 or self._flush_requested or self._closed:
+                            break
+                        self._condition.wait(remaining)
+                    elif self._closed:
+                        return
+                    else:
+                        self._flush_requested = False
+                        self._condition.wait()
+                batch, self._pending = self._pending, {}
+                self._due = None
+                self._writing = True
+
+            for path, (text, future) in batch.items():
+                try:
+                    atomic_write(path, text)
+                except Exception as e:
+                    self.logger.error("Could not write %s: %s", path, e)
+                    future.set_exception(e)
+                else:
+                    future.set_result(path)
+
+            with self._condition:
+                self._writing = False
+                if not self._pending:
+                    self._flush_requested = False
+                self._condition.notify_all()
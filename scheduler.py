@@ -0,0 +1,268 @@
+import heapq
+import itertools
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from constants import SCHEDULER_CLOCK_JUMP_TOLERANCE
+
+# Heap entry kinds
+START = 'start'
+STEP = 'step'
+
+if hasattr(time, 'CLOCK_BOOTTIME'):
+    _ELAPSED_CLOCK = time.CLOCK_BOOTTIME
+elif sys.platform == 'darwin' and hasattr(time, 'CLOCK_MONOTONIC'):
+    # Unlike time.monotonic(), this one keeps counting while the Mac sleeps
+    _ELAPSED_CLOCK = time.CLOCK_MONOTONIC
+else:
+    _ELAPSED_CLOCK = None
+
+def elapsed_clock() -> float:
+    """Seconds on a clock which keeps running during suspend and doesn't follow wall-clock changes"""
+    if _ELAPSED_CLOCK is None:
+        return time.monotonic()
+    return time.clock_gettime(_ELAPSED_CLOCK)
+
+def parse_start_time(value: str) -> Tuple[int, int]:
+    """'HH:MM' -> (hour, minute), raises ValueError"""
+    hour, minute = value.split(':')
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid start time: {value}")
+    return hour, minute
+
+def next_start(program: Dict, after: datetime) -> Optional[datetime]:
+    """First start of program later than after (local time), None if it never starts"""
+    weekdays = set(program.get('weekdays', range(7)))
+    starts = sorted(parse_start_time(value) for value in program.get('start_times', []))
+    if not weekdays or not starts:
+        return None
+    day = after.replace(hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(8):
+        if day.weekday() in weekdays:
+            for hour, minute in starts:
+                start = day.replace(hour=hour, minute=minute)
+                if start > after:
+                    return start
+        day += timedelta(days=1)
+    return None
+
+class ProgramRun:
+    """One run of a program: its zones one after the other, timed from the (planned) start"""
+
+    def __init__(self, program_index: int, name: str, steps: List[Tuple[int, float]], started_at: float):
+        self.program_index = program_index
+        self.name = name
+        # (zone_id, start offset, end offset) in seconds from started_at
+        self.windows: List[Tuple[int, float, float]] = []
+        offset = 0.0
+        for zone_id, seconds in steps:
+            self.windows.append((zone_id, offset, offset + seconds))
+            offset += seconds
+        self.duration = offset
+        self.started_at = started_at
+        # Zone turned on by this run
+        self.current: Optional[int] = None
+
+    def zone_at(self, offset: float) -> Optional[int]:
+        for zone_id, start, end in self.windows:
+            if start <= offset < end:
+                return zone_id
+        return None
+
+    def next_boundary(self, offset: float) -> Optional[float]:
+        for _, start, end in self.windows:
+            if start > offset:
+                return start
+            if end > offset:
+                return end
+        return None
+
+class IrrigationScheduler:
+    """
+    Runs the programs of the zone config on one min-heap of deadlines.
+
+    A program has start times, weekdays and a list of zones with their
+    durations in minutes, which run one after the other. The heap holds the
+    next start of every program and the next zone change of every running
+    program, all on a clock which keeps running during suspend, so the host
+    only has to call poll() by next_deadline(). A start missed during a
+    suspend or skipped by a wall-clock jump is caught up: the run continues
+    with the zone which should be on by now, or is skipped if already over.
+
+    Zones are switched through the callbacks, i.e. the same master rules as
+    manual control.
+    """
+
+    def __init__(self, turn_on: Callable[[int], None], turn_off: Callable[[int], None], _,
+                 jump_tolerance: float = SCHEDULER_CLOCK_JUMP_TOLERANCE,
+                 wall_clock: Callable[[], float] = time.time,
+                 elapsed: Callable[[], float] = elapsed_clock):
+        self.turn_on = turn_on
+        self.turn_off = turn_off
+        self._ = _
+        self.jump_tolerance = jump_tolerance
+        self.wall_clock = wall_clock
+        self.elapsed = elapsed
+        self.logger = logging.getLogger(__name__)
+
+        # (deadline on the elapsed clock, sequence, kind, payload)
+        self._heap: List[Tuple[float, int, str, object]] = []
+        self._sequence = itertools.count()
+        # Start entries of older generations were replaced by a rebuild
+        self._generation = 0
+        self.programs: List[Dict] = []
+        self.zones: List[Dict] = []
+        self.runs: Dict[int, ProgramRun] = {}
+        # Wall-clock start of the last run of every program, never started twice
+        self.last_started: Dict[int, datetime] = {}
+        self._zone_config = None
+        self._revision = None
+        self._last_wall = self.wall_clock()
+        self._last_elapsed = self.elapsed()
+
+    def rebuild(self, zone_config, force: bool = False) -> None:
+        """Schedule the next start of every program of zone_config"""
+        if not force and zone_config is self._zone_config and zone_config.revision == self._revision:
+            return
+        if zone_config is not self._zone_config:
+            self.last_started.clear()
+        self._zone_config = zone_config
+        self._revision = zone_config.revision
+        self.programs = list(getattr(zone_config, 'programs', []))
+        self.zones = zone_config.zones
+
+        # Runs of removed or disabled programs end now
+        for program_index in list(self.runs):
+            if program_index >= len(self.programs) or not self.programs[program_index].get('enabled', True):
+                self._finish(self.runs[program_index])
+
+        self._schedule_starts(datetime.fromtimestamp(self._last_wall))
+
+    def _schedule_starts(self, after: datetime) -> None:
+        self._generation += 1
+        # Drop the old start entries now, instead of leaving them to be skipped
+        self._heap = [entry for entry in self._heap if entry[2] != START]
+        heapq.heapify(self._heap)
+
+        wall_now = self.wall_clock()
+        elapsed_now = self.elapsed()
+        for program_index, program in enumerate(self.programs):
+            if not program.get('enabled', True):
+                continue
+            last = self.last_started.get(program_index)
+            start = next_start(program, max(after, last) if last else after)
+            if start is not None:
+                deadline = elapsed_now + (start.timestamp() - wall_now)
+                self._push(deadline, START, (self._generation, program_index, start))
+
+    def _push(self, deadline: float, kind: str, payload) -> None:
+        heapq.heappush(self._heap, (deadline, next(self._sequence), kind, payload))
+
+    def _is_stale(self, kind: str, payload) -> bool:
+        if kind == START:
+            return payload[0] != self._generation
+        return self.runs.get(payload.program_index) is not payload
+
+    def next_deadline(self) -> Optional[float]:
+        """Seconds until the next scheduled change, None if nothing is scheduled"""
+        while self._heap and self._is_stale(self._heap[0][2], self._heap[0][3]):
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - self.elapsed(), 0.0)
+
+    def poll(self) -> None:
+        """Start, advance and finish the runs which are due"""
+        wall_now = self.wall_clock()
+        elapsed_now = self.elapsed()
+
+        # The wall clock moved differently than the elapsed time: it was set, or an NTP step.
+        # Starts are wall-clock times, schedule them again; after a jump forward the ones in
+        # the skipped period are due now and caught up.
+        jump = (wall_now - self._last_wall) - (elapsed_now - self._last_elapsed)
+        if abs(jump) > self.jump_tolerance:
+            self.logger.warning(self._("System clock changed by %.0f seconds, rescheduling programs"), jump)
+            self._schedule_starts(datetime.fromtimestamp(min(self._last_wall + elapsed_now - self._last_elapsed, wall_now)))
+        self._last_wall = wall_now
+        self._last_elapsed = elapsed_now
+
+        while self._heap and self._heap[0][0] <= elapsed_now:
+            deadline, _, kind, payload = heapq.heappop(self._heap)
+            if self._is_stale(kind, payload):
+                continue
+            if kind == START:
+                self._start(payload[1], payload[2], deadline, elapsed_now)
+            else:
+                self._step(payload, elapsed_now)
+
+    def _start(self, program_index: int, start: datetime, deadline: float, now: float) -> None:
+        program = self.programs[program_index]
+        self.last_started[program_index] = start
+        # The next start of the program
+        following = next_start(program, start)
+        if following is not None:
+            self._push(deadline + (following.timestamp() - start.timestamp()), START,
+                       (self._generation, program_index, following))
+
+        name = program.get('name', str(program_index))
+        steps = [(step['zone'], step['minutes'] * 60) for step in program.get('zones', [])]
+        run = ProgramRun(program_index, name, steps, deadline)
+        late = now - deadline
+        if late >= run.duration:
+            self.logger.warning(self._("Program %s of %s was missed"), name, start.strftime('%Y-%m-%d %H:%M'))
+            return
+        if late > self.jump_tolerance:
+            self.logger.info(self._("Program %s started %.0f seconds late, catching up"), name, late)
+        else:
+            self.logger.info(self._("Program %s started"), name)
+
+        previous = self.runs.get(program_index)
+        if previous is not None:
+            self._finish(previous)
+        self.runs[program_index] = run
+        self._step(run, now)
+
+    def _step(self, run: ProgramRun, now: float) -> None:
+        offset = now - run.started_at
+        zone_id = run.zone_at(offset)
+        if zone_id is not None and not (0 <= zone_id < len(self.zones) and self.zones[zone_id].enabled):
+            zone_id = None
+
+        if zone_id != run.current:
+            # The next zone first, so a shared master stays open between the two
+            previous = run.current
+            run.current = zone_id
+            if zone_id is not None:
+                self.turn_on(zone_id)
+            if previous is not None:
+                self.turn_off(previous)
+
+        boundary = run.next_boundary(offset)
+        if boundary is None:
+            self._finish(run)
+        else:
+            self._push(run.started_at + boundary, STEP, run)
+
+    def _finish(self, run: ProgramRun) -> None:
+        if self.runs.get(run.program_index) is run:
+            del self.runs[run.program_index]
+        if run.current is not None:
+            zone_id, run.current = run.current, None
+            self.turn_off(zone_id)
+        self.logger.info(self._("Program %s finished"), run.name)
+
+    def stop_all(self) -> None:
+        """End every running program, turning off the zones they turned on"""
+        for run in list(self.runs.values()):
+            self._finish(run)
+
+    def status(self) -> Dict[str, object]:
+        """Running programs and the next start, for display"""
+        starts = [payload[2] for _, _, kind, payload in self._heap if kind == START and payload[0] == self._generation]
+        return {
+            'running': sorted(run.name for run in self.runs.values()),
+            'next_start': min(starts) if starts else None,
+        }
@@ -22,7 +22,7 @@ OPTIONS = {
     },
     'packages': ['tkinter'],
     'resources': ['assets', 'locales'],
-    'includes': ['constants', 'configuration', 'utils', 'zone_control']
+    'includes': ['constants', 'configuration', 'utils', 'zone_control', 'event_queue', 'zone_engine', 'zone_controller', 'mqtt_async', 'command_outbox', 'command_pipeline', 'zone_latency', 'persistence', 'startup_profiler', 'mqtt_client', 'text_registry', 'log_pipeline', 'metrics', 'scheduler', 'timer_wheel', 'state_journal', 'config_schema', 'json_stream', 'gui_app']
 }
 
 setup(
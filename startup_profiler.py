@@ -0,0 +1,25 @@
+import time
+from typing import List, Optional, Tuple
+
+class StartupProfiler:
+    """Wall-clock time of the startup phases, each measured from the end of the previous one"""
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = time.perf_counter() if start is None else start
+        self._last = self.start
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """End the current phase"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total_ms(self) -> float:
+        return (self._last - self.start) * 1000
+
+    def report(self) -> str:
+        lines = [f"{phase:<20}{seconds * 1000:9.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"{'total':<20}{self.total_ms:9.1f} ms")
+        return "\n".join(lines)
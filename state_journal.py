@@ -0,0 +1,162 @@
+import logging
+import os
+from concurrent.futures import Future
+from threading import Lock
+from typing import List, Optional, Tuple
+from persistence import PersistenceService
+from constants import STATE_JOURNAL_COMPACT_LINES
+
+# First line of a journal: format, zone config key, zone count and the active zones as a hex bitset
+SNAPSHOT_PREFIX = 'V1'
+
+class StateJournal:
+    """
+    Append-only journal of the zone states, for restoring them after a crash or restart.
+
+    The file starts with a snapshot of the active zones, followed by one short
+    line per transition ("+3" on, "-3" off). Once it has grown by
+    compact_lines transitions it is replaced by a fresh snapshot, written
+    atomically by the persistence service, off the calling thread. Until the
+    snapshot is in place the transitions go to the old file, and are appended
+    to the new one after it. If the snapshot can't be written, the old file
+    is kept and the snapshot is written again with the next transition. A
+    line torn by a crash is ignored on load.
+    """
+
+    def __init__(self, path: str, compact_lines: int = STATE_JOURNAL_COMPACT_LINES,
+                 persistence: Optional[PersistenceService] = None, _=str):
+        self.path = path
+        self.compact_lines = compact_lines
+        self.persistence = persistence or PersistenceService()
+        self._ = _
+        self.logger = logging.getLogger(__name__)
+        self.key = ''
+        self.zone_count = 0
+        self.active = 0
+        self._lines = 0
+        self._fd: Optional[int] = None
+        # Pending snapshot write, and the transitions recorded since it was queued
+        self._compaction: Optional[Future] = None
+        self._since_compaction: List[str] = []
+        # The last snapshot could not be written, the next transition writes it again
+        self._retry = False
+        # The snapshot is put in place on the persistence thread
+        self._lock = Lock()
+
+    def load(self) -> Optional[Tuple[str, int, int]]:
+        """(zone config key, zone count, active bitset) of the journal, None if there is none or it can't be read"""
+        try:
+            with open(self.path, 'r', encoding='ascii') as f:
+                lines = f.read().split('\n')
+        except FileNotFoundError:
+            return None
+        except (OSError, UnicodeDecodeError) as e:
+            self.logger.warning(self._("Could not read the zone state journal %s: %s"), self.path, e)
+            return None
+
+        try:
+            prefix, key, zone_count, mask = lines[0].split()
+            if prefix != SNAPSHOT_PREFIX:
+                return None
+            zone_count, active = int(zone_count), int(mask, 16)
+        except ValueError:
+            return None
+
+        # The last line is empty after a complete write, anything else there was torn
+        for line in lines[1:-1]:
+            try:
+                zone_id = int(line[1:])
+            except ValueError:
+                continue
+            if not 0 <= zone_id < zone_count:
+                continue
+            if line[0] == '+':
+                active |= 1 << zone_id
+            elif line[0] == '-':
+                active &= ~(1 << zone_id)
+        return key, zone_count, active
+
+    def open(self, key: str, zone_count: int, active: int) -> None:
+        """Start journaling from a snapshot of the given state"""
+        self.compact(key, zone_count, active)
+
+    def record(self, changes: List[Tuple[int, bool]]) -> None:
+        """Append the transitions of one zone engine operation, with a single write"""
+        text = ''.join(f"{'+' if active else '-'}{zone_id}\n" for zone_id, active in changes)
+        if not text:
+            return
+        with self._lock:
+            if self._fd is None and self._compaction is None and not self._retry:
+                return
+            for zone_id, active in changes:
+                if active:
+                    self.active |= 1 << zone_id
+                else:
+                    self.active &= ~(1 << zone_id)
+            if self._compaction is not None:
+                self._since_compaction.append(text)
+            if self._fd is not None:
+                try:
+                    os.write(self._fd, text.encode('ascii'))
+                except OSError as e:
+                    self.logger.error(self._("Could not write the zone state journal: %s"), e)
+                    return
+            self._lines += len(changes)
+            compact = (self._retry or self._lines >= self.compact_lines) and self._compaction is None
+        if compact:
+            self.compact(self.key, self.zone_count, self.active)
+
+    def compact(self, key: str, zone_count: int, active: int) -> None:
+        """Replace the journal by a snapshot of the given state, written in the background"""
+        with self._lock:
+            self.key = key
+            self.zone_count = zone_count
+            self.active = active & ((1 << zone_count) - 1)
+            self._lines = 0
+            self._since_compaction = []
+            self._retry = False
+            try:
+                compaction = self.persistence.write(self.path, f"{SNAPSHOT_PREFIX} {key} {zone_count} {self.active:x}\n")
+            except RuntimeError as e:
+                self.logger.error(self._("Could not write the zone state journal: %s"), e)
+                self._retry = True
+                return
+            self._compaction = compaction
+        compaction.add_done_callback(self._compacted)
+
+    def _compacted(self, compaction: Future) -> None:
+        with self._lock:
+            # A newer snapshot replaces this one
+            if compaction is not self._compaction:
+                return
+            self._compaction = None
+            error = compaction.exception()
+            if error is not None:
+                # The old file is still in place and got the transitions since, it stays in use
+                self.logger.error(self._("Could not write the zone state journal: %s"), error)
+                self._retry = True
+                self._since_compaction = []
+                return
+            self._close_fd()
+            try:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+                if self._since_compaction:
+                    os.write(self._fd, ''.join(self._since_compaction).encode('ascii'))
+            except OSError as e:
+                self.logger.error(self._("Could not write the zone state journal: %s"), e)
+                self._retry = True
+            self._since_compaction = []
+
+    def _close_fd(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def close(self) -> None:
+        """Stop journaling, after the pending snapshot (if any) is written"""
+        if self._compaction is not None:
+            self.persistence.flush()
+        with self._lock:
+            self._compaction = None
+            self._retry = False
+            self._close_fd()
@@ -0,0 +1,17 @@
+import pytest
+
+class FakeClock:
+    """A clock which only moves when told to"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    return FakeClock(1000.0)
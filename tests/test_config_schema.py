@@ -0,0 +1,119 @@
+import pytest
+from config_schema import (
+    ListOf, Record, Value, compile_schema, general_schema, mqtt_schema, program_schema, reference_errors,
+    zone_schema,
+)
+from configuration import Zone, ZoneConfig
+
+validate_program = compile_schema(program_schema())
+validate_mqtt = compile_schema(mqtt_schema(('threaded', 'asyncio')))
+validate_zone = compile_schema(zone_schema(Zone))
+
+def errors_of(validate, value, path=''):
+    errors = []
+    validate(value, path, errors)
+    # The generated check has to agree with the report
+    assert validate.check(value) is not bool(errors)
+    return errors
+
+PROGRAM = {'name': 'Morning', 'start_times': ['06:00'], 'zones': [{'zone': 1, 'minutes': 10}]}
+
+def test_valid_program():
+    assert errors_of(validate_program, PROGRAM, 'programs[0]') == []
+
+@pytest.mark.parametrize('change, expected', [
+    ({'start_times': ['6:00', '24:00']}, ["programs[0].start_times[1]: expected a time as HH:MM, got '24:00'"]),
+    ({'weekdays': [0, 7]}, ["programs[0].weekdays[1]: expected a weekday from 0 (Monday) to 6, got 7"]),
+    ({'weekdays': [True]}, ["programs[0].weekdays[0]: expected a weekday from 0 (Monday) to 6, got True"]),
+    ({'zones': [{'zone': 1, 'minutes': 0}]}, ["programs[0].zones[0].minutes: expected a number of minutes above 0, got 0"]),
+    ({'zones': [{'minutes': 5}]}, ["programs[0].zones[0].zone: missing"]),
+    ({'zones': 'all'}, ["programs[0].zones: expected a list, got 'all'"]),
+    ({'enabled': 'yes', 'name': 3}, ["programs[0].name: expected a string, got 3",
+                                     "programs[0].enabled: expected true or false, got 'yes'"]),
+])
+def test_program_errors_have_precise_paths(change, expected):
+    assert errors_of(validate_program, {**PROGRAM, **change}, 'programs[0]') == expected
+
+def test_missing_required_field():
+    program = dict(PROGRAM)
+    del program['start_times']
+    assert errors_of(validate_program, program, 'programs[0]') == ["programs[0].start_times: missing"]
+
+def test_record_of_the_wrong_type():
+    assert errors_of(validate_program, ['06:00'], 'programs[0]') == ["programs[0]: expected an object, got ['06:00']"]
+
+def test_disabled_mqtt_section_isnt_checked():
+    assert errors_of(validate_mqtt, {'enabled': False, 'port': 0, 'transport': 'carrier pigeon'}, 'mqtt') == []
+
+def test_enabled_mqtt_section_is_checked():
+    assert errors_of(validate_mqtt, {'enabled': True, 'port': 0, 'transport': 'udp'}, 'mqtt') == [
+        "mqtt.port: expected a port from 1 to 65535, got 0",
+        "mqtt.transport: expected one of threaded, asyncio, got 'udp'",
+    ]
+
+def test_rule_between_fields():
+    mqtt = {'enabled': True, 'persistent_session': True, 'client_id': ''}
+    assert errors_of(validate_mqtt, mqtt, 'mqtt') == ["mqtt.client_id: expected a client id for the persistent session"]
+    assert errors_of(validate_mqtt, {**mqtt, 'client_id': 'valve'}, 'mqtt') == []
+
+def test_zone_instances():
+    assert errors_of(validate_zone, Zone('Lawn'), 'zones[0]') == []
+    assert errors_of(validate_zone, Zone('Lawn', enabled=1, master_zone=-2), 'zones[0]') == [
+        "zones[0].enabled: expected true or false, got 1",
+        "zones[0].master_zone: expected a zone index or -1, got -2",
+    ]
+    assert errors_of(validate_zone, {'name': 'Lawn'}, 'zones[0]') == ["zones[0]: expected an object, got {'name': 'Lawn'}"]
+
+def test_optional_list_and_top_level_path():
+    validate = compile_schema(Record({'items': ListOf(Value(int, "an integer"), optional=True)}))
+    assert errors_of(validate, {}) == []
+    assert errors_of(validate, {'items': [1, 2.5]}) == ["items[1]: expected an integer, got 2.5"]
+    assert errors_of(compile_schema(general_schema()), {}, 'general') == ["general.open_master_automatically: missing"]
+
+def test_reference_errors():
+    zones = [
+        Zone('Pump', is_master=True),
+        Zone('Lawn', master_zone=5),
+        Zone('Self', master_zone=2, is_master=True),
+        Zone('Hedge', master_zone=1),
+        Zone('A', master_zone=5, is_master=True),
+        Zone('B', master_zone=4, is_master=True),
+    ]
+    programs = [{'zones': [{'zone': 0}, {'zone': 6}, {'zone': 'x'}]}]
+    assert reference_errors(zones, programs) == [
+        "zones[2].master_zone: a zone can't be its own master",
+        "zones[3].master_zone: zone 1 is not a master zone",
+        "zones[4].master_zone: master zones form a cycle",
+        "zones[5].master_zone: master zones form a cycle",
+        "programs[0].zones[1].zone: zone 6 doesn't exist",
+    ]
+
+def test_reference_to_a_missing_zone():
+    assert reference_errors([Zone('Lawn', master_zone=3)], []) == ["zones[0].master_zone: zone 3 doesn't exist"]
+
+def make_config():
+    zones = [Zone('Pump', is_master=True), Zone('Lawn', master_zone=0)]
+    general = {'open_master_automatically': True}
+    return ZoneConfig(zones, general, {'enabled': False}, [dict(PROGRAM)])
+
+def test_zone_config_errors_follow_the_edits():
+    config = make_config()
+    assert config.errors() == []
+
+    config.set_zone_field(1, 'name', None)
+    assert config.errors() == ["zones[1].name: expected a string, got None"]
+
+    config.set_zone_field(0, 'is_master', False)
+    assert config.errors() == ["zones[1].name: expected a string, got None",
+                               "zones[1].master_zone: zone 0 is not a master zone"]
+
+    config.set_zone_field(1, 'name', 'Lawn')
+    config.set_zone_field(0, 'is_master', True)
+    config.set_general('open_master_automatically', 'yes')
+    assert config.errors() == ["general.open_master_automatically: expected true or false, got 'yes'"]
+
+def test_removing_a_zone_drops_its_program_steps():
+    config = make_config()
+    config.remove_last_zone()
+    assert config.programs[0]['zones'] == []
+    assert config.errors() == []
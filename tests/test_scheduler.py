@@ -0,0 +1,144 @@
+from datetime import datetime
+
+import pytest
+from configuration import Zone, ZoneConfig
+from scheduler import IrrigationScheduler, next_start, parse_start_time
+from conftest import FakeClock
+
+# A Monday
+MONDAY = datetime(2026, 6, 1)
+
+def at(hour, minute, second=0, day=MONDAY):
+    return day.replace(hour=hour, minute=minute, second=second).timestamp()
+
+def make_config(programs, disabled=()):
+    zones = [Zone(f"Zone {zone_id}", enabled=zone_id not in disabled) for zone_id in range(4)]
+    return ZoneConfig(zones, {}, {}, programs)
+
+MORNING = {
+    'name': 'Morning',
+    'start_times': ['06:00'],
+    'zones': [{'zone': 1, 'minutes': 10}, {'zone': 2, 'minutes': 5}],
+}
+
+class Host:
+    """Scheduler on a wall clock and an elapsed clock, recording the zone switches"""
+
+    def __init__(self, programs, wall, disabled=()):
+        self.wall = FakeClock(wall)
+        self.elapsed = FakeClock(500.0)
+        self.switches = []
+        self.scheduler = IrrigationScheduler(
+            lambda zone_id: self.switches.append((zone_id, True)),
+            lambda zone_id: self.switches.append((zone_id, False)),
+            str, wall_clock=self.wall, elapsed=self.elapsed
+        )
+        self.config = make_config(programs, disabled)
+        self.scheduler.rebuild(self.config)
+
+    def run(self, seconds, suspended=False):
+        """Let seconds pass, polling by the deadlines unless suspended"""
+        end = self.elapsed.now + seconds
+        while not suspended:
+            deadline = self.scheduler.next_deadline()
+            if deadline is None or self.elapsed.now + deadline > end:
+                break
+            self.wall.advance(deadline)
+            self.elapsed.advance(deadline)
+            self.scheduler.poll()
+        self.wall.advance(end - self.elapsed.now)
+        self.elapsed.now = end
+        self.scheduler.poll()
+
+def test_parse_start_time():
+    assert parse_start_time('06:30') == (6, 30)
+    with pytest.raises(ValueError):
+        parse_start_time('24:00')
+
+def test_next_start_skips_to_the_next_weekday():
+    program = {'start_times': ['19:30', '06:00'], 'weekdays': [2]}
+    assert next_start(program, MONDAY.replace(hour=7)) == datetime(2026, 6, 3, 6, 0)
+    assert next_start(program, datetime(2026, 6, 3, 6, 0)) == datetime(2026, 6, 3, 19, 30)
+    assert next_start({'start_times': [], 'weekdays': [0]}, MONDAY) is None
+
+def test_program_runs_its_zones_one_after_the_other():
+    host = Host([MORNING], at(5, 59))
+    assert host.scheduler.next_deadline() == pytest.approx(60)
+
+    host.run(60)
+    assert host.switches == [(1, True)]
+    assert host.scheduler.status()['running'] == ['Morning']
+
+    host.run(10 * 60)
+    # The next zone first, so a shared master stays open
+    assert host.switches == [(1, True), (2, True), (1, False)]
+
+    host.run(5 * 60)
+    assert host.switches[-1] == (2, False)
+    assert host.scheduler.status() == {'running': [], 'next_start': datetime(2026, 6, 2, 6, 0)}
+
+def test_disabled_zones_are_skipped():
+    host = Host([MORNING], at(5, 59), disabled={1})
+    host.run(60)
+    assert host.switches == []
+    host.run(10 * 60)
+    assert host.switches == [(2, True)]
+
+def test_disabled_program_doesnt_start():
+    host = Host([dict(MORNING, enabled=False)], at(5, 59))
+    assert host.scheduler.next_deadline() is None
+    assert host.scheduler.status()['next_start'] is None
+
+def test_run_is_caught_up_after_a_suspend():
+    host = Host([MORNING], at(5, 59))
+    # Suspended over the start and the first zone's window
+    host.run(12 * 60, suspended=True)
+    assert host.switches == [(2, True)]
+    host.run(3 * 60)
+    assert host.switches == [(2, True)]
+    host.run(60)
+    assert host.switches == [(2, True), (2, False)]
+
+def test_run_already_over_is_missed():
+    host = Host([MORNING], at(5, 59))
+    host.run(30 * 60, suspended=True)
+    assert host.switches == []
+    assert host.scheduler.status()['next_start'] == datetime(2026, 6, 2, 6, 0)
+
+def test_clock_set_forward_over_a_start_catches_it_up():
+    host = Host([MORNING], at(5, 59))
+    host.wall.now = at(6, 5)
+    host.elapsed.advance(1)
+    host.scheduler.poll()
+    assert host.switches == [(1, True)]
+    # The rest of the run is timed from the planned start
+    host.run(5 * 60)
+    assert host.switches == [(1, True), (2, True), (1, False)]
+
+def test_clock_set_back_doesnt_start_a_program_twice():
+    host = Host([MORNING], at(5, 59))
+    host.run(2 * 60)
+    host.wall.now = at(5, 58)
+    host.elapsed.advance(1)
+    host.scheduler.poll()
+    host.run(30 * 60)
+    assert host.switches.count((1, True)) == 1
+
+def test_stop_all_turns_off_the_running_zone():
+    host = Host([MORNING], at(5, 59))
+    host.run(2 * 60)
+    host.scheduler.stop_all()
+    assert host.switches == [(1, True), (1, False)]
+    assert host.scheduler.status()['running'] == []
+    # Nothing left of the run
+    host.run(20 * 60)
+    assert host.switches == [(1, True), (1, False)]
+
+def test_disabling_a_running_program_ends_its_run():
+    host = Host([MORNING], at(5, 59))
+    host.run(2 * 60)
+    host.config.programs[0]['enabled'] = False
+    host.config.revision += 1
+    host.scheduler.rebuild(host.config)
+    assert host.switches == [(1, True), (1, False)]
+    assert host.scheduler.next_deadline() is None
@@ -0,0 +1,124 @@
+from concurrent.futures import Future
+
+import pytest
+from persistence import PersistenceService, atomic_write
+from state_journal import StateJournal
+
+class SyncPersistence:
+    """Writes at once on the calling thread, or fails every write while failing is set"""
+
+    def __init__(self):
+        self.failing = False
+        self.writes = 0
+
+    def write(self, path, text):
+        self.writes += 1
+        future = Future()
+        if self.failing:
+            future.set_exception(OSError("disk full"))
+        else:
+            atomic_write(path, text)
+            future.set_result(path)
+        return future
+
+    def flush(self, timeout=None):
+        return True
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'zone_state.journal')
+
+def read(path):
+    with open(path, encoding='ascii') as f:
+        return f.read()
+
+def test_missing_journal_loads_nothing(path):
+    assert StateJournal(path).load() is None
+
+def test_transitions_are_replayed_on_the_snapshot(path):
+    journal = StateJournal(path, persistence=SyncPersistence())
+    journal.open('key', 8, 0b1)
+    journal.record([(3, True), (5, True)])
+    journal.record([(0, False)])
+    journal.close()
+    assert read(path) == 'V1 key 8 1\n+3\n+5\n-0\n'
+    assert StateJournal(path).load() == ('key', 8, 0b101000)
+
+def test_torn_and_invalid_lines_are_ignored(path):
+    with open(path, 'w', encoding='ascii') as f:
+        f.write('V1 key 4 0\n+1\nxx\n+9\n+2\n-1\n+3')
+    assert StateJournal(path).load() == ('key', 4, 0b100)
+
+@pytest.mark.parametrize('content', ['', 'V2 key 4 0\n', 'V1 key four 0\n', 'V1 key\n'])
+def test_unknown_snapshot_loads_nothing(path, content):
+    with open(path, 'w', encoding='ascii') as f:
+        f.write(content)
+    assert StateJournal(path).load() is None
+
+def test_journal_is_compacted_into_a_snapshot(path):
+    persistence = SyncPersistence()
+    journal = StateJournal(path, compact_lines=3, persistence=persistence)
+    journal.open('key', 8, 0)
+    journal.record([(1, True), (2, True)])
+    journal.record([(1, False)])
+    assert read(path) == 'V1 key 8 4\n'
+    journal.record([(7, True)])
+    journal.close()
+    assert read(path) == 'V1 key 8 4\n+7\n'
+    assert persistence.writes == 2
+
+def test_transitions_during_a_compaction_follow_the_snapshot(path):
+    persistence = PersistenceService(delay=60)
+    try:
+        journal = StateJournal(path, compact_lines=2, persistence=persistence)
+        journal.open('key', 8, 0)
+        persistence.flush()
+        journal.record([(1, True), (2, True)])
+        # The snapshot is still queued, the old file gets these as well
+        journal.record([(3, True)])
+        journal.record([(2, False)])
+        assert StateJournal(path).load() == ('key', 8, 0b1010)
+        persistence.flush()
+        assert read(path) == 'V1 key 8 6\n+3\n-2\n'
+        journal.record([(4, True)])
+        journal.close()
+        assert StateJournal(path).load() == ('key', 8, 0b11010)
+    finally:
+        persistence.close()
+
+def test_failed_compaction_keeps_the_old_journal_and_retries(path):
+    persistence = SyncPersistence()
+    journal = StateJournal(path, compact_lines=2, persistence=persistence)
+    journal.open('key', 8, 0)
+    persistence.failing = True
+    journal.record([(1, True), (2, True)])
+    # Still journaling into the old file
+    journal.record([(3, True)])
+    assert read(path) == 'V1 key 8 0\n+1\n+2\n+3\n'
+
+    persistence.failing = False
+    journal.record([(1, False)])
+    assert read(path) == 'V1 key 8 c\n'
+    journal.record([(5, True)])
+    journal.close()
+    assert StateJournal(path).load() == ('key', 8, 0b101100)
+
+def test_failed_first_snapshot_is_written_with_the_next_transition(path):
+    persistence = SyncPersistence()
+    persistence.failing = True
+    journal = StateJournal(path, persistence=persistence)
+    journal.open('key', 8, 0b1)
+    assert journal.load() is None
+
+    persistence.failing = False
+    journal.record([(2, True)])
+    journal.record([(4, True)])
+    journal.close()
+    assert StateJournal(path).load() == ('key', 8, 0b10101)
+
+def test_closed_journal_records_nothing(path):
+    journal = StateJournal(path, persistence=SyncPersistence())
+    journal.open('key', 8, 0)
+    journal.close()
+    journal.record([(1, True)])
+    assert read(path) == 'V1 key 8 0\n'
@@ -0,0 +1,67 @@
+import pytest
+from timer_wheel import TimerWheel
+
+@pytest.fixture
+def wheel(clock):
+    # Small levels, so the tests cross every level: 4, 16 and 64 ticks
+    return TimerWheel(tick=1.0, slots=4, levels=3, clock=clock)
+
+def run(wheel, clock, seconds, step=1.0):
+    """Advance the wheel step by step, returns {key: second it expired at}"""
+    fired = {}
+    start = clock.now
+    while clock.now - start < seconds:
+        clock.advance(step)
+        for key in wheel.advance():
+            fired[key] = clock.now - start
+    return fired
+
+def test_timer_expires_on_its_tick(wheel, clock):
+    wheel.schedule('a', 3)
+    assert 'a' in wheel
+    assert wheel.remaining('a') == pytest.approx(3)
+    assert run(wheel, clock, 10) == {'a': 3}
+    assert 'a' not in wheel and len(wheel) == 0
+
+@pytest.mark.parametrize('delay', [5, 17, 40, 63])
+def test_timers_of_higher_levels_expire_on_time(wheel, clock, delay):
+    wheel.schedule('a', delay)
+    assert run(wheel, clock, 100) == {'a': delay}
+
+def test_timer_beyond_the_wheel_is_placed_again(wheel, clock):
+    wheel.schedule('a', 150)
+    assert run(wheel, clock, 200) == {'a': 150}
+
+def test_fractional_delay_rounds_up_to_a_tick(wheel, clock):
+    clock.advance(0.5)
+    wheel.schedule('a', 1.2)
+    assert run(wheel, clock, 5, step=0.25) == {'a': 1.5}
+
+def test_cancel_and_reschedule(wheel, clock):
+    wheel.schedule('a', 3)
+    wheel.schedule('b', 3)
+    assert wheel.cancel('a')
+    assert not wheel.cancel('a')
+    wheel.schedule('b', 6)
+    assert run(wheel, clock, 10) == {'b': 6}
+
+def test_next_tick(wheel, clock):
+    assert wheel.next_tick() is None
+    wheel.schedule('a', 10)
+    clock.advance(0.25)
+    assert wheel.next_tick() == pytest.approx(0.75)
+
+def test_long_pause_expires_the_overdue_timers_in_order(wheel, clock):
+    wheel.schedule('late', 30)
+    wheel.schedule('early', 10)
+    wheel.schedule('pending', 90)
+    clock.advance(50)
+    assert wheel.advance() == ['early', 'late']
+    assert wheel.remaining('pending') == pytest.approx(40)
+    assert run(wheel, clock, 50) == {'pending': 40}
+
+def test_many_timers_each_expire_once(wheel, clock):
+    for key in range(200):
+        wheel.schedule(key, key % 70 + 1)
+    fired = run(wheel, clock, 80)
+    assert fired == {key: key % 70 + 1 for key in range(200)}
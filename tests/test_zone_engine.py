@@ -0,0 +1,151 @@
+import pytest
+from configuration import Zone, ZoneConfig
+from zone_engine import ZoneStateEngine, iter_bits
+
+def make_config(general=None):
+    """Pump (0) with two dependent zones (1, 2), a second master (3) with one (4), and a free zone (5)"""
+    zones = [
+        Zone('Pump', is_master=True),
+        Zone('Lawn', master_zone=0),
+        Zone('Hedge', master_zone=0),
+        Zone('Well', is_master=True),
+        Zone('Garden', master_zone=3),
+        Zone('Tap'),
+    ]
+    settings = {
+        'open_master_automatically': True,
+        'close_master_automatically': True,
+        'close_dependent_automatically': True,
+    }
+    settings.update(general or {})
+    return ZoneConfig(zones, settings, {})
+
+@pytest.fixture
+def commands():
+    return []
+
+@pytest.fixture
+def engine(commands):
+    return ZoneStateEngine(make_config(), on_command=lambda zone_id, state: commands.append((zone_id, state)))
+
+def active_zones(engine):
+    return list(iter_bits(engine.active))
+
+def test_iter_bits_lowest_first():
+    assert list(iter_bits(0b101001)) == [0, 3, 5]
+    assert list(iter_bits(0)) == []
+
+def test_rebuild_precomputes_relations(engine):
+    assert engine.master_index == [-1, 0, 0, -1, 3, -1]
+    assert engine.dependents_mask[0] == 0b110
+    assert engine.dependents_mask[3] == 0b10000
+    assert engine.masters_mask == 0b1001
+
+def test_toggle_opens_master_before_dependent(engine, commands):
+    engine.toggle(1)
+    assert active_zones(engine) == [0, 1]
+    assert commands == [(0, True), (1, True)]
+
+def test_toggle_without_open_master_automatically(commands):
+    engine = ZoneStateEngine(make_config({'open_master_automatically': False}),
+                             on_command=lambda zone_id, state: commands.append((zone_id, state)))
+    engine.toggle(1)
+    assert active_zones(engine) == [1]
+    assert commands == [(1, True)]
+
+def test_master_stays_open_while_a_dependent_is_active(engine, commands):
+    engine.toggle(1)
+    engine.toggle(2)
+    commands.clear()
+    engine.toggle(1)
+    assert active_zones(engine) == [0, 2]
+    assert commands == [(1, False)]
+
+def test_last_dependent_off_closes_its_master(engine, commands):
+    engine.toggle(1)
+    engine.toggle(4)
+    commands.clear()
+    engine.toggle(1)
+    assert active_zones(engine) == [3, 4]
+    assert commands == [(1, False), (0, False)]
+
+def test_close_master_automatically_disabled(commands):
+    engine = ZoneStateEngine(make_config({'close_master_automatically': False}),
+                             on_command=lambda zone_id, state: commands.append((zone_id, state)))
+    engine.toggle(1)
+    engine.toggle(1)
+    assert active_zones(engine) == [0]
+
+def test_master_off_closes_dependents_first(engine, commands):
+    engine.toggle(1)
+    engine.toggle(2)
+    commands.clear()
+    engine.deactivate(0)
+    assert active_zones(engine) == []
+    assert commands == [(1, False), (2, False), (0, False)]
+
+def test_close_dependent_automatically_disabled(commands):
+    engine = ZoneStateEngine(make_config({'close_dependent_automatically': False}),
+                             on_command=lambda zone_id, state: commands.append((zone_id, state)))
+    engine.toggle(1)
+    engine.deactivate(0)
+    assert active_zones(engine) == [1]
+
+def test_free_zone_doesnt_touch_masters(engine, commands):
+    engine.toggle(1)
+    engine.toggle(5)
+    engine.toggle(5)
+    assert active_zones(engine) == [0, 1]
+    assert commands == [(0, True), (1, True), (5, True), (5, False)]
+
+def test_remote_on_commands_only_the_master(engine, commands):
+    engine.apply_remote_state(4, True)
+    assert active_zones(engine) == [3, 4]
+    assert commands == [(3, True)]
+
+def test_remote_master_off_commands_only_the_dependents(engine, commands):
+    engine.toggle(1)
+    engine.toggle(2)
+    commands.clear()
+    engine.apply_remote_state(0, False)
+    assert active_zones(engine) == []
+    assert commands == [(1, False), (2, False)]
+
+def test_remote_state_of_unknown_zone_is_ignored(engine, commands):
+    engine.apply_remote_state(42, True)
+    assert engine.active == 0
+    assert commands == []
+
+def test_listeners_get_one_notification_per_operation(engine):
+    notifications = []
+    engine.subscribe(notifications.append)
+    engine.toggle(1)
+    engine.deactivate(0)
+    assert notifications == [[(0, True), (1, True)], [(1, False), (0, False)]]
+
+    engine.unsubscribe(notifications.append)
+    engine.toggle(5)
+    assert len(notifications) == 2
+
+def test_unchanged_state_notifies_nothing(engine, commands):
+    notifications = []
+    engine.subscribe(notifications.append)
+    engine.deactivate(1)
+    assert notifications == []
+    assert commands == []
+
+def test_restore_sets_known_zones_without_commands(engine, commands):
+    engine.toggle(5)
+    commands.clear()
+    engine.restore(0b10010, known=0b10011)
+    assert active_zones(engine) == [1, 4, 5]
+    assert commands == []
+
+def test_rebuild_forgets_removed_zones(engine):
+    engine.toggle(5)
+    engine.toggle(1)
+    config = make_config()
+    del config.zones[5]
+    engine.rebuild(config)
+    assert active_zones(engine) == [0, 1]
+    assert engine.zone_count == 5
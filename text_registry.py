@@ -0,0 +1,52 @@
+from typing import Callable, List
+
+def N_(message: str) -> str:
+    """Mark message for translation without translating it, it is translated when shown"""
+    return message
+
+class TextRegistry:
+    """
+    Translatable texts of the widgets, so a language switch updates them in place.
+
+    Widgets are created with their text bound here instead of a translated
+    string, refresh() translates every bound text again with the current
+    language. Texts which are computed (e.g. a status) register a callback.
+    """
+
+    def __init__(self, _):
+        self._ = _
+        self._entries: List[Callable[[], None]] = []
+
+    def _add(self, apply: Callable[[], None]) -> None:
+        apply()
+        self._entries.append(apply)
+
+    def bind(self, widget, message: str, option: str = 'text'):
+        """Show the translation of message in the given option of widget, returns the widget"""
+        self._add(lambda: widget.configure(**{option: self._(message)}))
+        return widget
+
+    def bind_menu_entry(self, menu, index, message: str) -> None:
+        self._add(lambda: menu.entryconfigure(index, label=self._(message)))
+
+    def bind_tab(self, notebook, tab, message: str) -> None:
+        self._add(lambda: notebook.tab(tab, text=self._(message)))
+
+    def bind_heading(self, treeview, column: str, message: str) -> None:
+        self._add(lambda: treeview.heading(column, text=self._(message)))
+
+    def bind_callback(self, callback: Callable[[], None]) -> None:
+        """Call callback now and after every language switch"""
+        self._add(callback)
+
+    def refresh(self) -> None:
+        """Translate every bound text again, forgetting the ones of destroyed widgets"""
+        alive = []
+        for apply in self._entries:
+            try:
+                apply()
+            except Exception:
+                # The widget was destroyed since
+                continue
+            alive.append(apply)
+        self._entries = alive
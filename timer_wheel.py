@@ -0,0 +1,124 @@
+import math
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Set
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel: adding, cancelling and expiring a timer is O(1).
+
+    Level 0 has one slot per tick, every further level has slots as long as a
+    whole turn of the level below. A timer is put into the lowest level whose
+    range covers it and moves down a level whenever that level's current slot
+    comes around, so advancing the wheel only looks at the timers which are
+    (nearly) due, no matter how many are pending.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 3,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.clock = clock
+        self.origin = clock()
+        # Ticks processed so far
+        self.current = 0
+        self._wheels: List[List[Set[Hashable]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        # key -> expiry tick, and the slot the key is in
+        self._expiry: Dict[Hashable, int] = {}
+        self._location: Dict[Hashable, Set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def __contains__(self, key) -> bool:
+        return key in self._expiry
+
+    def keys(self):
+        return self._expiry.keys()
+
+    def schedule(self, key: Hashable, delay: float) -> None:
+        """(Re)start the timer of key, expiring delay seconds from now"""
+        self.cancel(key)
+        now_ticks = (self.clock() - self.origin) / self.tick
+        expiry = max(math.ceil(now_ticks + delay / self.tick), self.current + 1)
+        self._expiry[key] = expiry
+        self._place(key, expiry)
+
+    def cancel(self, key: Hashable) -> bool:
+        slot = self._location.pop(key, None)
+        if slot is None:
+            return False
+        slot.discard(key)
+        del self._expiry[key]
+        return True
+
+    def remaining(self, key: Hashable) -> Optional[float]:
+        """Seconds until the timer of key expires, None if it has no timer"""
+        expiry = self._expiry.get(key)
+        if expiry is None:
+            return None
+        return max(self.origin + expiry * self.tick - self.clock(), 0.0)
+
+    def next_tick(self) -> Optional[float]:
+        """Seconds until the wheel has to be advanced again, None while there are no timers"""
+        if not self._expiry:
+            return None
+        return max(self.origin + (self.current + 1) * self.tick - self.clock(), 0.0)
+
+    def _place(self, key: Hashable, expiry: int) -> None:
+        delta = expiry - self.current
+        span = 1
+        top = len(self._wheels) - 1
+        for level, wheel in enumerate(self._wheels):
+            if delta < span * self.slots:
+                index = (expiry // span) % self.slots
+                break
+            if level == top:
+                # Beyond the range of the wheel: parked in the slot which comes around last, then placed again
+                index = (self.current // span - 1) % self.slots
+                break
+            span *= self.slots
+        slot = wheel[index]
+        slot.add(key)
+        self._location[key] = slot
+
+    def advance(self) -> List[Hashable]:
+        """Process the ticks passed since the last call, returns the expired keys in expiry order"""
+        target = int((self.clock() - self.origin) / self.tick)
+        expired: List[Hashable] = []
+        if target - self.current > self.slots:
+            # A long pause (e.g. a suspend), re-sorting the pending timers is cheaper than ticking
+            self.current = target
+            pending = sorted(self._expiry.items(), key=lambda item: item[1])
+            for slot_set in self._location.values():
+                slot_set.clear()
+            self._location.clear()
+            for key, expiry in pending:
+                if expiry <= target:
+                    del self._expiry[key]
+                    expired.append(key)
+                else:
+                    self._place(key, expiry)
+            return expired
+
+        while self.current < target:
+            self.current += 1
+            # Move the timers of the higher levels whose slot came around one level down
+            span = self.slots
+            for level in range(1, len(self._wheels)):
+                if self.current % span:
+                    break
+                slot = self._wheels[level][(self.current // span) % self.slots]
+                keys = list(slot)
+                slot.clear()
+                for key in keys:
+                    self._place(key, self._expiry[key])
+                span *= self.slots
+
+            slot = self._wheels[0][self.current % self.slots]
+            due = [key for key in slot if self._expiry[key] <= self.current]
+            for key in due:
+                slot.discard(key)
+                del self._location[key]
+                del self._expiry[key]
+            expired.extend(due)
+        return expired
@@ -1,9 +1,12 @@
 import os
 import sys
-from typing import Optional, Tuple, Callable
+from typing import Dict, Optional, Tuple, Callable
 from appdirs import user_data_dir
 import gettext
 
+# Overrides the folder of the user data (settings, log, journal), e.g. to run against scratch data
+USER_DATA_DIR_VARIABLE = 'VALVECONTROL_DATA_DIR'
+
 def get_workdir() -> str:
     """Get the application's workdir path."""
     frozen = getattr(sys, 'frozen', False)
@@ -41,6 +44,9 @@ def get_user_data_path(app_name: str, app_author: str, filename: str, subdirecto
     if getattr(sys, 'frozen', False):
         base_path = user_data_dir(app_name, app_author, roaming=roaming)
 
+    if os.environ.get(USER_DATA_DIR_VARIABLE):
+        base_path = os.environ[USER_DATA_DIR_VARIABLE]
+
     if subdirectory:
         base_path = os.path.join(base_path, subdirectory)
 
@@ -51,25 +57,35 @@ class LocalizationManager:
     def __init__(self):
         self._current_language: str = 'en'
         self._translation: gettext.NullTranslations = gettext.NullTranslations()
+        # Loaded catalogs per language, so switching back and forth doesn't read the .mo files again
+        self._catalogs: Dict[str, gettext.NullTranslations] = {}
+
+    def _load_catalog(self, language: str) -> gettext.NullTranslations:
+        catalog = self._catalogs.get(language)
+        if catalog is None:
+            try:
+                catalog = gettext.translation(
+                    'messages',
+                    get_resource_path('locales'),
+                    languages=[language]
+                )
+            except FileNotFoundError:
+                # If the requested language is not found, fall back to English
+                catalog = gettext.NullTranslations()
+            self._catalogs[language] = catalog
+        return catalog
 
     def setup_locale(self, language: str) -> Tuple[Callable, Callable]:
-        """Setup localization for the specified language"""
+        """
+        Setup localization for the specified language.
+
+        The returned functions always translate to the current language, so
+        they don't have to be replaced after a later switch.
+        """
         self._current_language = language
-        locale_dir = get_resource_path('locales')
-
-        try:
-            self._translation = gettext.translation(
-                'messages',
-                locale_dir,
-                languages=[language]
-            )
-            self._translation.install()
-        except FileNotFoundError:
-            # If the requested language is not found, fall back to English
-            self._translation = gettext.NullTranslations()
-            gettext.install('messages')
-
-        return self._translation.gettext, self._translation.ngettext
+        self._translation = self._load_catalog(language)
+        self._translation.install()
+        return self.gettext, self.ngettext
 
     @property
     def current_language(self) -> str:
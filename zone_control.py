@@ -2,16 +2,47 @@ from tkinter import ttk, StringVar, BooleanVar, BOTH, X, filedialog
 import tkinter as tk
 import os
 from typing import Any
-from mqtt_client import MQTTClient
+from zone_controller import ZoneController
+from configuration import Zone
+from text_registry import TextRegistry, N_
+from constants import (
+    MQTT_EVENT_PUMP_INTERVAL_MS, MQTT_OUTBOX_STATUS_INTERVAL_MS, PROGRAM_STATUS_INTERVAL_MS, CONTROL_ROW_HEIGHT,
+    CONFIG_ROW_HEIGHT
+)
+
+# Bind tag shared by the Control tab canvas and its zone cells for mouse wheel scrolling
+CONTROL_GRID_TAG = 'ZoneControlGrid'
+# Bind tag shared by the Configuration tab zone list and its rows
+CONFIG_ROWS_TAG = 'ZoneConfigRows'
 
 class ZoneControlFrame(ttk.Frame):
-    def __init__(self, parent, config, _, ngettext):
+    def __init__(self, parent, config, _, ngettext, controller=None, texts=None):
         super().__init__(parent)
         self.config = config
         self._ = _
         self.ngettext = ngettext
+        # Static texts are bound here, so they follow a language switch without rebuilding
+        self.texts = texts or TextRegistry(_)
         self.active_zones = {}
-        self.mqtt_client = None
+
+        # The zone logic lives in the controller, this frame is one of its clients.
+        # The Control tab follows the zone engine's changes.
+        self.controller = controller or ZoneController(config, _, ngettext)
+        self.zone_engine = self.controller.zone_engine
+        self.zone_engine.subscribe(self.apply_zone_changes)
+        self.controller.subscribe_connection(self.update_mqtt_status)
+
+        # Events coming from the MQTT network thread are applied on the Tk thread
+        self._mqtt_pump_id = None
+        self._outbox_status_id = None
+        self._program_status_id = None
+        self._latency_revision = None
+        self._reconcile_pending_id = None
+        # Master zones as (zone index, name), offered as masters in the Configuration tab
+        self._master_options = ()
+        # Auto-off countdowns, redrawn once per tick of the controller's timer wheel
+        self._countdown_tick = None
+        self._countdowns_shown = set()
 
         # Initialize status variables first
         self.mqtt_status_var = StringVar(value="●")
@@ -25,121 +56,373 @@ class ZoneControlFrame(ttk.Frame):
         self.control_frame = ttk.Frame(self.notebook)
         self.config_frame = ttk.Frame(self.notebook)
 
-        self.notebook.add(self.control_frame, text=self._("Control"))
-        self.notebook.add(self.config_frame, text=self._("Configuration"))
+        self.notebook.add(self.control_frame)
+        self.notebook.add(self.config_frame)
+        self.texts.bind_tab(self.notebook, self.control_frame, N_("Control"))
+        self.texts.bind_tab(self.notebook, self.config_frame, N_("Configuration"))
 
         self.setup_control_panel()
+        # The Configuration tab is built the first time it is selected
+        self.config_panel_built = False
+        self.notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed)
+        self.reconcile_zones()
+        self.sync_mqtt_client(self.config.zone_config.mqtt.get('enabled', False))
+
+        self._schedule_mqtt_pump()
+        self._refresh_command_status()
+        self._refresh_program_status()
+
+    def destroy(self):
+        """Stop the MQTT event pump before the widgets are destroyed"""
+        self.zone_engine.unsubscribe(self.apply_zone_changes)
+        self.controller.unsubscribe_connection(self.update_mqtt_status)
+        if self._mqtt_pump_id is not None:
+            self.after_cancel(self._mqtt_pump_id)
+            self._mqtt_pump_id = None
+        if self._outbox_status_id is not None:
+            self.after_cancel(self._outbox_status_id)
+            self._outbox_status_id = None
+        if self._program_status_id is not None:
+            self.after_cancel(self._program_status_id)
+            self._program_status_id = None
+        if self._reconcile_pending_id is not None:
+            self.after_cancel(self._reconcile_pending_id)
+            self._reconcile_pending_id = None
+        super().destroy()
+
+    def _schedule_mqtt_pump(self):
+        self._mqtt_pump_id = self.after(MQTT_EVENT_PUMP_INTERVAL_MS, self._pump_mqtt_events)
+
+    def _pump_mqtt_events(self):
+        """Apply queued MQTT events on the Tk thread, one update per zone per drain"""
+        try:
+            self.controller.process_events()
+            if self.controller.run_timers.current != self._countdown_tick:
+                self.refresh_countdowns()
+        finally:
+            self._schedule_mqtt_pump()
+
+    def _on_tab_changed(self, event):
+        if not self.config_panel_built and self.notebook.select() == str(self.config_frame):
+            self.build_config_panel()
+
+    def build_config_panel(self):
+        """Build the Configuration tab and bring it in sync with the current state"""
         self.setup_config_panel()
+        self.config_panel_built = True
+        self.render_zones()
+        if self.controller.mqtt_connected:
+            self.update_mqtt_status(True)
+        self._latency_revision = None
+
+    def _refresh_command_status(self):
+        """Show the queued commands and the valve response times"""
+        if not self.config_panel_built:
+            self._outbox_status_id = self.after(MQTT_OUTBOX_STATUS_INTERVAL_MS, self._refresh_command_status)
+            return
+
+        outbox = self.controller.outbox
+        depth = outbox.depth
+        if depth:
+            self.mqtt_outbox_var.set(self.ngettext(
+                "{} command queued, oldest {:.0f} s",
+                "{} commands queued, oldest {:.0f} s",
+                depth
+            ).format(depth, outbox.oldest_age))
+        else:
+            self.mqtt_outbox_var.set("")
+
+        tracker = self.controller.latency_tracker
+        if tracker.revision != self._latency_revision:
+            self._latency_revision = tracker.revision
+            self.refresh_latency_table(tracker.snapshot())
+
+        self._outbox_status_id = self.after(MQTT_OUTBOX_STATUS_INTERVAL_MS, self._refresh_command_status)
+
+    def _refresh_program_status(self):
+        self.render_program_status()
+        self._program_status_id = self.after(PROGRAM_STATUS_INTERVAL_MS, self._refresh_program_status)
+
+    def render_program_status(self):
+        """Show the running programs and the next program start above the zones, nothing without programs"""
+        status = self.controller.scheduler.status()
+        parts = []
+        if status['running']:
+            parts.append(self.ngettext("Running program: {}", "Running programs: {}", len(status['running']))
+                         .format(', '.join(status['running'])))
+        if status['next_start'] is not None:
+            parts.append(self._("Next program start: {}").format(status['next_start'].strftime('%Y-%m-%d %H:%M')))
+        text = "    ".join(parts)
+
+        if text != self.program_status_var.get():
+            self.program_status_var.set(text)
+        if text and not self.program_status_shown:
+            self.program_status_label.pack(side=tk.TOP, anchor=tk.W, padx=20, pady=(10, 0), before=self.control_scrollbar)
+            self.program_status_shown = True
+        elif not text and self.program_status_shown:
+            self.program_status_label.pack_forget()
+            self.program_status_shown = False
+
+    def refresh_latency_table(self, snapshot):
+        """Show the command to state confirmation times per zone"""
+        def ms(value):
+            return '-' if value is None else f"{value:.0f}"
+
+        zones = self.config.zone_config.zones
+        rows = set(self.latency_table.get_children())
+        for zone_id, stats in snapshot.items():
+            name = zones[zone_id].name if zone_id < len(zones) else str(zone_id)
+            values = (
+                name, stats['confirmed'], ms(stats['p50']), ms(stats['p95']), ms(stats['p99']), stats['timeouts']
+            )
+            row_id = str(zone_id)
+            if row_id in rows:
+                rows.discard(row_id)
+                self.latency_table.item(row_id, values=values)
+            else:
+                self.latency_table.insert('', 'end', iid=row_id, values=values)
+        if rows:
+            self.latency_table.delete(*rows)
 
+    @property
+    def mqtt_client(self):
+        return self.controller.mqtt_client
 
     def init_mqtt(self):
         """Initialize MQTT client with current configuration"""
-        if self.mqtt_client:
-            self.mqtt_client.disconnect()
-
-        self.mqtt_client = MQTTClient(
-            self.config.zone_config.mqtt,
-            _ = self._,
-            ngettext = self.ngettext,
-            on_zone_state_change=self.handle_mqtt_state_change,
-            on_connection_change=self.update_mqtt_status
-        )
-        if self.config.zone_config.mqtt.get('enabled', False):
-            self.mqtt_client.connect()
+        self.controller.init_mqtt()
 
     def setup_control_panel(self):
-        control_frame = ttk.Frame(self.control_frame)
-        control_frame.pack(fill=BOTH, expand=True, padx=20, pady=20)
-
         style = ttk.Style()
         style.configure('Large.TButton', padding=(20, 10), font=('TkDefaultFont', 14, 'bold'))
         style.configure('ZoneName.TLabel', font=('TkDefaultFont', 16, 'bold'), padding=(0, 5))
         style.configure('MasterInfo.TLabel', font=('TkDefaultFont', 14), foreground='#666666', padding=(0, 5))
         style.configure('Status.TLabel', font=('TkDefaultFont', 32))
 
-        for i in range(2):
-            control_frame.grid_columnconfigure(i, weight=1, pad=20)
-
-        for i, zone in enumerate(self.config.zone_config.zones):
-            col = i % 2
-            row_base = (i // 2) * 2  # Each zone takes 2 rows now
-
-            # Top frame for name and status
-            top_frame = ttk.Frame(control_frame)
-            top_frame.grid(row=row_base, column=col, padx=10, pady=(10, 5))
-
-            # Name and master info
-            name_frame = ttk.Frame(top_frame)
-            name_frame.pack(side=tk.LEFT)
-
-            name_label = ttk.Label(name_frame, text=zone['name'], style='ZoneName.TLabel')
-            name_label.pack(anchor=tk.W)
-
-            master_text = ""
-            if zone['is_master']:
-                master_text = self._("Master zone")
-            elif zone['master_zone'] >= 0:
-                try:
-                    master_name = self.config.zone_config.zones[zone['master_zone']]['name']
-                    master_text = self._("Master: {}").format(master_name)
-                except IndexError:
-                    pass
-            else:
-                master_text = self._("No master zone specified")
-
-            if master_text:
-                master_label = ttk.Label(name_frame, text=master_text, style='MasterInfo.TLabel')
-                master_label.pack(anchor=tk.W)
+        # Running programs and the next program start, packed above the zones when there are programs
+        self.program_status_var = StringVar(value="")
+        self.program_status_label = ttk.Label(self.control_frame, textvariable=self.program_status_var,
+                                              style='MasterInfo.TLabel')
+        self.program_status_shown = False
+
+        # Virtualized grid: only the zones on screen get widgets, placed on a canvas
+        # which is as tall as all the zone rows together
+        self.control_canvas = tk.Canvas(
+            self.control_frame,
+            highlightthickness=0,
+            borderwidth=0,
+            background=style.lookup('TFrame', 'background') or None
+        )
+        self.control_scrollbar = ttk.Scrollbar(self.control_frame, orient=tk.VERTICAL, command=self._scroll_control_grid)
+        self.control_canvas.configure(yscrollcommand=self.control_scrollbar.set)
+        self.control_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.control_canvas.pack(fill=BOTH, expand=True, padx=20, pady=20)
+
+        self.control_canvas.bind('<Configure>', lambda e: self.render_visible_zones(relayout=True))
+        self.control_canvas.bindtags((CONTROL_GRID_TAG,) + self.control_canvas.bindtags())
+        self.bind_class(CONTROL_GRID_TAG, '<MouseWheel>', self._on_control_mousewheel)
+        self.bind_class(CONTROL_GRID_TAG, '<Button-4>', self._on_control_mousewheel)
+        self.bind_class(CONTROL_GRID_TAG, '<Button-5>', self._on_control_mousewheel)
+
+        # Measured from the first rendered zone
+        self.control_row_height = CONTROL_ROW_HEIGHT
+
+        # Rendered widgets per zone index and the zone state they were rendered from
+        self.control_rows = {}
+        self.rendered_control_rows = {}
+        # Rows scrolled out of view, reused for the zones scrolled into view
+        self.spare_control_rows = []
+
+    def _scroll_control_grid(self, *args):
+        self.control_canvas.yview(*args)
+        self.render_visible_zones()
+
+    def _on_control_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            direction = -1
+        else:
+            direction = 1
+        self.control_canvas.yview_scroll(direction, 'units')
+        self.render_visible_zones()
 
-            # Status indicator next to name
-            status_var = StringVar(value="●")
-            status_label = ttk.Label(top_frame, textvariable=status_var, foreground='gray', style='Status.TLabel')
-            status_label.pack(side=tk.LEFT, padx=20)
+    def _visible_zone_ids(self) -> range:
+        """Zones in (or just around) the visible part of the Control tab"""
+        zone_count = len(self.config.zone_config.zones)
+        height = self.control_canvas.winfo_height()
+        if height <= 1:
+            # Not mapped yet, assume the whole screen is visible
+            height = self.control_canvas.winfo_screenheight()
+
+        top = self.control_canvas.canvasy(0)
+        first_row = max(int(top // self.control_row_height) - 1, 0)
+        last_row = int((top + height) // self.control_row_height) + 1
+        return range(min(first_row * 2, zone_count), min((last_row + 1) * 2, zone_count))
+
+    def _control_cell_position(self, zone_id):
+        width = self.control_canvas.winfo_width()
+        if width <= 1:
+            width = self.control_canvas.winfo_reqwidth()
+        column_width = width / 2
+        return (zone_id % 2) * column_width + column_width / 2, (zone_id // 2) * self.control_row_height
+
+    def render_visible_zones(self, relayout=False):
+        """Reconcile the Control tab rows of the zones currently on screen"""
+        zone_count = len(self.config.zone_config.zones)
+        rows = (zone_count + 1) // 2
+        self.control_canvas.configure(
+            scrollregion=(0, 0, self.control_canvas.winfo_width(), rows * self.control_row_height),
+            yscrollincrement=max(self.control_row_height // 4, 1)
+        )
 
-            # Button frame below
-            button_frame = ttk.Frame(control_frame)
-            button_frame.grid(row=row_base + 1, column=col, padx=10, pady=(5, 10))
+        if relayout:
+            for zone_id, row in self.control_rows.items():
+                self.control_canvas.coords(row['item'], *self._control_cell_position(zone_id))
 
-            # Control button
-            button = ttk.Button(button_frame, text=self._("Turn On"), command=lambda z=i: self.toggle_zone(z), style='Large.TButton')
-            button.pack()
+        self._reconcile_rows(
+            self.control_rows, self.rendered_control_rows, self._visible_zone_ids(),
+            self._control_row_state,
+            self._create_control_row, self._update_control_row, self._destroy_control_row
+        )
 
-            self.active_zones[i] = {
-                'active': False,
+    def _control_row_state(self, zone_id) -> tuple:
+        """Everything a zone's Control tab row is rendered from"""
+        zones = self.config.zone_config.zones
+        zone = zones[zone_id]
+        master_name = None
+        if not zone.is_master and zone.master_zone >= 0:
+            try:
+                master_name = zones[zone.master_zone].name
+            except IndexError:
+                pass
+        return (zone.name, zone.enabled, zone.is_master, zone.master_zone, master_name)
+
+    def _build_control_cell(self) -> dict:
+        cell = ttk.Frame(self.control_canvas)
+
+        # Top frame for name and status
+        top_frame = ttk.Frame(cell)
+        top_frame.pack(padx=10, pady=(10, 5))
+
+        # Name and master info
+        name_frame = ttk.Frame(top_frame)
+        name_frame.pack(side=tk.LEFT)
+
+        name_label = ttk.Label(name_frame, style='ZoneName.TLabel')
+        name_label.pack(anchor=tk.W)
+        master_label = ttk.Label(name_frame, text=" ", style='MasterInfo.TLabel')
+        master_label.pack(anchor=tk.W)
+
+        # Status indicator next to name
+        status_var = StringVar(value="●")
+        status_label = ttk.Label(top_frame, textvariable=status_var, foreground='gray', style='Status.TLabel')
+        status_label.pack(side=tk.LEFT, padx=20)
+
+        # Button frame below
+        button_frame = ttk.Frame(cell)
+        button_frame.pack(padx=10, pady=(5, 10))
+
+        # Control button
+        button = ttk.Button(button_frame, text=self._("Turn On"), style='Large.TButton')
+        button.pack()
+
+        # Time left until the zone is turned off automatically
+        countdown_var = StringVar(value="")
+        countdown_label = ttk.Label(button_frame, textvariable=countdown_var, style='MasterInfo.TLabel')
+        countdown_label.pack()
+
+        # Scroll the grid with the mouse wheel over any part of the cell
+        for widget in (cell, top_frame, name_frame, name_label, master_label, status_label, button_frame, button,
+                       countdown_label):
+            widget.bindtags((CONTROL_GRID_TAG,) + widget.bindtags())
+
+        item = self.control_canvas.create_window(0, 0, window=cell, anchor='n')
+
+        if not self.control_rows and not self.spare_control_rows:
+            # The first cell is measured (with the master info shown) to lay out the rows
+            cell.update_idletasks()
+            self.control_row_height = max(cell.winfo_reqheight(), 1)
+
+        return {
+            'item': item,
+            'name_label': name_label,
+            'master_label': master_label,
+            'master_label_shown': True,
+            'button': button,
+            'zone_info': {
                 'button': button,
                 'status_var': status_var,
-                'status_label': status_label
+                'status_label': status_label,
+                'countdown_var': countdown_var
             }
+        }
+
+    def _create_control_row(self, zone_id) -> dict:
+        row = self.spare_control_rows.pop() if self.spare_control_rows else self._build_control_cell()
+
+        self.control_canvas.coords(row['item'], *self._control_cell_position(zone_id))
+        self.control_canvas.itemconfigure(row['item'], state='normal')
+        row['button'].configure(command=lambda z=zone_id: self.toggle_zone(z))
+
+        self.active_zones[zone_id] = row['zone_info']
+        self._render_zone_state(row['zone_info'], self.zone_engine.is_active(zone_id))
+        self._render_countdown(zone_id, row['zone_info'])
+        return row
+
+    def _update_control_row(self, zone_id, row, state):
+        name, enabled, is_master, master_zone, master_name = state
 
-            if not zone['enabled']:
-                button.state(['disabled'])
+        row['name_label'].configure(text=name)
+
+        master_text = ""
+        if is_master:
+            master_text = self._("Master zone")
+        elif master_zone >= 0:
+            if master_name is not None:
+                master_text = self._("Master: {}").format(master_name)
+        else:
+            master_text = self._("No master zone specified")
+
+        if master_text:
+            row['master_label'].configure(text=master_text)
+            if not row['master_label_shown']:
+                row['master_label'].pack(anchor=tk.W)
+                row['master_label_shown'] = True
+        elif row['master_label_shown']:
+            row['master_label'].pack_forget()
+            row['master_label_shown'] = False
+
+        row['button'].state(['!disabled'] if enabled else ['disabled'])
+
+    def _destroy_control_row(self, zone_id, row):
+        # Keep the widgets around for the next zone scrolled into view
+        self.control_canvas.itemconfigure(row['item'], state='hidden')
+        self.spare_control_rows.append(row)
+        self.active_zones.pop(zone_id, None)
 
     def setup_config_panel(self):
         config_frame = ttk.Frame(self.config_frame)
         config_frame.pack(fill=BOTH, expand=True)
 
-        # Add current configuration file display at the top
-        if self.config.current_zone_config_file:
-            file_frame = ttk.Frame(config_frame)
-            file_frame.pack(fill=X, pady=(0, 10))
+        # Current configuration file display at the top, shown when there is one
+        self.file_frame = ttk.Frame(config_frame)
+        self.file_frame_shown = False
 
-            file_label = ttk.Label(file_frame, text=self._("Current configuration file:"))
-            file_label.pack(anchor=tk.W)
+        file_label = self.texts.bind(ttk.Label(self.file_frame), N_("Current configuration file:"))
+        file_label.pack(anchor=tk.W)
 
-            path_label = ttk.Label(
-                file_frame,
-                text=os.path.abspath(self.config.current_zone_config_file),
-                foreground='#666666',
-                wraplength=600  # Wrap long paths
-            )
-            path_label.pack(anchor=tk.W, pady=(2, 0))
+        self.path_label = ttk.Label(
+            self.file_frame,
+            foreground='#666666',
+            wraplength=600  # Wrap long paths
+        )
+        self.path_label.pack(anchor=tk.W, pady=(2, 0))
 
         # MQTT settings - using regular Frame instead of LabelFrame
-        mqtt_frame = ttk.Frame(config_frame)
-        mqtt_frame.pack(fill=X, pady=5)
+        self.mqtt_frame = ttk.Frame(config_frame)
+        self.mqtt_frame.pack(fill=X, pady=5)
 
         # Create a frame for each row to better organize the MQTT settings
-        mqtt_grid = ttk.Frame(mqtt_frame)
+        mqtt_grid = ttk.Frame(self.mqtt_frame)
         mqtt_grid.pack(fill=X)
 
         # Configure grid columns
@@ -147,14 +430,15 @@ class ZoneControlFrame(ttk.Frame):
         mqtt_grid.columnconfigure(3, weight=1)  # Make second value column expandable
 
         # Store all MQTT widgets to control their state
-        mqtt_widgets = []
-        tls_dependent_widgets = []  # Special list for TLS-dependent widgets
+        self.mqtt_widgets = []
+        self.tls_dependent_widgets = []  # Special list for TLS-dependent widgets
+        self.mqtt_entries = {}
 
         # Add a variable to track if we're moving between MQTT fields
         self.current_mqtt_values = {}
 
         def create_mqtt_field(label: str, key: str, row: int, column: int = 0, width: int = 20):
-            ttk.Label(mqtt_grid, text=label).grid(row=row, column=column*2, sticky='e', padx=5, pady=2)
+            self.texts.bind(ttk.Label(mqtt_grid), label).grid(row=row, column=column*2, sticky='e', padx=5, pady=2)
             entry = ttk.Entry(mqtt_grid, width=width)
             entry.grid(row=row, column=column*2+1, sticky='ew', padx=5, pady=2)
 
@@ -170,45 +454,26 @@ class ZoneControlFrame(ttk.Frame):
                     self.update_mqtt_config(key, current_value)
 
             entry.bind('<FocusOut>', on_focus_out)
-            mqtt_widgets.extend([entry])
+            self.mqtt_widgets.extend([entry])
+            self.mqtt_entries[key] = entry
             return entry
 
-
-        def update_mqtt_widgets_state(enabled: bool):
-            state = ['!disabled'] if enabled else ['disabled']
-            for widget in mqtt_widgets:
-                widget.state(state)
-
-            # Update MQTT client if state changes
-            if enabled != bool(self.mqtt_client):
-                if enabled:
-                    self.init_mqtt()
-                elif self.mqtt_client:
-                    self.mqtt_client.disconnect()
-                    self.mqtt_client = None
-
-
-        def update_tls_widgets_state(enabled: bool):
-            state = ['!disabled'] if enabled else ['disabled']
-            for widget in tls_dependent_widgets:
-                widget.state(state)
-
         # Top row with MQTT Enable and TLS checkboxes
         checkbox_frame = ttk.Frame(mqtt_grid)
         checkbox_frame.grid(row=0, column=0, columnspan=4, sticky='ew', pady=5)
         checkbox_frame.columnconfigure(1, weight=1)  # Make space between checkboxes expandable
 
         # MQTT Enable checkbox at the left
-        mqtt_enable_var = BooleanVar(value=self.config.zone_config.mqtt.get('enabled', False))
+        self.mqtt_enable_var = BooleanVar(value=self.config.zone_config.mqtt.get('enabled', False))
         mqtt_enable_cb = ttk.Checkbutton(
             checkbox_frame,
-            text=self._("Use MQTT?"),
-            variable=mqtt_enable_var,
+            variable=self.mqtt_enable_var,
             command=lambda: [
-                self.update_mqtt_config('enabled', mqtt_enable_var.get()),
-                update_mqtt_widgets_state(mqtt_enable_var.get())
+                self.update_mqtt_config('enabled', self.mqtt_enable_var.get()),
+                self.update_mqtt_widgets_state(self.mqtt_enable_var.get())
             ]
         )
+        self.texts.bind(mqtt_enable_cb, N_("Use MQTT?"))
         mqtt_enable_cb.pack(side=tk.LEFT, padx=5)
 
         # Status indicator in the middle
@@ -219,7 +484,7 @@ class ZoneControlFrame(ttk.Frame):
             foreground='gray'
         )
         self.mqtt_status_label.pack(side=tk.LEFT, padx=5)
-        mqtt_widgets.append(self.mqtt_status_label)
+        self.mqtt_widgets.append(self.mqtt_status_label)
 
         # Status text
         self.mqtt_status_text_var = StringVar(value=self._("Disconnected"))
@@ -228,7 +493,16 @@ class ZoneControlFrame(ttk.Frame):
             textvariable=self.mqtt_status_text_var
         )
         self.mqtt_status_text_label.pack(side=tk.LEFT, padx=5)
-        mqtt_widgets.append(self.mqtt_status_text_label)
+        self.mqtt_widgets.append(self.mqtt_status_text_label)
+
+        # Commands waiting for the broker while reconnecting
+        self.mqtt_outbox_var = StringVar(value="")
+        self.mqtt_outbox_label = ttk.Label(
+            checkbox_frame,
+            textvariable=self.mqtt_outbox_var,
+            foreground='gray'
+        )
+        self.mqtt_outbox_label.pack(side=tk.LEFT, padx=5)
 
     # Connect button
         self.connect_button = ttk.Button(
@@ -238,30 +512,30 @@ class ZoneControlFrame(ttk.Frame):
             width=10
         )
         self.connect_button.pack(side=tk.LEFT, padx=5)
-        mqtt_widgets.append(self.connect_button)
+        self.mqtt_widgets.append(self.connect_button)
 
         # TLS setting checkbox at the right
-        tls_var = BooleanVar(value=self.config.zone_config.mqtt.get('use_tls', False))
+        self.tls_var = BooleanVar(value=self.config.zone_config.mqtt.get('use_tls', False))
         tls_cb = ttk.Checkbutton(
             checkbox_frame,
-            text=self._("Use TLS"),
-            variable=tls_var,
+            variable=self.tls_var,
             command=lambda: [
-                self.update_mqtt_config('use_tls', tls_var.get()),
-                update_tls_widgets_state(tls_var.get())
+                self.update_mqtt_config('use_tls', self.tls_var.get()),
+                self.update_tls_widgets_state(self.tls_var.get())
             ]
         )
+        self.texts.bind(tls_cb, N_("Use TLS"))
         tls_cb.pack(side=tk.RIGHT, padx=5)
-        mqtt_widgets.append(tls_cb)
+        self.mqtt_widgets.append(tls_cb)
 
         # First column of settings starting at row 1
-        create_mqtt_field(self._("Broker:"), 'broker', 1)
-        port_entry = create_mqtt_field(self._("Port:"), 'port', 2)
-        create_mqtt_field(self._("Username:"), 'username', 3)
-        create_mqtt_field(self._("Password:"), 'password', 4)
+        create_mqtt_field(N_("Broker:"), 'broker', 1)
+        port_entry = create_mqtt_field(N_("Port:"), 'port', 2)
+        create_mqtt_field(N_("Username:"), 'username', 3)
+        create_mqtt_field(N_("Password:"), 'password', 4)
 
         # Second column - CA Certificate with browse button
-        ca_cert_label = ttk.Label(mqtt_grid, text=self._("CA Certificate Path:"))
+        ca_cert_label = self.texts.bind(ttk.Label(mqtt_grid), N_("CA Certificate Path:"))
         ca_cert_label.grid(row=1, column=2, sticky='e', padx=5, pady=2)
 
         ca_cert_frame = ttk.Frame(mqtt_grid)
@@ -272,6 +546,7 @@ class ZoneControlFrame(ttk.Frame):
         ca_cert_entry.grid(row=0, column=0, sticky='ew')
         ca_cert_entry.insert(0, str(self.config.zone_config.mqtt.get('ca_cert_path', '')))
         ca_cert_entry.bind('<FocusOut>', lambda e: self.update_mqtt_config('ca_cert_path', ca_cert_entry.get()))
+        self.mqtt_entries['ca_cert_path'] = ca_cert_entry
 
         def browse_ca_cert():
             filename = filedialog.askopenfilename(
@@ -289,20 +564,20 @@ class ZoneControlFrame(ttk.Frame):
 
         browse_button = ttk.Button(
             ca_cert_frame,
-            text=self._("Browse"),
             command=browse_ca_cert,
             width=10
         )
+        self.texts.bind(browse_button, N_("Browse"))
         browse_button.grid(row=0, column=1, padx=(5, 0))
 
         # Add CA certificate widgets to both lists
-        mqtt_widgets.extend([ca_cert_label])
-        tls_dependent_widgets.extend([ca_cert_entry, browse_button])
+        self.mqtt_widgets.extend([ca_cert_label])
+        self.tls_dependent_widgets.extend([ca_cert_entry, browse_button])
 
         # Rest of second column settings
-        create_mqtt_field(self._("Client ID:"), 'client_id', 2, column=1)
-        create_mqtt_field(self._("Topic Prefix:"), 'topic_prefix', 3, column=1)
-        create_mqtt_field(self._("Status Update Interval:"), 'status_update_interval', 4, column=1)
+        create_mqtt_field(N_("Client ID:"), 'client_id', 2, column=1)
+        create_mqtt_field(N_("Topic Prefix:"), 'topic_prefix', 3, column=1)
+        interval_entry = create_mqtt_field(N_("Status Update Interval:"), 'status_update_interval', 4, column=1)
 
         # Convert port and interval entries to integers on update
         def validate_int_entry(entry, key):
@@ -319,210 +594,413 @@ class ZoneControlFrame(ttk.Frame):
         # When creating the port entry:
         self.current_mqtt_values['port'] = str(self.config.zone_config.mqtt.get('port', 0))
         port_entry.bind('<FocusOut>', lambda e: validate_int_entry(port_entry, 'port'))
+        interval_entry.bind('<FocusOut>', lambda e: validate_int_entry(interval_entry, 'status_update_interval'))
+
+        # Valve response times, filled by _refresh_command_status()
+        latency_frame = ttk.Frame(self.mqtt_frame)
+        latency_frame.pack(fill=X, pady=(5, 0))
+        self.texts.bind(ttk.Label(latency_frame), N_("Valve response times (ms):")).pack(anchor=tk.W, padx=5)
+
+        columns = {
+            'zone': N_("Zone"),
+            'confirmed': N_("Confirmed"),
+            'p50': 'p50',
+            'p95': 'p95',
+            'p99': 'p99',
+            'timeouts': N_("Timeouts"),
+        }
+        self.latency_table = ttk.Treeview(latency_frame, columns=list(columns), show='headings', height=4)
+        for key, heading in columns.items():
+            self.texts.bind_heading(self.latency_table, key, heading)
+            self.latency_table.column(key, width=160 if key == 'zone' else 70, anchor=tk.W if key == 'zone' else tk.E)
+        latency_scrollbar = ttk.Scrollbar(latency_frame, orient='vertical', command=self.latency_table.yview)
+        self.latency_table.configure(yscrollcommand=latency_scrollbar.set)
+        latency_scrollbar.pack(side=tk.RIGHT, fill='y')
+        self.latency_table.pack(fill=X, padx=5)
 
         # Set initial states
-        update_mqtt_widgets_state(mqtt_enable_var.get())
-        update_tls_widgets_state(tls_var.get())
+        self.update_mqtt_widgets_state(self.mqtt_enable_var.get())
+        self.update_tls_widgets_state(self.tls_var.get())
 
         # Add separator between MQTT and other settings
         ttk.Separator(config_frame, orient='horizontal').pack(fill=X, pady=10)
 
         # General settings
-        general_frame = ttk.LabelFrame(config_frame, text=self._("General Settings"), padding=10)
+        general_frame = self.texts.bind(ttk.LabelFrame(config_frame, padding=10), N_("General Settings"))
         general_frame.pack(fill=X, pady=5)
 
-        # Auto-open master setting
-        auto_master_var = BooleanVar(value=self.config.zone_config.general['open_master_automatically'])
-        auto_master_cb = ttk.Checkbutton(
-            general_frame,
-            text=self._("Auto-open master zone when a dependent zone is turned on"),
-            variable=auto_master_var
-        )
-        auto_master_cb.configure(command=lambda v=auto_master_var: self.update_general_config('open_master_automatically', v.get()))
-        auto_master_cb.pack(anchor=tk.W)
+        self.general_vars = {}
 
-        # Auto-close master setting
-        close_master_var = BooleanVar(value=self.config.zone_config.general.get('close_master_automatically', True))
-        close_master_cb = ttk.Checkbutton(
-            general_frame,
-            text=self._("Close master automatically when all dependent zones are off"),
-            variable=close_master_var
-        )
-        close_master_cb.configure(command=lambda v=close_master_var: self.update_general_config('close_master_automatically', v.get()))
-        close_master_cb.pack(anchor=tk.W)
+        def create_general_checkbox(label: str, field: str):
+            var = BooleanVar(value=self.config.zone_config.general.get(field, True))
+            checkbox = self.texts.bind(ttk.Checkbutton(general_frame, variable=var), label)
+            checkbox.configure(command=lambda v=var: self.update_general_config(field, v.get()))
+            checkbox.pack(anchor=tk.W)
+            self.general_vars[field] = var
 
+        # Auto-open master setting
+        create_general_checkbox(N_("Auto-open master zone when a dependent zone is turned on"), 'open_master_automatically')
+        # Auto-close master setting
+        create_general_checkbox(N_("Close master automatically when all dependent zones are off"), 'close_master_automatically')
         # Auto-close dependent zones setting
-        close_dependent_var = BooleanVar(value=self.config.zone_config.general.get('close_dependent_automatically', True))
-        close_dependent_cb = ttk.Checkbutton(
-            general_frame,
-            text=self._("Close dependent zones automatically when master is turned off"),
-            variable=close_dependent_var
-        )
-        close_dependent_cb.configure(command=lambda v=close_dependent_var: self.update_general_config('close_dependent_automatically', v.get()))
-        close_dependent_cb.pack(anchor=tk.W)
+        create_general_checkbox(N_("Close dependent zones automatically when master is turned off"), 'close_dependent_automatically')
 
         # Zone management buttons
         button_frame = ttk.Frame(config_frame)
         button_frame.pack(fill=X, pady=5)
 
-        add_button = ttk.Button(
+        self.add_button = ttk.Button(
             button_frame,
-            text=self._("Add Zone"),
             command=self.add_zone
         )
-        add_button.pack(side=tk.LEFT, padx=5)
+        self.texts.bind(self.add_button, N_("Add Zone"))
+        self.add_button.pack(side=tk.LEFT, padx=5)
 
-        remove_button = ttk.Button(
+        self.remove_button = ttk.Button(
             button_frame,
-            text=self._("Remove Last Zone"),
             command=self.remove_zone
         )
-        remove_button.pack(side=tk.LEFT, padx=5)
+        self.texts.bind(self.remove_button, N_("Remove Last Zone"))
+        self.remove_button.pack(side=tk.LEFT, padx=5)
 
-        # Update button states based on zone count
-        zone_count = len(self.config.zone_config.zones)
-        if zone_count >= 8:
-            add_button.state(['disabled'])
-        if zone_count <= 1:
-            remove_button.state(['disabled'])
-
-        # Zone settings
+        # Zone settings, virtualized like the Control tab: only the rows on screen get widgets,
+        # kept in sync by render_zones()
         zones_frame = ttk.Frame(config_frame)
         zones_frame.pack(fill=BOTH, expand=True, pady=5)
+        self.config_canvas = tk.Canvas(
+            zones_frame,
+            highlightthickness=0,
+            borderwidth=0,
+            background=ttk.Style().lookup('TFrame', 'background') or None
+        )
+        config_scrollbar = ttk.Scrollbar(zones_frame, orient=tk.VERTICAL, command=self._scroll_config_rows)
+        self.config_canvas.configure(yscrollcommand=config_scrollbar.set)
+        config_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.config_canvas.pack(fill=BOTH, expand=True)
+
+        self.config_canvas.bind('<Configure>', lambda e: self.render_visible_config_rows(relayout=True))
+        self.config_canvas.bindtags((CONFIG_ROWS_TAG,) + self.config_canvas.bindtags())
+        self.bind_class(CONFIG_ROWS_TAG, '<MouseWheel>', self._on_config_mousewheel)
+        self.bind_class(CONFIG_ROWS_TAG, '<Button-4>', self._on_config_mousewheel)
+        self.bind_class(CONFIG_ROWS_TAG, '<Button-5>', self._on_config_mousewheel)
+
+        # Measured from the first rendered row
+        self.config_row_height = CONFIG_ROW_HEIGHT
+
+        self.config_rows = {}
+        self.rendered_config_rows = {}
+        # Rows scrolled out of view, reused for the zones scrolled into view
+        self.spare_config_rows = []
+
+        self.refresh_file_info()
+
+    def update_mqtt_widgets_state(self, enabled: bool):
+        state = ['!disabled'] if enabled else ['disabled']
+        for widget in self.mqtt_widgets:
+            widget.state(state)
+        self.sync_mqtt_client(enabled)
+
+    def sync_mqtt_client(self, enabled: bool):
+        """Start or stop the MQTT client if its state changes"""
+        if enabled != bool(self.mqtt_client):
+            if enabled:
+                self.init_mqtt()
+            else:
+                self.controller.stop_mqtt()
+
+    def update_tls_widgets_state(self, enabled: bool):
+        state = ['!disabled'] if enabled else ['disabled']
+        for widget in self.tls_dependent_widgets:
+            widget.state(state)
 
-        def create_name_callback(zone_idx, var):
-            def callback(*args):
-                self.update_zone_config(zone_idx, 'name', var.get())
-                self.after(100, self.refresh_ui)
-            return callback
-
-        # Create configuration controls for each zone
-        for i, zone in enumerate(self.config.zone_config.zones):
-            zone_frame = ttk.Frame(zones_frame)
-            zone_frame.pack(fill=X, pady=5)
-
-            def create_zone_controls(idx, zone_data):
-                # Store references to widgets that need to be enabled/disabled
-                zone_widgets = {}
-
-                # Zone name entry
-                name_var = StringVar(value=zone_data['name'])
-                name_entry = ttk.Entry(zone_frame, textvariable=name_var, width=20)
-                name_entry.pack(side=tk.LEFT, padx=5)
-                name_var.trace_add('write', create_name_callback(idx, name_var))
-                zone_widgets['name_entry'] = name_entry
-
-                def on_enabled_change():
-                    is_enabled = enabled_var.get()
-
-                    # First update the enabled state
-                    self.update_zone_config(idx, 'enabled', is_enabled)
-
-                    if not is_enabled:
-                        # When disabling, reset master-related settings
-                        self.update_zone_config(idx, 'master_zone', -1)  # Set to None
-                        self.update_zone_config(idx, 'is_master', False)  # Remove master status
-                        is_master_var.set(False)  # Update checkbox state
-
-                        # If this was a master zone, need to reset any zones that were using it
-                        if zone_data['is_master']:
-                            for i, other_zone in enumerate(self.config.zone_config.zones):
-                                if other_zone['master_zone'] == idx:
-                                    self.update_zone_config(i, 'master_zone', -1)
-
-                    # Update widget states
-                    for widget in zone_widgets.values():
-                        if widget.winfo_exists():  # Check if widget still exists
-                            if is_enabled:
-                                widget.state(['!disabled'])
-                            else:
-                                widget.state(['disabled'])
-
-                    # Refresh UI to reflect all changes
-                    self.refresh_ui()
-
-                # Zone enabled checkbox
-                enabled_var = BooleanVar(value=zone_data['enabled'])
-                enabled_cb = ttk.Checkbutton(
-                    zone_frame,
-                    text=self._("Enabled"),
-                    variable=enabled_var
-                )
-                enabled_cb.configure(command=on_enabled_change)
-                enabled_cb.pack(side=tk.LEFT, padx=5)
-
-                # Master zone checkbox
-                is_master_var = BooleanVar(value=zone_data['is_master'])
-                is_master_cb = ttk.Checkbutton(
-                    zone_frame,
-                    text=self._("Is master"),
-                    variable=is_master_var
-                )
-                is_master_cb.configure(command=lambda v=is_master_var, z=idx: self.handle_master_change(z, v.get()))
-                is_master_cb.pack(side=tk.LEFT, padx=5)
-                zone_widgets['is_master_cb'] = is_master_cb
-
-                # Master zone selection (not for master zones)
-                if not zone_data['is_master']:
-                    # Create mapping of values to display names
-                    master_zones = {-1: self._("None")}
-                    master_zones.update({
-                        idx: z['name']
-                        for idx, z in enumerate(self.config.zone_config.zones)
-                        if z['is_master']
-                    })
-
-                    # Create the combo box with display names
-                    master_var = StringVar()
-                    master_combo = ttk.Combobox(
-                        zone_frame,
-                        values=list(master_zones.values()),
-                        state='readonly',
-                        width=10
-                    )
-
-                    # Set initial value using the display name
-                    # If current master_zone isn't valid anymore, reset to "None"
-                    if zone_data['master_zone'] not in master_zones:
-                        zone_data['master_zone'] = -1
-                    master_combo.set(master_zones[zone_data['master_zone']])
-
-                    # Create reverse lookup for converting display names back to values
-                    display_to_value = {name: value for value, name in master_zones.items()}
-
-                    def on_master_select(event):
-                        # Convert display name back to numerical value
-                        display_name = master_combo.get()
-                        value = display_to_value[display_name]
-                        self.update_zone_config(idx, 'master_zone', value)
-                        # Add refresh call here to update the control panel
-                        self.refresh_ui()
-
-                    master_combo.bind('<<ComboboxSelected>>', on_master_select)
-                    master_combo.pack(side=tk.RIGHT, padx=5)
-                    zone_widgets['master_combo'] = master_combo
-                    ttk.Label(zone_frame, text=self._("or select master:")).pack(side=tk.RIGHT)
-
-                    # Set initial states based on enabled status
-                    if not zone_data['enabled']:
-                        for widget in zone_widgets.values():
-                            widget.state(['disabled'])
-
-            create_zone_controls(i, zone)
+    def refresh_file_info(self):
+        """Show the current configuration file above the MQTT settings"""
+        if self.config.current_zone_config_file:
+            self.path_label.configure(text=os.path.abspath(self.config.current_zone_config_file))
+            if not self.file_frame_shown:
+                self.file_frame.pack(fill=X, pady=(0, 10), before=self.mqtt_frame)
+                self.file_frame_shown = True
+        elif self.file_frame_shown:
+            self.file_frame.pack_forget()
+            self.file_frame_shown = False
+
+    def refresh_config_fields(self):
+        """Sync the MQTT and general settings widgets with the (e.g. freshly loaded) zone config"""
+        mqtt = self.config.zone_config.mqtt
+        for key, entry in self.mqtt_entries.items():
+            value = str(mqtt.get(key, ''))
+            self.current_mqtt_values[key] = value
+            if entry.get() != value:
+                entry.delete(0, tk.END)
+                entry.insert(0, value)
+
+        self.mqtt_enable_var.set(mqtt.get('enabled', False))
+        self.tls_var.set(mqtt.get('use_tls', False))
+        self.update_mqtt_widgets_state(self.mqtt_enable_var.get())
+        self.update_tls_widgets_state(self.tls_var.get())
+
+        for field, var in self.general_vars.items():
+            var.set(self.config.zone_config.general.get(field, True))
+
+    def _scroll_config_rows(self, *args):
+        self.config_canvas.yview(*args)
+        self.render_visible_config_rows()
+
+    def _on_config_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            direction = -1
+        else:
+            direction = 1
+        self.config_canvas.yview_scroll(direction, 'units')
+        self.render_visible_config_rows()
+
+    def _visible_config_zone_ids(self) -> range:
+        """Zones in (or just around) the visible part of the Configuration tab's zone list"""
+        zone_count = len(self.config.zone_config.zones)
+        height = self.config_canvas.winfo_height()
+        if height <= 1:
+            # Not mapped yet, assume the whole screen is visible
+            height = self.config_canvas.winfo_screenheight()
+
+        top = self.config_canvas.canvasy(0)
+        first_row = max(int(top // self.config_row_height) - 1, 0)
+        last_row = int((top + height) // self.config_row_height) + 1
+        return range(min(first_row, zone_count), min(last_row + 1, zone_count))
+
+    def _place_config_row(self, zone_id, row):
+        self.config_canvas.coords(row['item'], 0, zone_id * self.config_row_height)
+        width = self.config_canvas.winfo_width()
+        if width > 1:
+            self.config_canvas.itemconfigure(row['item'], width=width)
+
+    def render_visible_config_rows(self, relayout=False):
+        """Reconcile the Configuration tab rows of the zones currently on screen"""
+        zone_count = len(self.config.zone_config.zones)
+        self.config_canvas.configure(
+            scrollregion=(0, 0, self.config_canvas.winfo_width(), zone_count * self.config_row_height),
+            yscrollincrement=max(self.config_row_height // 2, 1)
+        )
+
+        if relayout:
+            for zone_id, row in self.config_rows.items():
+                self._place_config_row(zone_id, row)
+
+        master_options = self._master_options
+        self._reconcile_rows(
+            self.config_rows, self.rendered_config_rows, self._visible_config_zone_ids(),
+            lambda zone_id: self._config_row_state(zone_id, master_options),
+            self._create_config_row, self._update_config_row, self._destroy_config_row
+        )
+
+    def _config_row_state(self, zone_id, master_options) -> tuple:
+        """Everything a zone's Configuration tab row is rendered from"""
+        zone = self.config.zone_config.zones[zone_id]
+        # Master zones have no master selection, so they don't depend on the list of masters
+        options = None if zone.is_master else master_options
+        return (zone.name, zone.enabled, zone.is_master, zone.master_zone, options, zone.max_run_minutes)
+
+    def _build_config_row(self) -> dict:
+        zone_frame = ttk.Frame(self.config_canvas)
+
+        # The zone of the row changes when it is reused, the callbacks look it up
+        row = {'zone_id': None, 'frame': zone_frame, 'display_to_value': {}}
+
+        # Zone name entry
+        name_var = StringVar()
+        name_entry = ttk.Entry(zone_frame, textvariable=name_var, width=20)
+        name_entry.pack(side=tk.LEFT, padx=5)
+        name_var.trace_add('write', lambda *args: self.handle_name_change(row['zone_id'], name_var.get()))
+
+        # Zone enabled checkbox
+        enabled_var = BooleanVar()
+        enabled_cb = ttk.Checkbutton(
+            zone_frame,
+            variable=enabled_var,
+            command=lambda: self.handle_enabled_change(row['zone_id'], enabled_var.get())
+        )
+        self.texts.bind(enabled_cb, N_("Enabled"))
+        enabled_cb.pack(side=tk.LEFT, padx=5)
+
+        # Master zone checkbox
+        is_master_var = BooleanVar()
+        is_master_cb = ttk.Checkbutton(
+            zone_frame,
+            variable=is_master_var,
+            command=lambda: self.handle_master_change(row['zone_id'], is_master_var.get())
+        )
+        self.texts.bind(is_master_cb, N_("Is master"))
+        is_master_cb.pack(side=tk.LEFT, padx=5)
+
+        # Maximum run time, empty or 0 for no limit
+        max_run_label = self.texts.bind(ttk.Label(zone_frame), N_("Auto-off (min):"))
+        max_run_label.pack(side=tk.LEFT, padx=(5, 0))
+        max_run_entry = ttk.Entry(zone_frame, width=5)
+        max_run_entry.pack(side=tk.LEFT, padx=5)
+        max_run_entry.bind('<FocusOut>', lambda e: self.handle_max_run_change(row['zone_id'], max_run_entry))
+        max_run_entry.bind('<Return>', lambda e: self.handle_max_run_change(row['zone_id'], max_run_entry))
+
+        # Master zone selection (not for master zones), packed by _update_config_row
+        master_combo = ttk.Combobox(
+            zone_frame,
+            state='readonly',
+            width=10
+        )
+
+        def on_master_select(event):
+            # Convert display name back to numerical value
+            value = row['display_to_value'][master_combo.get()]
+            self.update_zone_config(row['zone_id'], 'master_zone', value)
+            self.reconcile_zones()
+
+        master_combo.bind('<<ComboboxSelected>>', on_master_select)
+        master_label = self.texts.bind(ttk.Label(zone_frame), N_("or select master:"))
+
+        # Scroll the list with the mouse wheel over any part of the row
+        for widget in (zone_frame, name_entry, enabled_cb, is_master_cb, max_run_label, max_run_entry, master_label):
+            widget.bindtags((CONFIG_ROWS_TAG,) + widget.bindtags())
+
+        row.update({
+            'item': self.config_canvas.create_window(0, 0, window=zone_frame, anchor='nw'),
+            'name_var': name_var,
+            'enabled_var': enabled_var,
+            'is_master_var': is_master_var,
+            'master_combo': master_combo,
+            'master_label': master_label,
+            'master_selection_shown': False,
+            'max_run_entry': max_run_entry,
+            # Widgets that need to be enabled/disabled with the zone
+            'zone_widgets': (name_entry, is_master_cb, master_combo, max_run_entry)
+        })
+
+        if not self.config_rows and not self.spare_config_rows:
+            # The first row is measured to lay out the list
+            zone_frame.update_idletasks()
+            self.config_row_height = max(zone_frame.winfo_reqheight() + 10, 1)
+        return row
+
+    def _create_config_row(self, zone_id) -> dict:
+        row = self.spare_config_rows.pop() if self.spare_config_rows else self._build_config_row()
+        row['zone_id'] = zone_id
+        self._place_config_row(zone_id, row)
+        self.config_canvas.itemconfigure(row['item'], state='normal')
+        return row
+
+    def _update_config_row(self, zone_id, row, state):
+        name, enabled, is_master, master_zone, master_options, max_run_minutes = state
+
+        # Don't touch the entry while the user is typing in it, that would move the cursor
+        if row['name_var'].get() != name:
+            row['name_var'].set(name)
+        max_run_text = f"{max_run_minutes:g}" if max_run_minutes else ""
+        if row['max_run_entry'].get() != max_run_text:
+            row['max_run_entry'].delete(0, tk.END)
+            row['max_run_entry'].insert(0, max_run_text)
+        row['enabled_var'].set(enabled)
+        row['is_master_var'].set(is_master)
+
+        if is_master:
+            if row['master_selection_shown']:
+                row['master_combo'].pack_forget()
+                row['master_label'].pack_forget()
+                row['master_selection_shown'] = False
+        else:
+            # Create mapping of values to display names
+            master_zones = {-1: self._("None")}
+            master_zones.update(master_options)
+            row['display_to_value'] = {name: value for value, name in master_zones.items()}
+
+            master_combo = row['master_combo']
+            master_combo.configure(values=list(master_zones.values()))
+            master_combo.set(master_zones[master_zone])
+
+            if not row['master_selection_shown']:
+                master_combo.pack(side=tk.RIGHT, padx=5)
+                row['master_label'].pack(side=tk.RIGHT)
+                row['master_selection_shown'] = True
+
+        for widget in row['zone_widgets']:
+            widget.state(['!disabled'] if enabled else ['disabled'])
+
+    def _destroy_config_row(self, zone_id, row):
+        # Keep the widgets around for the next zone scrolled into view
+        self.config_canvas.itemconfigure(row['item'], state='hidden')
+        row['zone_id'] = None
+        self.spare_config_rows.append(row)
+
+    def handle_name_change(self, zone_id, name):
+        """Handle typing in a zone name entry"""
+        zone = self.config.zone_config.zones[zone_id]
+        if zone.name == name:
+            return
+        old_name = zone.name
+        self.update_zone_config(zone_id, 'name', name)
+
+        # Nothing but labels shows the name, the zone logic and the programs stay as they are
+        self.controller.rename_zone(zone_id, old_name)
+        if zone.is_master:
+            self._master_options = tuple(
+                (master_id, name if master_id == zone_id else master_name)
+                for master_id, master_name in self._master_options
+            )
+
+        # Coalesce keystrokes into a single rendering
+        if self._reconcile_pending_id is not None:
+            self.after_cancel(self._reconcile_pending_id)
+        self._reconcile_pending_id = self.after(100, self.render_zones)
+
+    def handle_max_run_change(self, zone_id, entry):
+        """Apply the maximum run time typed in, an invalid value is reverted"""
+        text = entry.get().strip().replace(',', '.')
+        try:
+            minutes = float(text) if text else 0
+            if minutes < 0:
+                raise ValueError(text)
+        except ValueError:
+            minutes = self.config.zone_config.zones[zone_id].max_run_minutes
+            entry.delete(0, tk.END)
+            entry.insert(0, f"{minutes:g}" if minutes else "")
+            return
+        if minutes == int(minutes):
+            minutes = int(minutes)
+        if minutes != self.config.zone_config.zones[zone_id].max_run_minutes:
+            self.config.zone_config.set_zone_field(zone_id, 'max_run_minutes', minutes)
+            # Starts or cancels the timer of the zone if it is on
+            self.controller.update_run_timer(zone_id)
+
+    def handle_enabled_change(self, zone_id, is_enabled):
+        """Handle the enabled checkbox of a zone"""
+        # First update the enabled state
+        self.update_zone_config(zone_id, 'enabled', is_enabled)
+
+        if not is_enabled:
+            was_master = self.config.zone_config.zones[zone_id].is_master
+
+            # When disabling, reset master-related settings
+            self.update_zone_config(zone_id, 'master_zone', -1)  # Set to None
+            self.config.zone_config.set_zone_field(zone_id, 'is_master', False)  # Remove master status
+
+            # If this was a master zone, need to reset any zones that were using it
+            if was_master:
+                for i, other_zone in enumerate(self.config.zone_config.zones):
+                    if other_zone.master_zone == zone_id:
+                        self.update_zone_config(i, 'master_zone', -1)
+
+        # Reconcile UI to reflect all changes
+        self.reconcile_zones()
 
     def handle_master_change(self, zone_id, is_master):
         """Handle changes to the is_master status of a zone"""
         # If zone is being un-marked as master, reset dependent zones
         if not is_master:
             for i, zone in enumerate(self.config.zone_config.zones):
-                if zone['master_zone'] == zone_id:
-                    self.config.zone_config.zones[i]['master_zone'] = -1
+                if zone.master_zone == zone_id:
+                    self.config.zone_config.set_zone_field(i, 'master_zone', -1)
 
         # Update the zone's master status
-        self.config.zone_config.zones[zone_id]['is_master'] = is_master
+        self.config.zone_config.set_zone_field(zone_id, 'is_master', is_master)
 
         # Refresh the UI
-        self.refresh_ui()
+        self.reconcile_zones()
 
     def activate_zone(self, zone_id, skip_mqtt=False):
         """
@@ -532,157 +1010,179 @@ class ZoneControlFrame(ttk.Frame):
             zone_id: ID of the zone to activate
             skip_mqtt: If True, don't publish MQTT messages
         """
-        zone_info = self.active_zones[zone_id]
-        if zone_info['active']:
-            return
-
-        zone_info['active'] = True
-        zone_info['button'].configure(text=self._("Turn Off"))
-        zone_info['status_var'].set("●")
-        zone_info['status_label'].configure(foreground='green')
-
-        if not skip_mqtt:
-            self.publish_zone_command(zone_id, True)
+        self.controller.activate_zone(zone_id, skip_mqtt)
 
     def toggle_zone(self, zone_id):
         """Toggle a zone's state and handle master zone relationships"""
-        zone_info = self.active_zones[zone_id]
-        new_state = not zone_info['active']
-
-        # Check if we need to handle master zone when turning on
-        if new_state and not self.config.zone_config.zones[zone_id]['is_master']:
-            master_zone = self.config.zone_config.zones[zone_id]['master_zone']
-            if master_zone >= 0 and self.config.zone_config.general['open_master_automatically']:
-                # Activate master zone first, with skip_mqtt=False to send command
-                self.activate_zone(master_zone)
-
-        # Now handle the actual zone
-        if new_state:
-            self.activate_zone(zone_id)
-        else:
-            self.deactivate_zone(zone_id)
+        self.controller.toggle_zone(zone_id)
 
     def deactivate_zone(self, zone_id, skip_mqtt=False):
         """
         Deactivate a zone and handle master zone relationships.
         If the zone is a master and auto-close is enabled, also deactivate all dependent zones.
         """
-        if not self.active_zones[zone_id]['active']:
-            return
-
-        zone_info = self.active_zones[zone_id]
-        zone = self.config.zone_config.zones[zone_id]
-
-        # If this is a master zone and auto-close dependent is enabled,
-        # first deactivate all dependent zones
-        if (zone['is_master'] and
-            self.config.zone_config.general.get('close_dependent_automatically', True)):
-            # Find and deactivate all dependent zones
-            for dependent_id, dependent_zone in enumerate(self.config.zone_config.zones):
-                if (dependent_zone['master_zone'] == zone_id and
-                    self.active_zones[dependent_id]['active']):
-                    # Deactivate UI state first
-                    dependent_info = self.active_zones[dependent_id]
-                    dependent_info['active'] = False
-                    dependent_info['button'].configure(text=self._("Turn On"))
-                    dependent_info['status_var'].set("●")
-                    dependent_info['status_label'].configure(foreground='gray')
-
-                    # Send MQTT command if not skipped
-                    if not skip_mqtt:
-                        self.publish_zone_command(dependent_id, False)
-
-        # Now deactivate this zone
-        zone_info['active'] = False
-        zone_info['button'].configure(text=self._("Turn On"))
-        zone_info['status_var'].set("●")
-        zone_info['status_label'].configure(foreground='gray')
-
-        if not skip_mqtt:
-            self.publish_zone_command(zone_id, False)
-
-        # Check other masters (not for dependent zone deactivation)
-        if not zone['is_master']:
-            self.check_and_deactivate_masters(zone_id, skip_mqtt)
+        self.controller.deactivate_zone(zone_id, skip_mqtt)
 
     def check_and_deactivate_masters(self, changed_zone_id, skip_mqtt=False):
         """
         Check if any master zones should be deactivated and handle their deactivation.
         """
-        if self.config.zone_config.general.get('close_master_automatically', True):
-            for master_id, master_zone in enumerate(self.config.zone_config.zones):
-                if (master_zone['is_master'] and
-                    self.active_zones[master_id]['active'] and
-                    master_id != changed_zone_id):
-                    if self.should_deactivate_master(master_id):
-                        # Deactivate the master zone's state locally
-                        zone_info = self.active_zones[master_id]
-                        zone_info['active'] = False
-                        zone_info['button'].configure(text=self._("Turn On"))
-                        zone_info['status_var'].set("●")
-                        zone_info['status_label'].configure(foreground='gray')
-
-                        if not skip_mqtt:
-                            self.publish_zone_command(master_id, False)
+        self.zone_engine.close_idle_masters(changed_zone_id, publish=not skip_mqtt)
 
     def check_master_dependencies(self, master_id):
         """Check if any dependent zones are still active for a given master zone"""
-        current_active_zones = []
-        for i, zone in enumerate(self.config.zone_config.zones):
-            if zone['master_zone'] == master_id and self.active_zones[i]['active']:
-                current_active_zones.append(zone)
-
-        if len(current_active_zones) > 0:
-            return True
-        else:
-            return False
+        return self.zone_engine.has_active_dependents(master_id)
 
     def should_deactivate_master(self, master_id):
         """Check if a master should be deactivated"""
         # Check if any zones (including other masters) that depend on this master are active
-        return not any(
-            zone['master_zone'] == master_id and self.active_zones[i]['active']
-            for i, zone in enumerate(self.config.zone_config.zones)
-        )
+        return not self.zone_engine.has_active_dependents(master_id)
+
+    def apply_zone_changes(self, changes):
+        """Update the Control tab for the zones changed by the zone engine"""
+        for zone_id, active in changes:
+            zone_info = self.active_zones.get(zone_id)
+            if zone_info:
+                self._render_zone_state(zone_info, active)
+                # The controller (subscribed first) already started or cancelled the auto-off timer
+                self._render_countdown(zone_id, zone_info)
+                if zone_id in self.controller.run_timers:
+                    self._countdowns_shown.add(zone_id)
+
+    def _render_zone_state(self, zone_info, active):
+        zone_info['button'].configure(text=self._("Turn Off") if active else self._("Turn On"))
+        zone_info['status_var'].set("●")
+        zone_info['status_label'].configure(foreground='green' if active else 'gray')
+
+    def refresh_countdowns(self):
+        """Show the time left of the zones with an auto-off timer running, only the rendered ones"""
+        run_timers = self.controller.run_timers
+        self._countdown_tick = run_timers.current
+        shown = set()
+        for zone_id in run_timers.keys():
+            zone_info = self.active_zones.get(zone_id)
+            if zone_info:
+                self._render_countdown(zone_id, zone_info)
+                shown.add(zone_id)
+        # Timers which ended or were cancelled since
+        for zone_id in self._countdowns_shown - shown:
+            zone_info = self.active_zones.get(zone_id)
+            if zone_info:
+                zone_info['countdown_var'].set("")
+        self._countdowns_shown = shown
+
+    def _render_countdown(self, zone_id, zone_info):
+        left = self.controller.run_time_left(zone_id)
+        if left is None:
+            zone_info['countdown_var'].set("")
+            return
+        minutes, seconds = divmod(int(left + 0.5), 60)
+        hours, minutes = divmod(minutes, 60)
+        text = f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+        zone_info['countdown_var'].set(self._("Turns off in {}").format(text))
 
     def refresh_ui(self):
-        # Clear existing widgets
-        for widget in self.control_frame.winfo_children():
-            widget.destroy()
-        for widget in self.config_frame.winfo_children():
-            widget.destroy()
+        """Bring every widget in sync with the configuration, e.g. after loading a zone config file"""
+        if self.config_panel_built:
+            self.refresh_file_info()
+            self.refresh_config_fields()
+        else:
+            self.sync_mqtt_client(self.config.zone_config.mqtt.get('enabled', False))
+        self.reconcile_zones()
+
+    def retranslate(self):
+        """Show every text in the current language, the widgets, the zones and the connection stay as they are"""
+        self.texts.refresh()
+
+        # Rendered texts depend on the zone state, render them again
+        for zone_id, zone_info in self.active_zones.items():
+            self._render_zone_state(zone_info, self.zone_engine.is_active(zone_id))
+        self.rendered_control_rows.clear()
+        self.render_program_status()
+        if self.config_panel_built:
+            self.rendered_config_rows.clear()
+            connected = self.controller.mqtt_connected
+            self.mqtt_status_text_var.set(self._("Connected") if connected else self._("Disconnected"))
+            self.connect_button.configure(text=self._("Disconnect") if connected else self._("Connect"))
+        self.render_zones()
+
+    def reconcile_zones(self):
+        """
+        Bring the zone logic and the rendered rows in sync with the zone config.
 
-        # Recreate panels
-        self.setup_control_panel()
-        self.setup_config_panel()
+        For the changes the zone logic depends on: zones added or removed,
+        masters or enabled states changed, another zone config loaded. A
+        rename only needs render_zones().
+        """
+        zones = self.config.zone_config.zones
+        self._master_options = tuple((i, zone.name) for i, zone in enumerate(zones) if zone.is_master)
+        master_ids = {i for i, _ in self._master_options}
+
+        # If the selected master isn't a master anymore, reset it to "None"
+        for zone_id, zone in enumerate(zones):
+            if not zone.is_master and zone.master_zone not in master_ids:
+                self.config.zone_config.set_zone_field(zone_id, 'master_zone', -1)
+
+        # Master/dependent relations may have changed
+        self.controller.rebuild()
+        self.render_zones()
+
+    def render_zones(self):
+        """
+        Reconcile the rendered zone rows with the zone config.
+
+        Only the zones on screen have rows on either tab. Rows are keyed by
+        zone index and only the ones whose rendered state differs from the
+        configuration are created, updated or destroyed, so the widget work
+        is proportional to the number of changed zones on screen.
+        """
+        if self._reconcile_pending_id is not None:
+            self.after_cancel(self._reconcile_pending_id)
+            self._reconcile_pending_id = None
+
+        self.render_visible_zones()
+        if not self.config_panel_built:
+            return
+
+        self.render_visible_config_rows()
+
+        # Update button states based on zone count
+        self.remove_button.state(['disabled'] if len(self.config.zone_config.zones) <= 1 else ['!disabled'])
+
+    @staticmethod
+    def _reconcile_rows(rows, rendered, zone_ids, get_state, create, update, destroy):
+        for zone_id in zone_ids:
+            state = get_state(zone_id)
+            if zone_id not in rows:
+                rows[zone_id] = create(zone_id)
+            elif rendered.get(zone_id) == state:
+                continue
+            update(zone_id, rows[zone_id], state)
+            rendered[zone_id] = state
+
+        for zone_id in [zone_id for zone_id in rows if zone_id not in zone_ids]:
+            destroy(zone_id, rows.pop(zone_id))
+            rendered.pop(zone_id, None)
 
     def update_zone_config(self, zone_id, field, value):
-        self.config.zone_config.zones[zone_id][field] = value
+        self.config.zone_config.set_zone_field(zone_id, field, value)
         # If changing is_master status, update UI to reflect changes
         if field == 'is_master':
-            self.refresh_ui()
+            self.reconcile_zones()
 
     def update_general_config(self, field, value):
-        self.config.zone_config.general[field] = value
+        self.config.zone_config.set_general(field, value)
 
     def add_zone(self):
         """Add a new zone to the configuration"""
-        if len(self.config.zone_config.zones) >= 8:
-            return
-
         # Create new zone with default values and next available index as part of name
-        new_zone = {
-            'name': f"Zone {len(self.config.zone_config.zones)}",
-            'enabled': True,
-            'master_zone': -1,
-            'is_master': False
-        }
+        new_zone = Zone(f"Zone {len(self.config.zone_config.zones)}")
 
         # Add to configuration
-        self.config.zone_config.zones.append(new_zone)
+        self.config.zone_config.add_zone(new_zone)
 
-        # Refresh UI
-        self.refresh_ui()
+        # Render the new zone
+        self.reconcile_zones()
 
     def remove_zone(self):
         """Remove the last zone from the configuration"""
@@ -691,18 +1191,17 @@ class ZoneControlFrame(ttk.Frame):
 
         last_zone = self.config.zone_config.zones[-1]
         # If this was a master zone, reset any zones that were using it
-        if last_zone['is_master']:
+        if last_zone.is_master:
             last_idx = len(self.config.zone_config.zones) - 1
-            for zone in self.config.zone_config.zones[:-1]:  # Exclude the zone being removed
-                if zone['master_zone'] == last_idx:
-                    zone['master_zone'] = -1
+            for zone_id, zone in enumerate(self.config.zone_config.zones[:-1]):  # Exclude the zone being removed
+                if zone.master_zone == last_idx:
+                    self.config.zone_config.set_zone_field(zone_id, 'master_zone', -1)
 
         # Remove the zone
-        self.config.zone_config.zones.pop()
-
-        # Refresh UI
-        self.refresh_ui()
+        self.config.zone_config.remove_last_zone()
 
+        # Drop the widgets of the removed zone
+        self.reconcile_zones()
 
     def handle_mqtt_connect(self):
         """Handle MQTT connect button click"""
@@ -710,6 +1209,8 @@ class ZoneControlFrame(ttk.Frame):
 
     def update_mqtt_status(self, connected: bool):
         """Update MQTT status indicators"""
+        if not self.config_panel_built:
+            return
         if connected:
             self.mqtt_status_var.set("●")
             self.mqtt_status_label.configure(foreground='green')
@@ -726,55 +1227,20 @@ class ZoneControlFrame(ttk.Frame):
     def handle_mqtt_disconnect(self):
         """Handle MQTT disconnect button click"""
         if self.mqtt_client:
-            self.mqtt_client.disconnect()
-            self.update_mqtt_status(False)
+            self.controller.disconnect_mqtt()
+            self.controller.set_connection_state(False)
 
     def update_mqtt_config(self, field: str, value: Any):
         """Update MQTT configuration field"""
-        self.config.zone_config.mqtt[field] = value
+        changed = self.config.zone_config.set_mqtt(field, value)
         # Disconnect if we're changing configuration
-        if self.mqtt_client and self.mqtt_client.connected:
-            self.mqtt_client.disconnect()
+        if changed and self.mqtt_client and self.mqtt_client.connected:
+            self.controller.disconnect_mqtt()
 
     def handle_mqtt_state_change(self, zone_id: int, is_on: bool):
         """Handle zone state changes from MQTT"""
-        if zone_id not in self.active_zones:
-            return
-
-        if is_on:
-            # If turning on a dependent zone, check if we need to activate its master
-            if not self.config.zone_config.zones[zone_id]['is_master']:
-                master_zone = self.config.zone_config.zones[zone_id]['master_zone']
-                if master_zone >= 0 and self.config.zone_config.general['open_master_automatically']:
-                    if not self.active_zones[master_zone]['active']:
-                        self.activate_zone(master_zone, skip_mqtt=True)
-                        self.publish_zone_command(master_zone, True)
-
-            # Now activate the zone itself
-            self.activate_zone(zone_id, skip_mqtt=True)
-        else:
-            zone = self.config.zone_config.zones[zone_id]
-
-            # If this is a master zone being turned off and auto-close dependent is enabled,
-            # deactivate all dependent zones first
-            if (zone['is_master'] and
-                self.config.zone_config.general.get('close_dependent_automatically', True)):
-                # First collect all dependent zones that need to be deactivated
-                dependent_zones = [
-                    (dependent_id, dependent_zone)
-                    for dependent_id, dependent_zone in enumerate(self.config.zone_config.zones)
-                    if dependent_zone['master_zone'] == zone_id and self.active_zones[dependent_id]['active']
-                ]
-
-                # Deactivate each dependent zone and send command
-                for dependent_id, _ in dependent_zones:
-                    self.deactivate_zone(dependent_id, skip_mqtt=True)
-                    self.publish_zone_command(dependent_id, False)
-
-            # Now deactivate the master zone itself, but don't send an MQTT command since we received this state from MQTT
-            self.deactivate_zone(zone_id, skip_mqtt=True)
+        self.controller.handle_mqtt_state_change(zone_id, is_on)
 
     def publish_zone_command(self, zone_id: int, state: bool):
         """Publish zone command to MQTT if enabled"""
-        if self.mqtt_client and self.mqtt_client.connected:
-            self.mqtt_client.publish_zone_command(zone_id, state)
\ No newline at end of file
+        self.controller.publish_zone_command(zone_id, state)
\ No newline at end of file
@@ -0,0 +1,398 @@
+import logging
+import os
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Set
+from event_queue import CoalescingEventQueue
+from command_outbox import CommandOutbox
+from command_pipeline import CommandPipeline
+from zone_latency import ZoneLatencyTracker
+from metrics import Metrics, MetricsServer
+from scheduler import IrrigationScheduler
+from timer_wheel import TimerWheel
+from state_journal import StateJournal
+from constants import (
+    MQTT_OUTBOX_MAX_SIZE, MQTT_OUTBOX_MAX_AGE, MQTT_COMMAND_RELEASE_DELAY, MQTT_STATE_CONFIRM_TIMEOUT,
+    MQTT_BOOTSTRAP_SETTLE, MQTT_BOOTSTRAP_MAX_WINDOW
+)
+from zone_engine import ZoneStateEngine, iter_bits
+
+# Keys used in the inbound MQTT event queue
+EVENT_ZONE_STATE = 'zone_state'
+EVENT_CONNECTION = 'connection'
+EVENT_COMMAND_ACK = 'command_ack'
+
+class ZoneController:
+    """
+    GUI independent controller core: zone states, master rules and the MQTT connection.
+
+    MQTT callbacks arrive on the network thread and are only queued there, the
+    host (the Tk event loop or the headless service loop) applies them by
+    calling process_events() from a single thread.
+
+    Right after connecting the broker sends the retained states of the zones.
+    These and the first reports are gathered in a bootstrap phase and applied
+    as one snapshot, without the master rules of the incremental updates, so a
+    half-received state can't open or close a master.
+    """
+
+    def __init__(self, config, _, ngettext):
+        self.config = config
+        self._ = _
+        self.ngettext = ngettext
+        self.logger = logging.getLogger(__name__)
+
+        self.mqtt_client = None
+        self.mqtt_connected = False
+        self._connection_listeners: List[Callable[[bool], None]] = []
+        # Commands waiting for the broker, kept when the client is re-created
+        self.outbox = CommandOutbox(MQTT_OUTBOX_MAX_SIZE, MQTT_OUTBOX_MAX_AGE)
+        # Sends the commands in dependency order and tracks their acknowledgments
+        self.pipeline = CommandPipeline(self._send_zone_command, MQTT_COMMAND_RELEASE_DELAY, _)
+        # Valve response times, kept when the client is re-created
+        self.latency_tracker = ZoneLatencyTracker(MQTT_STATE_CONFIRM_TIMEOUT, _)
+        # Counters and gauges for the metrics endpoint, kept when the client is re-created
+        self.metrics = Metrics()
+        self.metrics.describe('mqtt_connected', 'gauge', "1 while connected to the broker")
+        self.metrics.describe('zone_active', 'gauge', "1 if the zone is on")
+        self.metrics_server: Optional[MetricsServer] = None
+
+        # Events coming from the MQTT network thread
+        self.events = CoalescingEventQueue()
+        # States gathered since connecting, None once they were applied
+        self._bootstrap: Optional[Dict[int, bool]] = None
+        self._bootstrap_started = 0.0
+        self._bootstrap_deadline = 0.0
+        # Zones commanded during the bootstrap, their reported state is already outdated
+        self._bootstrap_commanded: Set[int] = set()
+        # State messages of a persistent session, acknowledged once their state is applied (and journaled)
+        self._unacked: List = []
+
+        # Zone states and master rules
+        self.zone_engine = ZoneStateEngine(on_command=self.publish_zone_command)
+        self.zone_engine.subscribe(self._update_zone_metrics)
+        # Auto-off timers of the zones with a maximum run time, one wheel for all of them
+        self.run_timers = TimerWheel()
+        self.zone_engine.subscribe(self._update_run_timers)
+        # Programs of the zone config, switching zones the same way as manual control
+        self.scheduler = IrrigationScheduler(self.turn_on_zone, self.deactivate_zone, _)
+        # Records every zone transition once attach_journal() was called
+        self.journal: Optional[StateJournal] = None
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """Pick up changes of the zone config (zones added, removed, masters changed)"""
+        self.zone_engine.rebuild(self.config.zone_config)
+        zone_count = len(self.config.zone_config.zones)
+        if self.mqtt_client and self.mqtt_client.zone_count != zone_count:
+            self.mqtt_client.set_zone_count(zone_count)
+        self.scheduler.rebuild(self.config.zone_config)
+        if self.journal is not None and (self.journal.key, self.journal.zone_count) != (self.journal_key(), zone_count):
+            # Another zone config, its states are recorded from a new snapshot
+            self.journal.compact(self.journal_key(), zone_count, self.zone_engine.active)
+
+        # Maximum run times may have been changed or removed
+        zones = self.config.zone_config.zones
+        for zone_id in list(self.run_timers.keys()):
+            if zone_id >= zone_count or not zones[zone_id].max_run_minutes:
+                self.run_timers.cancel(zone_id)
+        for zone_id in iter_bits(self.zone_engine.active):
+            if zone_id not in self.run_timers and zones[zone_id].max_run_minutes:
+                self.run_timers.schedule(zone_id, zones[zone_id].max_run_minutes * 60)
+
+        # Zones may have been added, removed or renamed
+        zones = self.config.zone_config.zones
+        self.metrics.replace('zone_active', {
+            (('name', zone.name), ('zone', str(zone_id))): int(self.zone_engine.is_active(zone_id))
+            for zone_id, zone in enumerate(zones)
+        })
+
+    def rename_zone(self, zone_id: int, old_name: str) -> None:
+        """Pick up the new name of a zone, only its metric is labelled with the name"""
+        self.metrics.remove('zone_active', name=old_name, zone=str(zone_id))
+        self.metrics.set('zone_active', int(self.zone_engine.is_active(zone_id)),
+                         name=self.config.zone_config.zones[zone_id].name, zone=str(zone_id))
+
+    def update_run_timer(self, zone_id: int) -> None:
+        """Start or cancel the auto-off timer of a zone whose maximum run time changed, like rebuild() does"""
+        minutes = self.config.zone_config.zones[zone_id].max_run_minutes
+        if not minutes:
+            self.run_timers.cancel(zone_id)
+        elif zone_id not in self.run_timers and self.zone_engine.is_active(zone_id):
+            self.run_timers.schedule(zone_id, minutes * 60)
+
+    def _update_zone_metrics(self, changes) -> None:
+        zones = self.config.zone_config.zones
+        for zone_id, active in changes:
+            if zone_id < len(zones):
+                self.metrics.set('zone_active', int(active), name=zones[zone_id].name, zone=str(zone_id))
+
+    def _update_run_timers(self, changes) -> None:
+        zones = self.config.zone_config.zones
+        for zone_id, active in changes:
+            if not active:
+                self.run_timers.cancel(zone_id)
+            elif zone_id < len(zones) and zones[zone_id].max_run_minutes:
+                self.run_timers.schedule(zone_id, zones[zone_id].max_run_minutes * 60)
+
+    def run_time_left(self, zone_id: int) -> Optional[float]:
+        """Seconds until the zone is turned off automatically, None if it has no timer running"""
+        return self.run_timers.remaining(zone_id)
+
+    def journal_key(self) -> str:
+        """Short identifier of the zone config file, a journal only applies to the config it was written for"""
+        path = self.config.current_zone_config_file or ''
+        return format(zlib.crc32(os.path.abspath(path).encode('utf-8') if path else b''), '08x')
+
+    def attach_journal(self, journal: StateJournal) -> int:
+        """
+        Restore the zone states recorded by journal and keep recording them, returns the restored bitset.
+
+        The states are restored without sending any command, the valves are
+        only switched by new commands. They count as the last known state
+        until the broker reports the actual one.
+        """
+        restored = 0
+        zone_count = self.zone_engine.zone_count
+        recorded = journal.load()
+        if recorded is not None:
+            key, recorded_count, active = recorded
+            if (key, recorded_count) == (self.journal_key(), zone_count):
+                restored = active
+                self.zone_engine.restore(active)
+                if active:
+                    self.logger.info(self._("Restored the state of %s zones"), bin(active).count('1'))
+            else:
+                self.logger.info(self._("The zone state journal belongs to another zone config, not restored"))
+
+        # A fresh snapshot, so the journal stays short after every start
+        journal.open(self.journal_key(), zone_count, self.zone_engine.active)
+        self.zone_engine.subscribe(journal.record)
+        self.journal = journal
+        return restored
+
+    def close_journal(self) -> None:
+        if self.journal is not None:
+            self.zone_engine.unsubscribe(self.journal.record)
+            self.journal.close()
+            self.journal = None
+
+    def start_metrics_server(self, host: str, port: int) -> Optional[MetricsServer]:
+        """Serve the metrics in Prometheus text format on http://host:port/metrics, None if it can't listen"""
+        if self.metrics_server is None:
+            server = MetricsServer(self.metrics, host, port)
+            try:
+                server.start()
+            except OSError as e:
+                self.logger.error(self._("Could not start the metrics endpoint: %s"), e)
+                return None
+            self.metrics_server = server
+        return self.metrics_server
+
+    def stop_metrics_server(self) -> None:
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    def subscribe_connection(self, listener: Callable[[bool], None]) -> None:
+        """Register a callable receiving MQTT connection changes (on the processing thread)"""
+        self._connection_listeners.append(listener)
+
+    def unsubscribe_connection(self, listener: Callable[[bool], None]) -> None:
+        if listener in self._connection_listeners:
+            self._connection_listeners.remove(listener)
+
+    def init_mqtt(self) -> None:
+        """Initialize MQTT client with current configuration"""
+        # The held commands are sent by the new client, once connected
+        self.pipeline.reset()
+        self._unacked = []
+        if self.mqtt_client:
+            self.mqtt_client.disconnect()
+        self.pipeline.release_delay = self.config.zone_config.mqtt.get(
+            'command_release_delay', MQTT_COMMAND_RELEASE_DELAY
+        )
+
+        # Imported here, so paho and ssl are only loaded once MQTT is actually used
+        if self.config.zone_config.mqtt.get('transport', 'threaded') == 'asyncio':
+            from mqtt_async import AsyncMQTTClient as client_class
+        else:
+            from mqtt_client import MQTTClient as client_class
+
+        self.mqtt_client = client_class(
+            self.config.zone_config.mqtt,
+            _ = self._,
+            ngettext = self.ngettext,
+            zone_count = len(self.config.zone_config.zones),
+            on_zone_state_change=self.enqueue_mqtt_state_change,
+            on_connection_change=self.enqueue_mqtt_status,
+            outbox=self.outbox,
+            on_command_ack=self.enqueue_command_ack,
+            # The outbox is flushed through the pipeline, see set_connection_state()
+            flush_outbox=False,
+            latency_tracker=self.latency_tracker,
+            metrics=self.metrics
+        )
+        if self.config.zone_config.mqtt.get('enabled', False):
+            self.mqtt_client.connect()
+
+    def stop_mqtt(self) -> None:
+        """Disconnect and drop the MQTT client and the commands waiting for it"""
+        if self.mqtt_client:
+            self.mqtt_client.disconnect()
+            self.mqtt_client = None
+        self.outbox.clear()
+        self.pipeline.clear()
+
+    def disconnect_mqtt(self) -> None:
+        """Disconnect the MQTT client, but keep it for reconnecting"""
+        if self.mqtt_client:
+            self.mqtt_client.disconnect()
+
+    def enqueue_mqtt_state_change(self, zone_id: int, is_on: bool) -> None:
+        """Called from the MQTT network thread"""
+        self.events.put((EVENT_ZONE_STATE, zone_id), is_on)
+
+    def enqueue_mqtt_status(self, connected: bool) -> None:
+        """Called from the MQTT network thread"""
+        self.events.put((EVENT_CONNECTION, None), connected)
+
+    def enqueue_command_ack(self, mid: int, acked_at: float) -> None:
+        """Called from the MQTT network thread"""
+        self.events.put((EVENT_COMMAND_ACK, mid), acked_at)
+
+    def wait_for_events(self, timeout: Optional[float] = None) -> bool:
+        """Block until there are queued events, a held command or a program change is due or the timeout expires"""
+        bootstrap_deadline = None
+        if self._bootstrap is not None:
+            bootstrap_deadline = max(self._bootstrap_deadline - time.monotonic(), 0.0)
+        for deadline in (self.pipeline.next_release(), self.scheduler.next_deadline(), self.run_timers.next_tick(),
+                         bootstrap_deadline):
+            if deadline is not None and (timeout is None or deadline < timeout):
+                timeout = deadline
+        return self.events.wait(timeout)
+
+    def process_events(self) -> None:
+        """Apply the queued MQTT events, one update per zone"""
+        # Taken before draining, so every state taken here is applied below
+        if self.mqtt_client and self.mqtt_client.persistent_session:
+            self._unacked.extend(self.mqtt_client.take_received())
+        for (kind, key), value in self.events.drain():
+            if kind == EVENT_ZONE_STATE:
+                if self._bootstrap is not None:
+                    self._gather_bootstrap_state(key, value)
+                else:
+                    self.handle_mqtt_state_change(key, value)
+            elif kind == EVENT_COMMAND_ACK:
+                self.pipeline.acknowledge(key, value)
+            elif kind == EVENT_CONNECTION:
+                self.set_connection_state(value)
+        if self._bootstrap is not None and time.monotonic() >= self._bootstrap_deadline:
+            self._finish_bootstrap()
+        if self._unacked and self._bootstrap is None:
+            unacked, self._unacked = self._unacked, []
+            if self.mqtt_client:
+                self.mqtt_client.ack(unacked)
+        self.pipeline.poll()
+        self.latency_tracker.expire()
+        self.scheduler.poll()
+        for zone_id in self.run_timers.advance():
+            # Through the master rules, like turning it off by hand
+            self.logger.info(self._("Zone %s reached its maximum run time, turning it off"), zone_id)
+            self.deactivate_zone(zone_id)
+
+    def set_connection_state(self, connected: bool) -> None:
+        self.mqtt_connected = connected
+        self.metrics.set('mqtt_connected', int(connected))
+        if connected:
+            # The outbox is flushed once the broker's states are applied
+            self._bootstrap = {}
+            self._bootstrap_commanded = set()
+            self._bootstrap_started = time.monotonic()
+            self._bootstrap_deadline = self._bootstrap_started + MQTT_BOOTSTRAP_SETTLE
+        else:
+            self._bootstrap = None
+            # The broker delivers the unacknowledged state messages again
+            self._unacked = []
+            # Unacknowledged commands are lost with the connection
+            self.pipeline.reset()
+        for listener in list(self._connection_listeners):
+            listener(connected)
+
+    @property
+    def bootstrapping(self) -> bool:
+        """True while the states sent by the broker after connecting are gathered"""
+        return self._bootstrap is not None
+
+    def _gather_bootstrap_state(self, zone_id: int, is_on: bool) -> None:
+        self._bootstrap[zone_id] = is_on
+        # Wait until the broker is quiet for a moment, but not forever
+        self._bootstrap_deadline = min(time.monotonic() + MQTT_BOOTSTRAP_SETTLE,
+                                       self._bootstrap_started + MQTT_BOOTSTRAP_MAX_WINDOW)
+
+    def _finish_bootstrap(self) -> None:
+        """Apply the gathered states as one snapshot, then send the commands queued while offline"""
+        states, self._bootstrap = self._bootstrap, None
+        commands = self.outbox.take()
+        # A command sent or queued since then decides the zone's state, not its last report
+        commanded = self._bootstrap_commanded | {zone_id for zone_id, _ in commands}
+        known = active = 0
+        for zone_id, is_on in states.items():
+            if zone_id not in commanded:
+                known |= 1 << zone_id
+                if is_on:
+                    active |= 1 << zone_id
+        self.zone_engine.restore(active, known)
+        if states:
+            self.logger.info(self._("Applied %s zone states reported by the broker"), len(states))
+        self._flush_commands(commands)
+        # After the queued commands, which are newer than the held ones of their zones
+        self.pipeline.resume()
+
+    def activate_zone(self, zone_id: int, skip_mqtt: bool = False) -> None:
+        self.zone_engine.activate(zone_id, publish=not skip_mqtt)
+
+    def deactivate_zone(self, zone_id: int, skip_mqtt: bool = False) -> None:
+        self.zone_engine.deactivate(zone_id, publish=not skip_mqtt)
+
+    def toggle_zone(self, zone_id: int) -> None:
+        self.zone_engine.toggle(zone_id)
+
+    def turn_on_zone(self, zone_id: int) -> None:
+        """Turn a zone on like its Turn On button, opening its master"""
+        if not self.zone_engine.is_active(zone_id):
+            self.zone_engine.toggle(zone_id)
+
+    def handle_mqtt_state_change(self, zone_id: int, is_on: bool) -> None:
+        """Handle zone state changes from MQTT"""
+        self.zone_engine.apply_remote_state(zone_id, is_on)
+
+    def publish_zone_command(self, zone_id: int, state: bool) -> None:
+        """Publish zone command to MQTT if enabled, a dependent zone opens after its master"""
+        if not self.mqtt_client:
+            return
+        if self._bootstrap is not None:
+            self._bootstrap_commanded.add(zone_id)
+        depends_on = None
+        if state and zone_id < self.zone_engine.zone_count and self.zone_engine.master_index[zone_id] >= 0:
+            depends_on = self.zone_engine.master_index[zone_id]
+        self.pipeline.submit(zone_id, state, depends_on=depends_on)
+
+    def flush_outbox(self) -> None:
+        """Send the commands queued while disconnected, in order, through the pipeline"""
+        self._flush_commands(self.outbox.take())
+
+    def _flush_commands(self, commands) -> None:
+        if commands:
+            self.logger.info(self._("Sending %s queued zone commands"), len(commands))
+        for zone_id, state in commands:
+            self.publish_zone_command(zone_id, state)
+
+    def _send_zone_command(self, zone_id: int, state: bool) -> Optional[int]:
+        if self.mqtt_client:
+            return self.mqtt_client.publish_zone_command(zone_id, state)
+        return None
+
+    def command_stats(self) -> Dict[str, Any]:
+        """Statistics of the offline queue and the command acknowledgments"""
+        return {**self.outbox.stats(), **self.pipeline.stats()}
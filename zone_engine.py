@@ -0,0 +1,234 @@
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# (zone_id, active) pairs, in the order the zones changed
+ZoneChanges = List[Tuple[int, bool]]
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Yield the indexes of the set bits of mask, lowest first"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+class ZoneStateEngine:
+    """
+    Zone state and master/dependent rules, independent of any widgets.
+
+    Active zones are stored as an integer bitset. The master of each zone and
+    the dependents of each master are precomputed by rebuild(), which has to be
+    called whenever the zone config changes, so toggles, cascading closes and
+    the "any dependent still active?" checks are only a few bit operations.
+
+    Every operation notifies the subscribers once with the set of zones it
+    changed, commands for the valves are passed to on_command in send order.
+    """
+
+    def __init__(self, zone_config=None, on_command: Optional[Callable[[int, bool], None]] = None):
+        self.on_command = on_command
+        self.active = 0
+        self.zone_count = 0
+        self.masters_mask = 0
+        self.master_index: List[int] = []
+        self.dependents_mask: List[int] = []
+        self.general: Dict = {}
+
+        self._listeners: List[Callable[[ZoneChanges], None]] = []
+        self._pending: Dict[int, bool] = {}
+        self._batch_depth = 0
+
+        if zone_config is not None:
+            self.rebuild(zone_config)
+
+    def rebuild(self, zone_config) -> None:
+        """Precompute the master/dependent relations of zone_config"""
+        zones = zone_config.zones
+        zone_count = len(zones)
+        master_index = [-1] * zone_count
+        dependents_mask = [0] * zone_count
+        masters_mask = 0
+
+        for zone_id, zone in enumerate(zones):
+            if zone.is_master:
+                masters_mask |= 1 << zone_id
+            master_id = zone.master_zone
+            if 0 <= master_id < zone_count:
+                master_index[zone_id] = master_id
+                dependents_mask[master_id] |= 1 << zone_id
+
+        self.zone_count = zone_count
+        self.master_index = master_index
+        self.dependents_mask = dependents_mask
+        self.masters_mask = masters_mask
+        self.general = zone_config.general
+
+        # Forget the state of removed zones
+        self.active &= (1 << zone_count) - 1
+
+    def subscribe(self, listener: Callable[[ZoneChanges], None]) -> None:
+        """Register a callable receiving the zones changed by each operation"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[ZoneChanges], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def is_active(self, zone_id: int) -> bool:
+        return bool(self.active >> zone_id & 1)
+
+    def is_master(self, zone_id: int) -> bool:
+        return bool(self.masters_mask >> zone_id & 1)
+
+    def has_active_dependents(self, master_id: int) -> bool:
+        """Check if any zones that depend on the given master are active"""
+        return bool(self.active & self.dependents_mask[master_id])
+
+    def activate(self, zone_id: int, publish: bool = True) -> None:
+        """Activate a zone, publish=False is used for states reported by the valves"""
+        self._begin()
+        try:
+            self._activate(zone_id, publish)
+        finally:
+            self._end()
+
+    def deactivate(self, zone_id: int, publish: bool = True) -> None:
+        """
+        Deactivate a zone and handle master zone relationships.
+        If the zone is a master and auto-close is enabled, also deactivate all dependent zones.
+        """
+        self._begin()
+        try:
+            self._deactivate(zone_id, publish)
+        finally:
+            self._end()
+
+    def toggle(self, zone_id: int) -> None:
+        """Toggle a zone's state and handle master zone relationships"""
+        self._begin()
+        try:
+            if self.is_active(zone_id):
+                self._deactivate(zone_id, True)
+            else:
+                # Open the master first, so its command is sent before the zone's
+                master_id = self.master_index[zone_id]
+                if (not self.is_master(zone_id) and master_id >= 0 and
+                    self.general['open_master_automatically']):
+                    self._activate(master_id, True)
+                self._activate(zone_id, True)
+        finally:
+            self._end()
+
+    def apply_remote_state(self, zone_id: int, is_on: bool) -> None:
+        """Apply a zone state reported by the valves (e.g. over MQTT)"""
+        if not 0 <= zone_id < self.zone_count:
+            return
+
+        self._begin()
+        try:
+            if is_on:
+                # If turning on a dependent zone, check if we need to activate its master
+                master_id = self.master_index[zone_id]
+                if (not self.is_master(zone_id) and master_id >= 0 and
+                    self.general['open_master_automatically']):
+                    self._activate(master_id, True)
+
+                # Now activate the zone itself
+                self._activate(zone_id, False)
+            else:
+                # If this is a master zone being turned off and auto-close dependent is enabled,
+                # deactivate all dependent zones first and command them off
+                if (self.is_master(zone_id) and
+                    self.general.get('close_dependent_automatically', True)):
+                    for dependent_id in iter_bits(self.active & self.dependents_mask[zone_id]):
+                        self._deactivate(dependent_id, False)
+                        self._command(dependent_id, False)
+
+                # Don't send a command for the zone itself, since its state came from the valve
+                self._deactivate(zone_id, False)
+        finally:
+            self._end()
+
+    def restore(self, active: int, known: Optional[int] = None) -> None:
+        """
+        Set the zone states recorded before a restart or reported in one snapshot,
+        without any commands or master rules. Only the zones in the known bitset
+        are set, all of them by default.
+        """
+        known = (1 << self.zone_count) - 1 if known is None else known & ((1 << self.zone_count) - 1)
+        active = (self.active & ~known) | (active & known)
+        self._begin()
+        try:
+            for zone_id in iter_bits(self.active ^ active):
+                self._set(zone_id, bool(active >> zone_id & 1), False)
+        finally:
+            self._end()
+
+    def close_idle_masters(self, changed_zone_id: int, publish: bool = True) -> None:
+        """Deactivate the active master zones which have no active dependents left"""
+        self._begin()
+        try:
+            self._close_idle_masters(changed_zone_id, publish)
+        finally:
+            self._end()
+
+    def _activate(self, zone_id: int, publish: bool) -> None:
+        if self.is_active(zone_id):
+            return
+        self._set(zone_id, True, publish)
+
+    def _deactivate(self, zone_id: int, publish: bool) -> None:
+        if not self.is_active(zone_id):
+            return
+
+        is_master = self.is_master(zone_id)
+
+        # If this is a master zone and auto-close dependent is enabled,
+        # first deactivate all dependent zones
+        if is_master and self.general.get('close_dependent_automatically', True):
+            for dependent_id in iter_bits(self.active & self.dependents_mask[zone_id]):
+                self._set(dependent_id, False, publish)
+
+        self._set(zone_id, False, publish)
+
+        # Check other masters (not for dependent zone deactivation)
+        if not is_master:
+            self._close_idle_masters(zone_id, publish)
+
+    def _close_idle_masters(self, changed_zone_id: int, publish: bool) -> None:
+        if not self.general.get('close_master_automatically', True):
+            return
+
+        candidates = self.active & self.masters_mask & ~(1 << changed_zone_id)
+        for master_id in iter_bits(candidates):
+            # Masters closed earlier in this loop count as inactive dependents
+            if not self.active & self.dependents_mask[master_id]:
+                self._set(master_id, False, publish)
+
+    def _set(self, zone_id: int, active: bool, publish: bool) -> None:
+        if active:
+            self.active |= 1 << zone_id
+        else:
+            self.active &= ~(1 << zone_id)
+
+        # Keep only the final state of a zone, ordered by its last change
+        self._pending.pop(zone_id, None)
+        self._pending[zone_id] = active
+
+        if publish:
+            self._command(zone_id, active)
+
+    def _command(self, zone_id: int, state: bool) -> None:
+        if self.on_command:
+            self.on_command(zone_id, state)
+
+    def _begin(self) -> None:
+        self._batch_depth += 1
+
+    def _end(self) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth or not self._pending:
+            return
+
+        changes = list(self._pending.items())
+        self._pending = {}
+        for listener in list(self._listeners):
+            listener(changes)
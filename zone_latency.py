@@ -0,0 +1,158 @@
+import logging
+import math
+import time
+from array import array
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+# Histogram buckets: 4 per doubling from 1 ms, the last one collects everything above ~55 s
+BUCKETS_PER_OCTAVE = 4
+BUCKET_COUNT = 64
+
+class LatencyHistogram:
+    """Log-scale latency histogram, a fixed 64 counters no matter how many samples it gets"""
+
+    def __init__(self):
+        self.counts = array('I', bytes(4 * BUCKET_COUNT))
+        self.total = 0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket(latency_ms: float) -> int:
+        if latency_ms < 1:
+            return 0
+        return min(int(math.log2(latency_ms) * BUCKETS_PER_OCTAVE) + 1, BUCKET_COUNT - 1)
+
+    @staticmethod
+    def upper_bound(bucket: int) -> float:
+        return 2 ** (bucket / BUCKETS_PER_OCTAVE)
+
+    def add(self, latency_ms: float) -> None:
+        self.counts[self.bucket(latency_ms)] += 1
+        self.total += 1
+        self.max = max(self.max, latency_ms)
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        for bucket, count in enumerate(other.counts):
+            self.counts[bucket] += count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given fraction of the samples, None if empty"""
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(self.total * fraction))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+class ZoneLatencyTracker:
+    """
+    Command to state confirmation latency of every zone's valve.
+
+    Every sent command is timestamped, the next state report of the zone with
+    the commanded state completes the round trip. Commands which are not
+    confirmed within the timeout are counted as timeouts. Thread-safe, commands
+    are recorded on the sending thread, state reports on the MQTT network thread.
+    """
+
+    def __init__(self, timeout: float, _=str):
+        self.timeout = timeout
+        self._ = _
+        self.logger = logging.getLogger(__name__)
+        self._lock = Lock()
+        # zone_id -> (commanded state, sent at), ordered by the send time
+        self._pending: Dict[int, Tuple[bool, float]] = {}
+        self._histograms: Dict[int, LatencyHistogram] = {}
+        self._timeouts: Dict[int, int] = {}
+        # Incremented on every change, so displays can skip refreshing unchanged numbers
+        self.revision = 0
+
+    def command_sent(self, zone_id: int, state: bool, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            # A newer command supersedes the unconfirmed one
+            self._pending.pop(zone_id, None)
+            self._pending[zone_id] = (state, now)
+
+    def state_received(self, zone_id: int, is_on: bool, now: Optional[float] = None) -> Optional[float]:
+        """Complete the round trip if the zone reports its commanded state, returns the latency in ms"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            pending = self._pending.get(zone_id)
+            if pending is None or pending[0] != is_on:
+                return None
+            del self._pending[zone_id]
+            latency = (now - pending[1]) * 1000
+            histogram = self._histograms.get(zone_id)
+            if histogram is None:
+                histogram = self._histograms[zone_id] = LatencyHistogram()
+            histogram.add(latency)
+            self.revision += 1
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                self._("Zone %s confirmed %s in %.0f ms"), zone_id, 'on' if is_on else 'off', latency
+            )
+        return latency
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Count the commands which were not confirmed in time as timeouts"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            # Ordered by send time, so only the oldest ones have to be looked at
+            while self._pending:
+                zone_id, (state, sent_at) = next(iter(self._pending.items()))
+                if now - sent_at < self.timeout:
+                    break
+                del self._pending[zone_id]
+                self._timeouts[zone_id] = self._timeouts.get(zone_id, 0) + 1
+                expired.append((zone_id, state))
+            if expired:
+                self.revision += 1
+
+        for zone_id, state in expired:
+            self.logger.warning(
+                self._("Zone %s did not confirm the %s command in %s seconds"), zone_id, 'on' if state else 'off', self.timeout
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._histograms.clear()
+            self._timeouts.clear()
+            self.revision += 1
+
+    def snapshot(self) -> Dict[int, Dict[str, Optional[float]]]:
+        """Confirmed count, p50/p95/p99 (ms), max and timeouts of every zone with data"""
+        with self._lock:
+            zone_ids = sorted(set(self._histograms) | set(self._timeouts))
+            return {
+                zone_id: self._summarize(self._histograms.get(zone_id), self._timeouts.get(zone_id, 0))
+                for zone_id in zone_ids
+            }
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """The same numbers as snapshot() for all zones together"""
+        with self._lock:
+            total = LatencyHistogram()
+            for histogram in self._histograms.values():
+                total.merge(histogram)
+            return self._summarize(total, sum(self._timeouts.values()))
+
+    @staticmethod
+    def _summarize(histogram: Optional[LatencyHistogram], timeouts: int) -> Dict[str, Optional[float]]:
+        histogram = histogram or LatencyHistogram()
+        return {
+            'confirmed': histogram.total,
+            'p50': histogram.percentile(0.50),
+            'p95': histogram.percentile(0.95),
+            'p99': histogram.percentile(0.99),
+            'max': histogram.max if histogram.total else None,
+            'timeouts': timeouts,
+        }